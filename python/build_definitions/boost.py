@@ -53,6 +53,7 @@ class BoostDependency(Dependency):
         self.dir = '{}_{}'.format(self.name, self.underscored_version)
         self.copy_sources = True
         self.patches = ['boost-1-81-add-arm64-instruction-set.patch']
+        self.requires = ['icu4c']
 
     def build(self, builder: BuilderInterface) -> None:
         libs = ['system', 'thread', 'atomic', 'program_options', 'regex', 'date_time']
@@ -27,6 +27,7 @@ class CassandraCppDriverDependency(Dependency):
                 BuildGroup.POTENTIALLY_INSTRUMENTED)
         self.copy_sources = False
         self.patch_version = 0
+        self.requires = ['libuv', 'openssl']
 
     def build(self, builder: BuilderInterface) -> None:
         if not is_macos():
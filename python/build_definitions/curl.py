@@ -23,6 +23,7 @@ class CurlDependency(Dependency):
             url_pattern="https://curl.haxx.se/download/curl-{0}.tar.gz",
             build_group=BuildGroup.COMMON)
         self.copy_sources = True
+        self.requires = ['openssl', 'zlib']
 
     def build(self, builder: BuilderInterface) -> None:
         disabled_features = ['ftp', 'file', 'ldap', 'ldaps', 'rtsp', 'dict', 'telnet', 'tftp',
@@ -39,6 +39,7 @@ class DiskANNDependency(Dependency):
             url_pattern='https://github.com/yugabyte/diskann/archive/v{0}.tar.gz',
             build_group=BuildGroup.POTENTIALLY_INSTRUMENTED)
         self.copy_sources = False
+        self.requires = ['boost', 'tcmalloc']
         self.oneapi_installation = None
 
     def configure_intel_oneapi(self) -> None:
@@ -25,6 +25,8 @@ class GetTextDependency(Dependency):
             'https://ftp.gnu.org/pub/gnu/gettext/gettext-{0}.tar.gz',
             BuildGroup.POTENTIALLY_INSTRUMENTED)
         self.copy_sources = True
+        # gettext uses ncurses for terminal output if it finds it.
+        self.requires = ['libunistring', 'ncurses']
 
     def get_compiler_wrapper_ld_flags_to_remove(self, builder: BuilderInterface) -> Set[str]:
         if is_macos():
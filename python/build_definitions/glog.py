@@ -31,6 +31,8 @@ class GLogDependency(Dependency):
         self.patches = ['glog-tsan-annotations.patch',
                         'glog-symbolize-and-demangle.patch']
         self.post_patch = ['autoreconf', '-fvi']
+        # glog uses libunwind for stack traces if it finds it.
+        self.requires = ['gflags', 'libunwind', 'llvm_libunwind']
 
     def get_additional_cmake_args(self, builder: BuilderInterface) -> List[str]:
         cmake_args = [
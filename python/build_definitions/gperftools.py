@@ -26,6 +26,8 @@ class GPerfToolsDependency(Dependency):
                         'gperftools-{0}.tar.gz',
             build_group=BuildGroup.POTENTIALLY_INSTRUMENTED)
         self.copy_sources = True
+        # The configure script of gperftools uses libunwind if it finds it.
+        self.requires = ['libunwind', 'llvm_libunwind']
         self.patch_version = 0
         self.post_patch = ['autoreconf', '-fvi']
 
@@ -23,6 +23,7 @@ class HdrHistogramDependency(Dependency):
             'https://github.com/yugabyte/HdrHistogram_c/archive/hdrhistogram-{0}.tar.gz',
             build_group=BuildGroup.POTENTIALLY_INSTRUMENTED)
         self.copy_sources = True
+        self.requires = ['zlib']
 
     def get_additional_cmake_args(self, builder: BuilderInterface) -> List[str]:
         return [
@@ -15,6 +15,7 @@ from yugabyte_db_thirdparty.build_definition_helpers import *  # noqa
 
 from yugabyte_db_thirdparty.util import read_file, write_file
 
+import glob
 import os
 
 
@@ -43,6 +44,12 @@ class Icu4cDependency(Dependency):
             return ['-ldl']
         return []
 
+    def get_prerequisite_build_types(self, build_type: BuildType) -> List[BuildType]:
+        if build_type == BuildType.ASAN:
+            # See _copy_res_files_from_uninstrumented.
+            return [BuildType.UNINSTRUMENTED]
+        return []
+
     def _copy_res_files_from_uninstrumented(self) -> None:
         """
         Updates the following rule in source/extra/uconv/Makefile in ASAN build:
@@ -91,6 +98,12 @@ class Icu4cDependency(Dependency):
         if not line_found:
             raise IOError('Did not find Makefile rule starting with %s in %s' % (
                 rule_prefix, makefile_path))
+
+        # Remove the files copied by a previous build, so that make copies them again from the
+        # uninstrumented build, which may have been rebuilt since then.
+        for res_file_path in glob.glob(
+                os.path.join(configured_dir, 'extra', 'uconv', 'uconvmsg', '*.res')):
+            os.remove(res_file_path)
         if not made_changes:
             log('Did not make any changes to %s, assuming previously applied', makefile_path)
             return
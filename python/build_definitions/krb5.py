@@ -29,6 +29,8 @@ class Krb5Dependency(Dependency):
         self.patch_strip = 0
         self.copy_sources = True
         self.shared_and_static = True
+        # OpenSSL is used for PKINIT if the configure script finds it.
+        self.requires = ['gettext', 'libkeyutils', 'libverto', 'openssl']
 
     def get_additional_ld_flags(self, builder: BuilderInterface) -> List[str]:
         flags: List[str] = list(super().get_additional_ld_flags(builder))
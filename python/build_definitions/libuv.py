@@ -23,6 +23,7 @@ class LibUvDependency(Dependency):
             url_pattern='https://github.com/libuv/libuv/archive/v{0}.tar.gz',
             build_group=BuildGroup.POTENTIALLY_INSTRUMENTED)
         self.copy_sources = True
+        self.requires = ['openssl']
 
     def build(self, builder: BuilderInterface) -> None:
         builder.build_with_cmake(
@@ -26,6 +26,7 @@ class LibVertoDependency(Dependency):
             'https://github.com/latchset/libverto/releases/download/{0}/libverto-{0}.tar.gz',
             BuildGroup.POTENTIALLY_INSTRUMENTED)
         self.copy_sources = True
+        self.requires = ['libev']
 
     def build(self, builder: BuilderInterface) -> None:
         builder.build_with_configure(
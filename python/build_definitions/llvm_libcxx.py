@@ -25,6 +25,7 @@ class LlvmLibCxxDependencyBase(LlvmPartDependencyBase):
             name=name,
             version=version,
             build_group=BuildGroup.POTENTIALLY_INSTRUMENTED)
+        self.required_by_all = True
 
     def postprocess_ninja_build_file(
             self,
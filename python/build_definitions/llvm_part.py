@@ -12,6 +12,20 @@
 
 from yugabyte_db_thirdparty.build_definition_helpers import *  # noqa
 
+# Parts of the llvm-project archive needed to build the LLVM runtime libraries. The rest of the
+# archive, most of which is LLVM itself, Clang, and other tools, is not extracted.
+LLVM_RUNTIME_SUBPATHS = [
+    'cmake',
+    'libcxx',
+    'libcxxabi',
+    'libunwind',
+    'llvm/cmake',
+    'llvm/utils/lit',
+    'llvm/utils/llvm-lit',
+    'runtimes',
+    'third-party',
+]
+
 
 class LlvmPartDependencyBase(Dependency):
     """
@@ -33,6 +47,9 @@ class LlvmPartDependencyBase(Dependency):
             ),
             archive_name_prefix='llvm',
             build_group=build_group)
+        # All parts of the LLVM project share the same source directory, so they need to extract
+        # the same paths.
+        self.archive_subpaths = LLVM_RUNTIME_SUBPATHS
         llvm_major_version = int(self.version.split('.')[0])
         if llvm_major_version in [15, 16]:
             self.patches = ['llvm15-16-libunwind-force-asm-as-c.patch']
@@ -26,6 +26,7 @@ class OpenLDAPDependency(Dependency):
         self.copy_sources = True
         self.patch_version = 1
         self.patches = ['openldap-do-not-build-docs.patch']
+        self.requires = ['openssl']
 
     def get_additional_compiler_flags(self, builder: BuilderInterface) -> List[str]:
         llvm_major_version = builder.compiler_choice.get_llvm_major_version()
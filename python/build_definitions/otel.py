@@ -31,6 +31,8 @@ class OtelDependency(Dependency):
         self.patches = ['otel_cpp_remove_experimental_allow_proto3_optional.patch',
                         'add_macOS_missing_dependencies.patch']
         self.copy_sources = False
+        # The OTLP HTTP exporter uses curl.
+        self.requires = ['curl', 'opentelemetry-proto', 'protobuf']
 
     def build(self, builder: BuilderInterface) -> None:
         installed_common_dir = builder.fs_layout.tp_installed_common_dir
@@ -27,6 +27,7 @@ class ProtobufDependency(Dependency):
             'https://github.com/yugabyte/protobuf/archive/refs/tags/v{0}.tar.gz',
             BuildGroup.POTENTIALLY_INSTRUMENTED)
         self.copy_sources = True
+        self.requires = ['zlib']
         self.extra_downloads = [
             ExtraDownload(
                 name='gmock',
@@ -28,6 +28,7 @@ class TCMallocDependency(Dependency):
             build_group=BuildGroup.POTENTIALLY_INSTRUMENTED)
         self.copy_sources = True
         self.bazel_project_subdir_name = 'com_google_tcmalloc'
+        self.requires = ['abseil']
 
     def update_workspace_file(self) -> None:
         """
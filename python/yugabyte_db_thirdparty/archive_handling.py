@@ -10,23 +10,366 @@
 # or implied. See the License for the specific language governing permissions and limitations
 # under the License.
 
+import functools
+import hashlib
 import os
+import shutil
+import subprocess
+import tarfile
+import time
 
-from typing import Optional, Tuple
+from typing import Any, Dict, Iterator, List, Literal, Optional, Tuple
 
+from yugabyte_db_thirdparty.custom_logging import log
 
-TAR_EXTRACT = 'tar --no-same-owner -xf {}'
-# -o -- force overwriting existing files
-ZIP_EXTRACT = 'unzip -q -o {}'
 
+# Maps archive file name extensions to compression types, see DECOMPRESSORS.
 ARCHIVE_TYPES = {
-    '.tar.bz2': TAR_EXTRACT,
-    '.tar.gz': TAR_EXTRACT,
-    '.tar.xz': TAR_EXTRACT,
-    '.tgz': TAR_EXTRACT,
-    '.zip': ZIP_EXTRACT,
+    '.tar.bz2': 'bz2',
+    '.tar.gz': 'gz',
+    '.tar.xz': 'xz',
+    '.tar.zst': 'zst',
+    '.tgz': 'gz',
+    '.zip': 'zip',
+}
+
+# External decompressors for each compression type of tar archives, in the order of preference.
+# Multi-threaded ones come first. The chosen decompressor is run in a pipeline with tar.
+DECOMPRESSORS = {
+    'bz2': [['lbzip2', '-dc'], ['pbzip2', '-dc']],
+    'gz': [['pigz', '-dc']],
+    'xz': [['xz', '-T0', '-dc']],
+    'zst': [['zstd', '-dcq']],
+}
+
+# tarfile modes for reading a stream for compression types supported by the tarfile module. The
+# tarfile module is only used as a last resort, when neither an external decompressor nor tar with
+# its own decompressor can be used.
+TARFILE_STREAM_MODES: Dict[str, Literal['r|bz2', 'r|gz', 'r|xz']] = {
+    'bz2': 'r|bz2',
+    'gz': 'r|gz',
+    'xz': 'r|xz',
+}
+
+# tar options for using its own, usually single-threaded, decompressor, and the programs that tar
+# runs for these options.
+TAR_DECOMPRESSION_OPTIONS = {
+    'bz2': '--bzip2',
+    'gz': '--gzip',
+    'xz': '--xz',
+    'zst': '--zstd',
+}
+TAR_DECOMPRESSION_PROGRAMS = {
+    'bz2': 'bzip2',
+    'gz': 'gzip',
+    'xz': 'xz',
+    'zst': 'zstd',
 }
 
+TAR_EXTRACT_FROM_STDIN_CMD = ['tar', '--no-same-owner', '-xf', '-']
+
+# -o -- force overwriting existing files
+ZIP_EXTRACT_CMD = ['unzip', '-q', '-o']
+
+
+class ArchiveExtractionError(Exception):
+    pass
+
+
+def get_compression_type(archive_file_name: str) -> str:
+    """
+    >>> get_compression_type('foo-1.0.tgz')
+    'gz'
+    >>> get_compression_type('/a/b/foo-1.0.tar.xz')
+    'xz'
+    """
+    for archive_extension, compression_type in ARCHIVE_TYPES.items():
+        if archive_file_name.endswith(archive_extension):
+            return compression_type
+    raise ValueError("Unknown archive type for: %s" % archive_file_name)
+
+
+@functools.lru_cache(maxsize=None)
+def find_decompressor_cmd(compression_type: str) -> Optional[List[str]]:
+    for decompressor_cmd in DECOMPRESSORS.get(compression_type, []):
+        decompressor_path = shutil.which(decompressor_cmd[0])
+        if decompressor_path:
+            return [decompressor_path] + decompressor_cmd[1:]
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def find_tar_decompression_cmd(compression_type: str) -> Optional[List[str]]:
+    """
+    Returns a tar command that decompresses an archive of the given compression type on its own,
+    without the archive path or - at the end, or None if tar or the program it would run for
+    decompression is not installed.
+    """
+    option = TAR_DECOMPRESSION_OPTIONS.get(compression_type)
+    if option is None:
+        return None
+    tar_path = shutil.which('tar')
+    if not tar_path or not shutil.which(TAR_DECOMPRESSION_PROGRAMS[compression_type]):
+        return None
+    return [tar_path, '--no-same-owner', option, '-xf']
+
+
+def log_extraction_speed(
+        archive_path: str,
+        compressed_size: int,
+        method: str,
+        start_time_sec: float) -> None:
+    elapsed_time_sec = time.time() - start_time_sec
+    size_mb = compressed_size / 1024.0 / 1024.0
+    log("Extracted %s (%.1f MB) using %s in %.1f sec (%.1f MB/s)",
+        os.path.basename(archive_path), size_mb, method, elapsed_time_sec,
+        size_mb / max(elapsed_time_sec, 0.001))
+
+
+class NoSameOwnerTarFile(tarfile.TarFile):
+    """
+    Does not change the owner of extracted files, like tar --no-same-owner.
+    """
+
+    def chown(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+
+def is_in_archive_subpaths(member_name: str, subpaths: List[str]) -> bool:
+    """
+    Checks if an archive member is one of the given subpaths of the top-level directory of the
+    archive, is under one of them, or is a directory containing one of them.
+
+    >>> subpaths = ['libcxx', 'llvm/cmake']
+    >>> is_in_archive_subpaths('llvm-project-17.0.6/libcxx/include/vector', subpaths)
+    True
+    >>> is_in_archive_subpaths('llvm-project-17.0.6/llvm/cmake', subpaths)
+    True
+    >>> is_in_archive_subpaths('llvm-project-17.0.6/llvm', subpaths)
+    True
+    >>> is_in_archive_subpaths('llvm-project-17.0.6/', subpaths)
+    True
+    >>> is_in_archive_subpaths('llvm-project-17.0.6/llvm/lib/IR/Value.cpp', subpaths)
+    False
+    >>> is_in_archive_subpaths('llvm-project-17.0.6/libcxxabi/CMakeLists.txt', subpaths)
+    False
+    """
+    path_in_top_level_dir = member_name.rstrip('/').partition('/')[2]
+    if not path_in_top_level_dir:
+        return True
+    for subpath in subpaths:
+        if (path_in_top_level_dir == subpath or
+                path_in_top_level_dir.startswith(subpath + '/') or
+                subpath.startswith(path_in_top_level_dir + '/')):
+            return True
+    return False
+
+
+def get_safe_tar_members(
+        archive: tarfile.TarFile,
+        archive_path: str,
+        subpaths: Optional[List[str]]) -> Iterator[tarfile.TarInfo]:
+    for member in archive:
+        if os.path.isabs(member.name) or '..' in member.name.split('/'):
+            raise ArchiveExtractionError(
+                "Invalid path %s in archive %s" % (member.name, archive_path))
+        if subpaths and not is_in_archive_subpaths(member.name, subpaths):
+            continue
+        yield member
+
+
+def extract_with_tarfile(
+        archive: tarfile.TarFile,
+        archive_path: str,
+        out_dir: str,
+        subpaths: Optional[List[str]]) -> None:
+    extract_kwargs: Dict[str, Any] = {}
+    if hasattr(tarfile, 'tar_filter'):
+        # Available in newer Python versions. Behaves like the tar command.
+        extract_kwargs['filter'] = 'tar'
+    archive.extractall(
+        out_dir, members=get_safe_tar_members(archive, archive_path, subpaths), **extract_kwargs)
+
+
+def extract_archive_into_dir(
+        archive_path: str,
+        out_dir: str,
+        subpaths: Optional[List[str]] = None) -> None:
+    """
+    Extracts the given archive into the given directory. Tar archives are decompressed by an
+    external, preferably multi-threaded, decompressor if one is available, by tar itself
+    otherwise, and by the tarfile module as a last resort.
+
+    If subpaths are specified, only those paths relative to the top-level directory of a tar
+    archive are extracted. The tarfile module then reads the decompressed archive and skips other
+    members.
+    """
+    start_time_sec = time.time()
+    compressed_size = os.path.getsize(archive_path)
+    compression_type = get_compression_type(archive_path)
+    if compression_type == 'zip':
+        if subpaths:
+            raise ValueError("Extracting only some paths is not supported for zip archive %s" %
+                             archive_path)
+        subprocess.check_call(ZIP_EXTRACT_CMD + [archive_path], cwd=out_dir)
+        log_extraction_speed(archive_path, compressed_size, 'unzip', start_time_sec)
+        return
+
+    decompressor_cmd = find_decompressor_cmd(compression_type)
+    if decompressor_cmd is not None:
+        with open(archive_path, 'rb') as archive_file:
+            decompressor_process = subprocess.Popen(
+                decompressor_cmd, stdin=archive_file, stdout=subprocess.PIPE)
+            assert decompressor_process.stdout is not None
+            if subpaths:
+                try:
+                    with NoSameOwnerTarFile.open(
+                            fileobj=decompressor_process.stdout, mode='r|') as archive:
+                        extract_with_tarfile(archive, archive_path, out_dir, subpaths)
+                finally:
+                    decompressor_process.stdout.close()
+                    decompressor_process.wait()
+                tar_exit_code = 0
+            else:
+                tar_process = subprocess.Popen(
+                    TAR_EXTRACT_FROM_STDIN_CMD, stdin=decompressor_process.stdout, cwd=out_dir)
+                # Only tar should have the read end of the pipe open, so that the decompressor
+                # gets an error if tar exits early.
+                decompressor_process.stdout.close()
+                tar_exit_code = tar_process.wait()
+            decompressor_exit_code = decompressor_process.wait()
+        if tar_exit_code != 0 or decompressor_exit_code != 0:
+            raise ArchiveExtractionError(
+                "Extracting %s into %s failed: %s exited with code %d, tar exited with code %d" % (
+                    archive_path, out_dir, decompressor_cmd[0], decompressor_exit_code,
+                    tar_exit_code))
+        log_extraction_speed(
+            archive_path, compressed_size, os.path.basename(decompressor_cmd[0]), start_time_sec)
+        return
+
+    tar_cmd = find_tar_decompression_cmd(compression_type)
+    if tar_cmd is not None and not subpaths:
+        tar_exit_code = subprocess.call(tar_cmd + [os.path.abspath(archive_path)], cwd=out_dir)
+        if tar_exit_code != 0:
+            raise ArchiveExtractionError(
+                "Extracting %s into %s failed: tar exited with code %d" % (
+                    archive_path, out_dir, tar_exit_code))
+        log_extraction_speed(archive_path, compressed_size, 'tar', start_time_sec)
+        return
+
+    if compression_type not in TARFILE_STREAM_MODES:
+        raise ArchiveExtractionError(
+            "None of the decompressors for %s is installed: %s" % (
+                archive_path, ', '.join(
+                    [cmd[0] for cmd in DECOMPRESSORS[compression_type]] +
+                    [TAR_DECOMPRESSION_PROGRAMS[compression_type]])))
+    with NoSameOwnerTarFile.open(archive_path, TARFILE_STREAM_MODES[compression_type]) as archive:
+        extract_with_tarfile(archive, archive_path, out_dir, subpaths)
+    log_extraction_speed(archive_path, compressed_size, 'tarfile', start_time_sec)
+
+
+def get_streaming_extract_cmds(archive_file_name: str) -> Optional[List[List[str]]]:
+    """
+    Returns a pipeline of commands that extracts an archive with the given name from the standard
+    input of the first command, or None if the archive cannot be extracted from a stream. Zip
+    archives have their index at the end, so they cannot be.
+    """
+    compression_type = get_compression_type(archive_file_name)
+    if compression_type == 'zip':
+        return None
+    decompressor_cmd = find_decompressor_cmd(compression_type)
+    if decompressor_cmd is not None:
+        return [decompressor_cmd, TAR_EXTRACT_FROM_STDIN_CMD]
+    tar_cmd = find_tar_decompression_cmd(compression_type)
+    if tar_cmd is None:
+        return None
+    return [tar_cmd + ['-']]
+
+
+class StreamingArchiveExtractor:
+    """
+    Extracts an archive into a directory while its contents are passed to the consume method
+    chunk by chunk, and computes the SHA-256 checksum of the archive at the same time.
+    """
+
+    archive_file_name: str
+    out_dir: str
+    sha256: 'hashlib._Hash'
+    processes: List[subprocess.Popen]
+    cmd_names: List[str]
+    start_time_sec: float
+    num_bytes_consumed: int
+
+    def __init__(self, archive_file_name: str, out_dir: str) -> None:
+        extract_cmds = get_streaming_extract_cmds(archive_file_name)
+        if extract_cmds is None:
+            raise ValueError("Cannot extract archive %s from a stream" % archive_file_name)
+        self.archive_file_name = archive_file_name
+        self.out_dir = out_dir
+        self.sha256 = hashlib.sha256()
+        self.start_time_sec = time.time()
+        self.num_bytes_consumed = 0
+        self.processes = []
+        self.cmd_names = [os.path.basename(cmd[0]) for cmd in extract_cmds]
+        for i, cmd in enumerate(extract_cmds):
+            is_last = i == len(extract_cmds) - 1
+            process = subprocess.Popen(
+                cmd,
+                stdin=self.processes[-1].stdout if self.processes else subprocess.PIPE,
+                stdout=None if is_last else subprocess.PIPE,
+                cwd=out_dir)
+            if self.processes:
+                stdout = self.processes[-1].stdout
+                assert stdout is not None
+                stdout.close()
+            self.processes.append(process)
+
+    def get_stdin(self) -> Any:
+        stdin = self.processes[0].stdin
+        assert stdin is not None
+        return stdin
+
+    def wait(self) -> List[int]:
+        return [process.wait() for process in self.processes]
+
+    def consume(self, chunk: bytes) -> None:
+        self.sha256.update(chunk)
+        self.num_bytes_consumed += len(chunk)
+        try:
+            self.get_stdin().write(chunk)
+        except BrokenPipeError:
+            raise ArchiveExtractionError(
+                "Extracting %s into %s failed with exit codes %s" % (
+                    self.archive_file_name, self.out_dir, self.wait()))
+
+    def finish(self) -> str:
+        """
+        Waits for the extraction to complete and returns the SHA-256 checksum of the archive.
+        """
+        try:
+            self.get_stdin().close()
+        except BrokenPipeError:
+            pass
+        exit_codes = self.wait()
+        if any(exit_codes):
+            raise ArchiveExtractionError("Extracting %s into %s failed with exit codes %s" % (
+                self.archive_file_name, self.out_dir, exit_codes))
+        log_extraction_speed(
+            self.archive_file_name, self.num_bytes_consumed,
+            'a stream to %s' % ' | '.join(self.cmd_names),
+            self.start_time_sec)
+        return self.sha256.hexdigest()
+
+    def abort(self) -> None:
+        for process in self.processes:
+            if process.poll() is None:
+                process.kill()
+        self.wait()
+        try:
+            self.get_stdin().close()
+        except BrokenPipeError:
+            pass
+
 
 def make_archive_name(name: str, version: str, download_url: Optional[str]) -> Optional[str]:
     if download_url is None:
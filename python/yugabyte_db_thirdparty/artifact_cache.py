@@ -0,0 +1,145 @@
+# Copyright (c) YugabyteDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+#
+
+"""
+A content-addressed cache of dependency build results. Each entry is a tarball of the files that a
+dependency installed into the installation directories, keyed by a hash of everything that affects
+the build: the source archive checksum, patches, the build definition, effective compiler and linker
+flags, compiler identification, and the build type.
+
+The cache is a plain directory, and it can be shared between hosts, e.g. over NFS. Entries are
+written to temporary files and renamed into place, so concurrent readers never see partial entries.
+"""
+
+import hashlib
+import os
+import tarfile
+import time
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from yugabyte_db_thirdparty.custom_logging import log
+from yugabyte_db_thirdparty.file_util import mkdir_p
+from yugabyte_db_thirdparty.util import (
+    get_temporal_randomized_file_name_suffix,
+    remove_path,
+    write_json_file,
+)
+
+ARCHIVE_SUFFIX = '.tar.gz'
+METADATA_SUFFIX = '.json'
+
+# A mapping from a relative file path to its modification time in nanoseconds and size.
+DirSnapshot = Dict[str, Tuple[int, int]]
+
+
+def compute_cache_key(key_inputs: List[str]) -> str:
+    """
+    >>> compute_cache_key(['a=1', 'b=2']) == compute_cache_key(['a=1', 'b=2'])
+    True
+    >>> compute_cache_key(['a=1', 'b=2']) == compute_cache_key(['a=1', 'b=3'])
+    False
+    """
+    return hashlib.sha256('\n'.join(key_inputs).encode('utf-8')).hexdigest()
+
+
+def snapshot_dir(base_dir: str, rel_dir: str) -> DirSnapshot:
+    """
+    Records the modification time and size of every file and symlink in the given subdirectory of
+    base_dir. Paths in the result are relative to base_dir.
+    """
+    snapshot: DirSnapshot = {}
+    for root, dirs, files in os.walk(os.path.join(base_dir, rel_dir)):
+        for name in files + [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+            path = os.path.join(root, name)
+            st = os.lstat(path)
+            snapshot[os.path.relpath(path, base_dir)] = (st.st_mtime_ns, st.st_size)
+    return snapshot
+
+
+def get_new_or_modified_files(before: DirSnapshot, after: DirSnapshot) -> List[str]:
+    """
+    >>> get_new_or_modified_files({'a': (1, 1), 'b': (1, 1)},
+    ...                           {'a': (1, 1), 'b': (2, 1), 'c': (1, 0)})
+    ['b', 'c']
+    """
+    return sorted(path for path, file_info in after.items() if before.get(path) != file_info)
+
+
+class ArtifactCache:
+    cache_dir: str
+
+    def __init__(self, cache_dir: str) -> None:
+        self.cache_dir = os.path.abspath(cache_dir)
+
+    def get_entry_path_prefix(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def restore(self, key: str, dest_dir: str) -> Optional[List[str]]:
+        """
+        Extracts the cache entry with the given key into dest_dir. Returns the sorted relative paths
+        of the restored files and symlinks, or None if there is no such entry.
+        """
+        archive_path = self.get_entry_path_prefix(key) + ARCHIVE_SUFFIX
+        if not os.path.exists(archive_path):
+            log("Artifact cache entry not found: %s", archive_path)
+            return None
+
+        start_time_sec = time.time()
+        with tarfile.open(archive_path, 'r:gz') as archive:
+            members = archive.getmembers()
+            for member in members:
+                if os.path.isabs(member.name) or '..' in member.name.split(os.sep):
+                    raise ValueError("Invalid path %s in artifact cache entry %s" % (
+                        member.name, archive_path))
+            archive.extractall(dest_dir, members=members)
+        log("Restored %d files from artifact cache entry %s in %.1f sec",
+            len(members), archive_path, time.time() - start_time_sec)
+        return sorted(member.name for member in members if not member.isdir())
+
+    def store(
+            self,
+            key: str,
+            src_dir: str,
+            rel_paths: List[str],
+            metadata: Dict[str, Any]) -> None:
+        """
+        Creates a cache entry with the given key from the given files in src_dir, unless such an
+        entry already exists.
+        """
+        path_prefix = self.get_entry_path_prefix(key)
+        archive_path = path_prefix + ARCHIVE_SUFFIX
+        if os.path.exists(archive_path):
+            log("Artifact cache entry already exists: %s", archive_path)
+            return
+
+        mkdir_p(os.path.dirname(path_prefix))
+        tmp_suffix = '.tmp.' + get_temporal_randomized_file_name_suffix()
+        tmp_archive_path = archive_path + tmp_suffix
+        tmp_metadata_path = path_prefix + METADATA_SUFFIX + tmp_suffix
+        start_time_sec = time.time()
+        try:
+            with tarfile.open(tmp_archive_path, 'w:gz') as archive:
+                for rel_path in rel_paths:
+                    archive.add(os.path.join(src_dir, rel_path), arcname=rel_path, recursive=False)
+            write_json_file(tmp_metadata_path, dict(metadata, files=rel_paths))
+            # The metadata file is only informational, so rename it first. The archive appearing
+            # in the cache is what makes the entry visible.
+            os.rename(tmp_metadata_path, path_prefix + METADATA_SUFFIX)
+            os.rename(tmp_archive_path, archive_path)
+        finally:
+            for tmp_path in (tmp_archive_path, tmp_metadata_path):
+                if os.path.exists(tmp_path):
+                    remove_path(tmp_path)
+        log("Stored %d files in artifact cache entry %s in %.1f sec",
+            len(rel_paths), archive_path, time.time() - start_time_sec)
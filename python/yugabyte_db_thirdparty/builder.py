@@ -12,7 +12,8 @@
 #
 
 import argparse
-import hashlib
+import concurrent.futures
+import functools
 import json
 import os
 import platform
@@ -20,12 +21,14 @@ import subprocess
 import stat
 import time
 import re
+import sys
 
 from re import Pattern
+from multiprocessing.connection import Connection, wait
 
 from typing import Optional, List, Set, Tuple, Dict, Any, Callable, cast
 
-from sys_detection import is_macos, is_linux
+from sys_detection import is_macos, is_linux, local_sys_conf
 from pathlib import Path
 
 from build_definitions import (
@@ -46,23 +49,44 @@ from yugabyte_db_thirdparty.builder_helpers import (
 )
 from yugabyte_db_thirdparty.builder_helpers import is_ninja_available
 
+from yugabyte_db_thirdparty.artifact_cache import (
+    ArtifactCache,
+    compute_cache_key,
+    DirSnapshot,
+    get_new_or_modified_files,
+    snapshot_dir,
+)
 from yugabyte_db_thirdparty.builder_interface import BuilderInterface
 from yugabyte_db_thirdparty import builder_interface
 
 from yugabyte_db_thirdparty.cmd_line_args import parse_cmd_line_args
 from yugabyte_db_thirdparty.compiler_choice import CompilerChoice
+from yugabyte_db_thirdparty.compiler_probe_cache import (
+    CompilerProbeCache,
+    get_compiler_fingerprint,
+)
+from yugabyte_db_thirdparty.configure_cache import (
+    get_configure_cache_scope_key,
+    is_autoconf_configure_script,
+    SharedConfigureCache,
+)
 from yugabyte_db_thirdparty.custom_logging import (
     colored_log,
     fatal,
     log,
     log_output_internal,
+    LogOutputException,
     SEPARATOR,
     YELLOW_COLOR,
 )
 from yugabyte_db_thirdparty.dependency import Dependency
+from yugabyte_db_thirdparty.dependency_scheduler import DependencyScheduler
+from yugabyte_db_thirdparty.process_util import ForkedCall, get_fork_context
 from yugabyte_db_thirdparty.devtoolset import activate_devtoolset
 from yugabyte_db_thirdparty.download_manager import DownloadManager
-from yugabyte_db_thirdparty.env_helpers import write_env_vars
+from yugabyte_db_thirdparty.env_helpers import get_env_vars_to_save, write_env_vars
+from yugabyte_db_thirdparty.jobserver import JobServer
+from yugabyte_db_thirdparty.library_checking import get_lib_tester, LibTestBase
 from yugabyte_db_thirdparty.string_util import indent_lines
 from yugabyte_db_thirdparty.arch import (
     get_arch_switch_cmd_prefix,
@@ -71,18 +95,22 @@ from yugabyte_db_thirdparty.arch import (
     add_homebrew_to_path,
     is_building_for_x86_64,
 )
+from yugabyte_db_thirdparty import patch_util
 from yugabyte_db_thirdparty import util
 from yugabyte_db_thirdparty.util import (
     assert_dir_exists,
     assert_list_contains,
+    compute_file_sha256,
     PushDir,
     read_file,
     remove_path,
     YB_THIRDPARTY_DIR,
     add_path_entry,
     shlex_join,
+    write_json_file,
 )
 from yugabyte_db_thirdparty.file_system_layout import FileSystemLayout
+from yugabyte_db_thirdparty.source_store import clone_tree, SourceStore
 from yugabyte_db_thirdparty import file_system_layout
 from yugabyte_db_thirdparty.toolchain import Toolchain, ensure_toolchains_installed
 from yugabyte_db_thirdparty.clang_util import (
@@ -134,6 +162,42 @@ GRAVITON_COMPILER_FLAGS = [
 # environment variables that we set.
 DEPENDENCY_ENV_FILE_NAME = 'yb_dependency_env.sh'
 
+# Changes to these files cause all dependencies to be rebuilt. Paths are relative to the repository
+# root.
+BUILD_STAMP_INPUT_FILES = [
+    'build_thirdparty.sh',
+    'python/yugabyte_db_thirdparty/yb_build_thirdparty_main.py',
+]
+
+# Build directories of these dependencies are used when building other dependencies or build types.
+DEPENDENCIES_WITH_REUSED_BUILD_DIRS = ['abseil', 'icu4c']
+
+# Written to a CMake build directory after a successful CMake configuration step. Contains the
+# CMake arguments and the environment variables the step was run with. See build_with_cmake.
+CMAKE_FINGERPRINT_FILE_NAME = 'yb_cmake_fingerprint.txt'
+
+# Written to a configure build directory after a successful configure step. Contains the configure
+# command line, the environment variables and the sources the step was run with. See
+# build_with_configure.
+CONFIGURE_FINGERPRINT_FILE_NAME = 'yb_configure_fingerprint.txt'
+
+# Files and directories in the source directory that the configure step is generated from. Other
+# templates, such as Makefile.in, do not have to be fingerprinted, because the Makefiles generated
+# by automake re-run config.status themselves when they change.
+CONFIGURE_INPUT_PATHS = ['aclocal.m4', 'autogen.sh', 'configure', 'configure.ac', 'configure.in']
+CONFIGURE_INPUT_DIRS = ['m4']
+
+# Environment variables that do not affect the CMake or configure step but may change between runs.
+ENV_VARS_EXCLUDED_FROM_BUILD_FINGERPRINTS = [
+    compile_commands.TMP_DIR_ENV_VAR_NAME,
+    env_var_names.DEPENDENCY_PARALLELISM,
+    env_var_names.JOBSERVER_FIFO,
+    env_var_names.MAKE_PARALLELISM,
+]
+
+# The private autoconf cache file of a configure run, see --shared-configure-cache.
+CONFIGURE_CACHE_FILE_NAME = 'config.cache'
+
 # If this pattern appears, we should use the CPPFLAGS environment variable for this dependency
 DISALLOWED_CONFIGURE_OUTPUT_RE = re.compile(
     '(C|CXX)FLAGS should only be used to specify C compiler flags, not include directories[.]')
@@ -187,6 +251,27 @@ class Builder(BuilderInterface):
     # directories.
     bazel_path_mapping: Dict[str, str]
 
+    # Names of dependencies whose sources have already been downloaded and patched in the prefetch
+    # stage.
+    pre_downloaded_dependency_names: Set[str]
+
+    # When build types are built concurrently, these events are set when the given dependency has
+    # been processed in the given build type, for dependencies that other build types wait for.
+    # See Dependency.get_prerequisite_build_types.
+    dependency_finished_events: Dict[Tuple[BuildType, str], Any]
+
+    # Shared by all build tool invocations to limit the total number of concurrent jobs.
+    jobserver: Optional[JobServer]
+
+    # Cache of files installed by dependencies, see --artifact-cache-dir.
+    artifact_cache: Optional[ArtifactCache]
+    source_store: Optional[SourceStore]
+
+    # Build stamps by build type and dependency name, and checksums of build input files by
+    # absolute path. See get_build_stamp_for_dependency.
+    build_stamps: Dict[Tuple[BuildType, str], str]
+    input_file_sha256s: Dict[str, str]
+
     """
     This class manages the overall process of building third-party dependencies, including the set
     of dependencies to build, build types, and the directories to install dependencies.
@@ -202,6 +287,14 @@ class Builder(BuilderInterface):
         self.dependencies = []
         self.dependencies_by_name = {}
 
+        self.pre_downloaded_dependency_names = set()
+        self.dependency_finished_events = {}
+        self.jobserver = None
+        self.artifact_cache = None
+        self.source_store = None
+        self.build_stamps = {}
+        self.input_file_sha256s = {}
+
     def install_toolchains(self) -> None:
         toolchains = ensure_toolchains_installed(
             self.download_manager, self.args.toolchain.split('_'))
@@ -276,10 +369,16 @@ class Builder(BuilderInterface):
             for dev_repo_mapping in self.args.dev_repo:
                 self.fs_layout.add_dev_repo_mapping(dev_repo_mapping)
 
+        if self.args.download_cache_dir:
+            self.fs_layout.tp_download_dir = os.path.abspath(self.args.download_cache_dir)
+            log("Using shared download cache directory %s", self.fs_layout.tp_download_dir)
+
         self.download_manager = DownloadManager(
             should_add_checksum=self.args.add_checksum,
             download_dir=self.fs_layout.tp_download_dir)
         intel_oneapi.set_download_manager(self.download_manager)
+        if self.args.reverify_downloads:
+            self.download_manager.reverify_downloads(parallelism=os.cpu_count() or 1)
 
         compiler_family, compiler_prefix = self.determine_compiler_family_and_prefix()
 
@@ -303,7 +402,8 @@ class Builder(BuilderInterface):
             compiler_suffix=self.args.compiler_suffix,
             devtoolset=self.args.devtoolset,
             use_ccache=self.args.use_ccache,
-            expected_major_compiler_version=self.args.expected_major_compiler_version
+            expected_major_compiler_version=self.args.expected_major_compiler_version,
+            probe_cache=CompilerProbeCache(self.fs_layout.get_compiler_probe_cache_path())
         )
 
         llvm_major_version: Optional[int] = self.compiler_choice.get_llvm_major_version()
@@ -333,6 +433,14 @@ class Builder(BuilderInterface):
         # Do not decide whether to use the compiler wrapper now.
         self.compiler_choice.set_compiler(use_compiler_wrapper=None)
 
+        if self.args.artifact_cache_dir:
+            self.artifact_cache = ArtifactCache(self.args.artifact_cache_dir)
+            log("Using artifact cache directory %s", self.artifact_cache.cache_dir)
+
+        if self.args.source_store_dir:
+            self.source_store = SourceStore(self.args.source_store_dir)
+            log("Using source store directory %s", self.source_store.store_dir)
+
     def populate_dependencies(self) -> None:
         # We have to use get_build_def_module to access submodules of build_definitions,
         # otherwise MyPy gets confused.
@@ -416,6 +524,20 @@ class Builder(BuilderInterface):
         else:
             self.selected_dependencies = self.dependencies
 
+    def needs_intel_oneapi_download(self) -> bool:
+        """
+        Determines whether a dependency built using the downloaded Intel oneAPI package, i.e.
+        diskann, is selected for any of the build types being built.
+        """
+        if (self.args.package_intel_oneapi or
+                self.args.intel_oneapi_base_dir or
+                self.args.download_extract_only):
+            return False
+        return any(
+            dep.name == 'diskann'
+            for build_type in BuildType if not self.should_skip_build_type(build_type)
+            for dep in self.get_dependencies_for_build_type(build_type))
+
     def _setup_path(self) -> None:
         add_path_entry(os.path.join(self.fs_layout.tp_installed_common_dir, 'bin'))
         add_homebrew_to_path()
@@ -432,6 +554,37 @@ class Builder(BuilderInterface):
         self.prepare_out_dirs()
         self._setup_path()
 
+        if not self.args.no_jobserver:
+            self.jobserver = JobServer(get_make_parallelism(), self.fs_layout.tp_build_dir)
+            log("Started a jobserver with %d jobs at %s",
+                self.jobserver.num_jobs, self.jobserver.fifo_path)
+        try:
+            need_intel_oneapi = self.needs_intel_oneapi_download()
+            if need_intel_oneapi:
+                # Downloaded while dependency sources are prefetched.
+                intel_oneapi.start_intel_oneapi_download()
+            if self.args.add_checksum:
+                self.add_missing_checksums(self.selected_dependencies)
+            self.prefetch_dependency_sources(self.selected_dependencies)
+            if need_intel_oneapi:
+                # Build processes are forked from here on. A forked process must not inherit a lock
+                # held by the downloading thread at the time of the fork, e.g. the checksum file
+                # lock, so the download has to finish first.
+                intel_oneapi.join_intel_oneapi_download()
+            self.download_manager.save_added_checksums()
+            self.build_all_build_types()
+        finally:
+            self.download_manager.save_added_checksums()
+            if self.jobserver is not None:
+                self.jobserver.close()
+                self.jobserver = None
+
+        fossa_config_deps = {"remote-dependencies": self.fossa_deps}
+        with open(os.path.join(YB_THIRDPARTY_DIR, 'fossa-deps.json'), 'w') as output_file:
+            json.dump(fossa_config_deps, output_file, indent=2)
+
+    def build_all_build_types(self) -> None:
+
         # Populate the mapping from Bazel project subdirectory names to build directories.
         # This is used for generating compilation commands. We do not use ASAN/TSAN builds for this.
         self.bazel_path_mapping = {}
@@ -457,12 +610,11 @@ class Builder(BuilderInterface):
                 build_types.append(BuildType.TSAN)
         log(f"Full list of build types: {build_types}")
 
-        for build_type in build_types:
-            self.build_one_build_type(build_type)
-
-        fossa_config_deps = {"remote-dependencies": self.fossa_deps}
-        with open(os.path.join(YB_THIRDPARTY_DIR, 'fossa-deps.json'), 'w') as output_file:
-            json.dump(fossa_config_deps, output_file, indent=2)
+        if self.args.parallel_build_types:
+            self.build_types_concurrently(build_types)
+        else:
+            for build_type in build_types:
+                self.build_one_build_type(build_type)
 
     def prepare_out_dirs(self) -> None:
         dirs = [
@@ -626,17 +778,29 @@ class Builder(BuilderInterface):
             return
 
         log_prefix = self.log_prefix(dep)
-        make_cmd_line = ['make', '-j{}'.format(get_make_parallelism())]
+        parallelism_args, parallelism_env_vars = self.get_build_tool_parallelism('make')
+        make_cmd_line = ['make'] + parallelism_args
         prefix_args = []
         if specify_prefix:
             prefix_args = [f'{prefix_var}={self.prefix}']
         make_cmd_line.extend(extra_make_args)
-        self.log_output(log_prefix, make_cmd_line + prefix_args)
+        with EnvVarContext(parallelism_env_vars):
+            self.log_output(log_prefix, make_cmd_line + prefix_args)
         if install_targets:
             self.log_output(log_prefix, ['make'] + install_targets + prefix_args)
 
         self.validate_build_output()
 
+    def get_build_tool_parallelism(
+            self, build_tool: str) -> Tuple[List[str], Dict[str, Optional[str]]]:
+        """
+        Returns the parallelism arguments and environment variables to use for invoking the given
+        build tool (make or ninja).
+        """
+        if self.jobserver is None:
+            return ['-j{}'.format(get_make_parallelism())], {}
+        return self.jobserver.get_build_tool_args_and_env(build_tool)
+
     def prepare_for_build_tool_invocation(self, dep: Dependency) -> bool:
         """
         Does common steps needed in the beginning of build_... functions. Returns true if the
@@ -671,25 +835,36 @@ class Builder(BuilderInterface):
         if src_subdir_name:
             dir_for_build = os.path.join(dir_for_build, src_subdir_name)
 
+        configure_args = (
+            configure_cmd.copy() +
+            ['--prefix={}'.format(self.prefix)] +
+            extra_configure_args
+        )
+        configure_args = get_arch_switch_cmd_prefix() + configure_args
+
         with PushDir(dir_for_build):
             log("Building in %s using the configure tool", dir_for_build)
+            configure_fingerprint = self.get_configure_fingerprint(
+                dep, configure_args, run_autogen=run_autogen, run_autoreconf=run_autoreconf,
+                src_subdir_name=src_subdir_name)
+            if self.is_configure_up_to_date(configure_fingerprint):
+                # The post-configure action may depend on files that are not covered by the
+                # configure fingerprint, e.g. files from another build type, so run it anyway.
+                if post_configure_action:
+                    post_configure_action()
+                self.build_with_make(
+                    dep=dep,
+                    extra_make_args=extra_make_args,
+                    install_targets=install_targets)
+                return
+
             try:
                 with self.create_configure_action_context():
                     if run_autogen:
                         self.log_output(log_prefix, ['./autogen.sh'])
                     if run_autoreconf:
                         self.log_output(log_prefix, ['autoreconf', '-i'])
-
-                    configure_args = (
-                        configure_cmd.copy() +
-                        ['--prefix={}'.format(self.prefix)] +
-                        extra_configure_args
-                    )
-                    configure_args = get_arch_switch_cmd_prefix() + configure_args
-                    self.log_output(
-                        log_prefix,
-                        configure_args,
-                        disallowed_pattern=DISALLOWED_CONFIGURE_OUTPUT_RE)
+                    self.run_configure(log_prefix, configure_args, configure_cmd)
             except Exception as ex:
                 log(f"The configure step failed. Looking for relevant files in {dir_for_build} "
                     f"to show.")
@@ -712,12 +887,118 @@ class Builder(BuilderInterface):
 
             if post_configure_action:
                 post_configure_action()
+            util.write_file(CONFIGURE_FINGERPRINT_FILE_NAME, configure_fingerprint)
 
             self.build_with_make(
                 dep=dep,
                 extra_make_args=extra_make_args,
                 install_targets=install_targets)
 
+    def get_configure_fingerprint(
+            self,
+            dep: Dependency,
+            configure_args: List[str],
+            run_autogen: bool,
+            run_autoreconf: bool,
+            src_subdir_name: Optional[str]) -> str:
+        env_vars = get_env_vars_to_save()
+        env_vars['LIBS'] = os.getenv('LIBS', '')
+        # The source store key identifies the archives and patches the source directory was
+        # created from, so the source tree does not have to be walked. The configure inputs are
+        # fingerprinted as well, to detect changes in development repositories and local
+        # archives. They are taken from the source directory rather than the build directory,
+        # where autogen.sh or autoreconf regenerate the configure script.
+        src_dir = self.fs_layout.get_source_path(dep)
+        config_src_dir = os.path.join(src_dir, src_subdir_name or '')
+        config_src_snapshot: DirSnapshot = {}
+        for rel_dir in CONFIGURE_INPUT_DIRS:
+            if os.path.isdir(os.path.join(config_src_dir, rel_dir)):
+                config_src_snapshot.update(snapshot_dir(config_src_dir, rel_dir))
+        for rel_path in CONFIGURE_INPUT_PATHS:
+            path = os.path.join(config_src_dir, rel_path)
+            if os.path.lexists(path):
+                st = os.lstat(path)
+                config_src_snapshot[rel_path] = (st.st_mtime_ns, st.st_size)
+        return ''.join(
+            line + '\n' for line in
+            ['run_autogen=%s' % run_autogen,
+             'run_autoreconf=%s' % run_autoreconf] +
+            ['arg=%s' % arg for arg in configure_args] +
+            ['env:%s=%s' % (k, v) for k, v in sorted(env_vars.items())
+             if k not in ENV_VARS_EXCLUDED_FROM_BUILD_FINGERPRINTS] +
+            ['source=%s:%s' % (src_dir, self.get_source_store_key(dep))] +
+            ['configure_input=%s:%d:%d' % (rel_path, mtime_ns, size)
+             for rel_path, (mtime_ns, size) in sorted(config_src_snapshot.items())])
+
+    def is_configure_up_to_date(self, configure_fingerprint: str) -> bool:
+        """
+        Returns True if the previous successful configure step in the current directory was run
+        with the same command line and environment on the same source tree, so that the configure
+        step can be skipped and make can build incrementally. Otherwise, removes the fingerprint of
+        the previous configure step.
+        """
+        if not os.path.exists(CONFIGURE_FINGERPRINT_FILE_NAME):
+            return False
+        old_configure_fingerprint = read_file(CONFIGURE_FINGERPRINT_FILE_NAME)
+        if old_configure_fingerprint == configure_fingerprint and os.path.exists('config.status'):
+            log("Configure command line, environment and sources are unchanged, skipping the "
+                "configure step in %s", os.getcwd())
+            return True
+
+        old_lines = set(old_configure_fingerprint.splitlines())
+        new_lines = set(configure_fingerprint.splitlines())
+        log("Configure command line, environment or sources changed, re-running configure in %s. "
+            "Removed:\n%s\nAdded:\n%s",
+            os.getcwd(),
+            indent_lines('\n'.join(sorted(old_lines - new_lines))),
+            indent_lines('\n'.join(sorted(new_lines - old_lines))))
+        # Only written back once the configure step succeeds.
+        remove_path(CONFIGURE_FINGERPRINT_FILE_NAME)
+        return False
+
+    def get_shared_configure_cache(
+            self, configure_cmd: List[str]) -> Optional[SharedConfigureCache]:
+        if not self.args.shared_configure_cache:
+            return None
+        if not is_autoconf_configure_script(configure_cmd[0]):
+            log("Not using the shared configure cache: %s is not generated by autoconf",
+                configure_cmd[0])
+            return None
+        scope_key = get_configure_cache_scope_key([
+            'build_type=%s' % self.build_type.dir_name,
+            'c_compiler=%s' % get_compiler_fingerprint(self.compiler_choice.get_c_compiler()),
+            'cxx_compiler=%s' % get_compiler_fingerprint(self.compiler_choice.get_cxx_compiler()),
+        ])
+        return SharedConfigureCache(os.path.join(
+            self.fs_layout.tp_build_dir, 'configure_cache', scope_key + '.cache'))
+
+    def run_configure(
+            self,
+            log_prefix: str,
+            configure_args: List[str],
+            configure_cmd: List[str]) -> None:
+        shared_configure_cache = self.get_shared_configure_cache(configure_cmd)
+        if shared_configure_cache is not None:
+            private_cache_path = os.path.abspath(CONFIGURE_CACHE_FILE_NAME)
+            shared_configure_cache.seed(private_cache_path)
+            try:
+                self.log_output(
+                    log_prefix,
+                    configure_args + ['--cache-file=%s' % private_cache_path],
+                    disallowed_pattern=DISALLOWED_CONFIGURE_OUTPUT_RE)
+                shared_configure_cache.merge(private_cache_path)
+                return
+            except LogOutputException as ex:
+                # A cached value might not be valid for this dependency.
+                log("The configure step failed with values from the shared configure cache %s, "
+                    "retrying without it: %s", shared_configure_cache.shared_cache_path, ex)
+                remove_path(private_cache_path)
+
+        self.log_output(
+            log_prefix,
+            configure_args,
+            disallowed_pattern=DISALLOWED_CONFIGURE_OUTPUT_RE)
+
     def log_output(
             self,
             prefix: str,
@@ -751,9 +1032,6 @@ class Builder(BuilderInterface):
 
         log("Building dependency %s using CMake. Build tool: %s", dep, build_tool)
 
-        remove_path('CMakeCache.txt')
-        remove_path('CMakeFiles')
-
         src_path = self.fs_layout.get_source_path(dep)
         if src_subdir_name is not None:
             src_path = os.path.join(src_path, src_subdir_name)
@@ -783,9 +1061,8 @@ class Builder(BuilderInterface):
                 format_cmake_args_for_log(final_cmake_args))
             cmake_configure_script_path = os.path.abspath('yb_build_with_cmake.sh')
 
-            build_tool_cmd = [
-                build_tool, '-j{}'.format(get_make_parallelism())
-            ] + extra_build_tool_args
+            parallelism_args, parallelism_env_vars = self.get_build_tool_parallelism(build_tool)
+            build_tool_cmd = [build_tool] + parallelism_args + extra_build_tool_args
 
             log("Writing the command line for the CMake-based build to %s",
                 os.path.abspath(cmake_configure_script_path))
@@ -797,20 +1074,26 @@ class Builder(BuilderInterface):
                     '. "./%s"' % DEPENDENCY_ENV_FILE_NAME,
                     shlex_join(final_cmake_args,
                                one_arg_per_line=True),
-                    shlex_join(build_tool_cmd)
+                    shlex_join([build_tool, '-j{}'.format(get_make_parallelism())] +
+                               extra_build_tool_args)
                 ]) + '\n')
             os.chmod(cmake_configure_script_path,
                      stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR | stat.S_IRGRP | stat.S_IWGRP |
                      stat.S_IROTH)
 
+            cmake_fingerprint = self.get_cmake_fingerprint(final_cmake_args, build_tool)
+            self.prepare_cmake_cache(cmake_fingerprint)
+
             custom_log_prefix = self.log_prefix(dep, extra_log_prefix_components)
             with self.create_configure_action_context():
                 self.log_output(custom_log_prefix, final_cmake_args)
+            util.write_file(CMAKE_FINGERPRINT_FILE_NAME, cmake_fingerprint)
 
             if build_tool == 'ninja':
                 dep.postprocess_ninja_build_file(self, 'build.ninja')
 
-            self.log_output(custom_log_prefix, build_tool_cmd)
+            with EnvVarContext(parallelism_env_vars):
+                self.log_output(custom_log_prefix, build_tool_cmd)
 
             if should_install:
                 # We can add a make_or_ninja_install_targets argument to this method if we need to
@@ -850,6 +1133,43 @@ class Builder(BuilderInterface):
             do_build_with_cmake()
             self.validate_build_output()
 
+    def get_cmake_fingerprint(self, cmake_args: List[str], build_tool: str) -> str:
+        env_vars = get_env_vars_to_save()
+        return ''.join(
+            line + '\n' for line in
+            ['build_tool=%s' % build_tool] +
+            ['arg=%s' % arg for arg in cmake_args] +
+            ['env:%s=%s' % (k, v) for k, v in sorted(env_vars.items())
+             if k not in ENV_VARS_EXCLUDED_FROM_BUILD_FINGERPRINTS])
+
+    def prepare_cmake_cache(self, cmake_fingerprint: str) -> None:
+        """
+        Keeps the CMake cache in the current directory if the previous successful CMake
+        configuration step was run with the same arguments and environment, so that CMake only
+        reconfigures incrementally. Otherwise, removes it.
+        """
+        old_cmake_fingerprint = None
+        if os.path.exists(CMAKE_FINGERPRINT_FILE_NAME):
+            old_cmake_fingerprint = read_file(CMAKE_FINGERPRINT_FILE_NAME)
+            # Only written back once the configuration step succeeds.
+            remove_path(CMAKE_FINGERPRINT_FILE_NAME)
+
+        if old_cmake_fingerprint == cmake_fingerprint and os.path.exists('CMakeCache.txt'):
+            log("CMake arguments and environment are unchanged, keeping the CMake cache in %s",
+                os.getcwd())
+            return
+
+        if old_cmake_fingerprint is not None:
+            old_lines = set(old_cmake_fingerprint.splitlines())
+            new_lines = set(cmake_fingerprint.splitlines())
+            log("CMake arguments or environment changed, removing the CMake cache in %s. "
+                "Removed:\n%s\nAdded:\n%s",
+                os.getcwd(),
+                indent_lines('\n'.join(sorted(old_lines - new_lines))),
+                indent_lines('\n'.join(sorted(new_lines - old_lines))))
+        remove_path('CMakeCache.txt')
+        remove_path('CMakeFiles')
+
     def build_with_bazel(
             self,
             dep: Dependency,
@@ -886,6 +1206,9 @@ class Builder(BuilderInterface):
             "YB_THIRDPARTY_USE_CCACHE",
             compile_commands.TMP_DIR_ENV_VAR_NAME,
         ]
+        # The jobserver FIFO is not passed to Bazel. Its path is different in every run, so it
+        # would change the keys of all actions, and it does not exist anymore when
+        # yb_build_with_bazel.sh is re-run by hand. Bazel limits its parallelism on its own.
         for env_var in env_vars_to_copy:
             if env_var not in os.environ:
                 log(f"Environment variable {env_var} not found. Not passing it to Bazel.")
@@ -954,15 +1277,12 @@ class Builder(BuilderInterface):
                 'In the future, we will track down where it is coming from.')
             os.remove(spurious_a_out_path)
 
-    def build_one_build_type(self, build_type: BuildType) -> None:
-        if (build_type != BuildType.COMMON and
+    def should_skip_build_type(self, build_type: BuildType) -> bool:
+        return (build_type != BuildType.COMMON and
                 self.args.build_type is not None and
-                build_type != self.args.build_type):
-            log("Skipping build type %s because build type %s is specified in the arguments",
-                build_type, self.args.build_type)
-            return
+                build_type != self.args.build_type)
 
-        self.set_build_type(build_type)
+    def get_dependencies_for_build_type(self, build_type: BuildType) -> List[Dependency]:
         if build_type == BuildType.COMMON:
             build_group_set = {BuildGroup.COMMON}
         elif build_type == BuildType.UNINSTRUMENTED:
@@ -982,22 +1302,141 @@ class Builder(BuilderInterface):
                 dep for dep in dependencies_matching_group
                 if dep.name != 'diskann'
             ]
+        return dependencies_matching_group
 
-        for dep in dependencies_matching_group:
-            self.perform_pre_build_steps(dep)
+    def build_types_concurrently(self, build_types: List[BuildType]) -> None:
+        """
+        Builds the given build types at the same time, each in its own child process. Each child
+        process has its own copy of the builder state, environment variables, and current
+        directory.
+        """
+        build_types = [
+            build_type for build_type in build_types
+            if not self.should_skip_build_type(build_type)
+        ]
+        deps_by_build_type = {
+            build_type: self.get_dependencies_for_build_type(build_type)
+            for build_type in build_types
+        }
+
+        # Make sure all sources are downloaded and patched upfront, so that the build type
+        # pipelines do not race with each other in the source directories.
+        self.prefetch_dependency_sources([
+            dep for build_type in build_types for dep in deps_by_build_type[build_type]
+        ])
+
+        fork_context = get_fork_context()
+        for build_type in build_types:
+            for dep in deps_by_build_type[build_type]:
+                for prerequisite_build_type in dep.get_prerequisite_build_types(build_type):
+                    if dep in deps_by_build_type.get(prerequisite_build_type, []):
+                        self.dependency_finished_events[(prerequisite_build_type, dep.name)] = \
+                            fork_context.Event()
+
+        running: Dict[Connection, Tuple[BuildType, ForkedCall]] = {}
+        for build_type in build_types:
+            call = ForkedCall(
+                'build-type-%s' % build_type.dir_name,
+                functools.partial(self.build_one_build_type_in_child_process, build_type))
+            running[call.connection] = (build_type, call)
+            log("Started building build type %s in process %s", build_type, call.pid)
+
+        while running:
+            for conn in wait(list(running.keys())):
+                assert isinstance(conn, Connection)
+                build_type, call = running.pop(conn)
+                success, result = call.wait_for_result()
+                if not success:
+                    log("Failed building build type %s after %.1f sec:\n%s",
+                        build_type, call.elapsed_sec(), result)
+                    for _, other_call in running.values():
+                        other_call.terminate()
+                    fatal("Failed building build type %s", build_type)
+                log("Finished building build type %s in %.1f sec",
+                    build_type, call.elapsed_sec())
+                allowed_shared_lib_paths, fossa_deps = result
+                self.additional_allowed_shared_lib_paths.update(allowed_shared_lib_paths)
+                self.fossa_deps.extend(fossa_deps)
+
+    def build_one_build_type_in_child_process(
+            self, build_type: BuildType) -> Tuple[Set[str], List[Any]]:
+        num_fossa_deps_before = len(self.fossa_deps)
+        self.build_one_build_type(build_type)
+        return self.additional_allowed_shared_lib_paths, self.fossa_deps[num_fossa_deps_before:]
+
+    def build_one_build_type(self, build_type: BuildType) -> None:
+        if self.should_skip_build_type(build_type):
+            log("Skipping build type %s because build type %s is specified in the arguments",
+                build_type, self.args.build_type)
+            return
+
+        self.set_build_type(build_type)
+        dependencies_matching_group = self.get_dependencies_for_build_type(build_type)
+
+        # Dependencies selected for this run have normally been prefetched by now, but make sure
+        # that all sources for this build type are in place before building anything.
+        self.prefetch_dependency_sources(dependencies_matching_group)
+
+        if self.args.dependency_parallelism > 1:
+            log("Building up to %d dependencies at a time for build type %s",
+                self.args.dependency_parallelism, build_type)
+            DependencyScheduler(
+                dependencies_matching_group, self.args.dependency_parallelism
+            ).run(
+                prepare_fn=self.prepare_to_build_dependency,
+                build_fn=self.build_dependency_in_child_process,
+                result_fn=self.process_child_build_result)
+            return
 
         for dep in dependencies_matching_group:
-            self.perform_pre_build_steps(dep)
-            should_build = dep.should_build(self)
-            should_rebuild = self.should_rebuild_dependency(dep)
-            only_process_flags = not should_build or not should_rebuild
-            self.build_dependency(dep, only_process_flags=only_process_flags)
-            if only_process_flags:
-                log(f"Skipped dependency {dep.name}: "
-                    f"should_build={should_build}, "
-                    f"should_rebuild={should_rebuild}.")
-            else:
+            if self.prepare_to_build_dependency(dep):
+                self.build_dependency(dep)
                 self.check_spurious_a_out_file()
+                self.mark_dependency_finished(dep)
+
+    def prepare_to_build_dependency(self, dep: Dependency) -> bool:
+        """
+        Returns True if the given dependency needs to be built. Otherwise, only processes the
+        flags for the dependency and returns False.
+        """
+        self.wait_for_prerequisite_build_types(dep)
+        self.perform_pre_build_steps(dep)
+        should_build = dep.should_build(self)
+        should_rebuild = self.should_rebuild_dependency(dep)
+        if should_build and should_rebuild:
+            return True
+        self.build_dependency(dep, only_process_flags=True)
+        log(f"Skipped dependency {dep.name}: "
+            f"should_build={should_build}, "
+            f"should_rebuild={should_rebuild}.")
+        self.mark_dependency_finished(dep)
+        return False
+
+    def wait_for_prerequisite_build_types(self, dep: Dependency) -> None:
+        for prerequisite_build_type in dep.get_prerequisite_build_types(self.build_type):
+            event = self.dependency_finished_events.get((prerequisite_build_type, dep.name))
+            if event is not None and not event.is_set():
+                log("Waiting for %s to be built for build type %s before building it for %s",
+                    dep.name, prerequisite_build_type, self.build_type)
+                event.wait()
+
+    def mark_dependency_finished(self, dep: Dependency) -> None:
+        event = self.dependency_finished_events.get((self.build_type, dep.name))
+        if event is not None:
+            event.set()
+
+    def build_dependency_in_child_process(self, dep: Dependency) -> Set[str]:
+        """
+        Builds the given dependency in a child process created by DependencyScheduler. Returns the
+        state that has to be propagated back to the parent process.
+        """
+        self.build_dependency(dep)
+        self.check_spurious_a_out_file()
+        return self.additional_allowed_shared_lib_paths
+
+    def process_child_build_result(self, dep: Dependency, result: Set[str]) -> None:
+        self.additional_allowed_shared_lib_paths.update(result)
+        self.mark_dependency_finished(dep)
 
     def get_install_prefix(self) -> str:
         return os.path.join(self.fs_layout.tp_installed_dir, self.build_type.dir_name)
@@ -1244,14 +1683,158 @@ class Builder(BuilderInterface):
         colored_log(YELLOW_COLOR, "Building %s (%s)", dep.name, self.build_type)
         colored_log(YELLOW_COLOR, SEPARATOR)
 
+        if dep.name not in self.pre_downloaded_dependency_names:
+            self.download_dependency_sources(dep)
+            # This could be running in a forked child process, so save the checksums here.
+            self.download_manager.save_added_checksums()
+
+        self.fossa_deps.append({
+            "name": dep.name,
+            "version": dep.version,
+            "url": dep.download_url
+        })
+
+        self.set_custom_patchelf_path()
+
+    def add_missing_checksums(self, deps: List[Dependency]) -> None:
+        """
+        Computes the checksums of already downloaded archives of the given dependencies, including
+        their extra downloads, that are missing from the checksum file, using a pool of worker
+        threads. Checksums of archives that still have to be downloaded are computed while they
+        are being downloaded.
+        """
+        archive_paths: List[str] = []
+        for dep in deps:
+            archive_path = self.fs_layout.get_archive_path(dep)
+            if archive_path is not None and not dep.local_archive:
+                archive_paths.append(archive_path)
+            for extra in getattr(dep, 'extra_downloads', []):
+                assert extra.archive_name is not None
+                archive_paths.append(
+                    os.path.join(self.fs_layout.tp_download_dir, extra.archive_name))
+        self.download_manager.add_missing_checksums(
+            archive_paths, parallelism=self.args.prefetch_parallelism)
+
+    def prefetch_dependency_sources(self, deps: List[Dependency]) -> None:
+        """
+        Downloads, extracts, and patches the sources of the given dependencies, including their
+        extra downloads, using a pool of worker threads. Dependencies that were already prefetched
+        are skipped.
+        """
+        deps_by_src_path: Dict[str, List[Dependency]] = {}
+        for dep in deps:
+            if dep.name not in self.pre_downloaded_dependency_names:
+                # Dependencies sharing a source directory, e.g. parts of the LLVM project, are
+                # prefetched one after another by the same task.
+                deps_by_src_path.setdefault(self.fs_layout.get_source_path(dep), []).append(dep)
+        if not deps_by_src_path:
+            return
+
+        def prefetch(deps_to_prefetch: List[Dependency]) -> List[Tuple[str, float]]:
+            elapsed_times: List[Tuple[str, float]] = []
+            for dep in deps_to_prefetch:
+                start_time_sec = time.time()
+                self.download_dependency_sources(dep)
+                elapsed_sec = time.time() - start_time_sec
+                log("Prefetched %s in %.1f sec", dep.name, elapsed_sec)
+                elapsed_times.append((dep.name, elapsed_sec))
+            return elapsed_times
+
+        num_deps = sum(len(dep_group) for dep_group in deps_by_src_path.values())
+        log("Prefetching %d dependencies using %d threads",
+            num_deps, self.args.prefetch_parallelism)
+        start_time_sec = time.time()
+        elapsed_times: List[Tuple[str, float]] = []
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.args.prefetch_parallelism) as executor:
+            futures = [
+                executor.submit(prefetch, dep_group) for dep_group in deps_by_src_path.values()
+            ]
+            for future in futures:
+                elapsed_times.extend(future.result())
+
+        for dep_group in deps_by_src_path.values():
+            self.pre_downloaded_dependency_names.update(dep.name for dep in dep_group)
+        log("Prefetched %d dependencies in %.1f sec. Time per dependency:\n%s",
+            num_deps,
+            time.time() - start_time_sec,
+            '\n'.join(
+                '    %-30s %8.1f sec' % (dep_name, elapsed_sec)
+                for dep_name, elapsed_sec in sorted(
+                    elapsed_times, key=lambda item: item[1], reverse=True)))
+
+    def verify_patches(self) -> None:
+        """
+        Checks that the patches of the selected dependencies apply to their source archives, using
+        a pool of worker threads. Nothing is built, and the source directories are not modified.
+        """
+        deps_by_patch_key: Dict[Tuple[Any, ...], Dependency] = {}
+        for dep in self.selected_dependencies:
+            archive_path = self.fs_layout.get_archive_path(dep)
+            if dep.patches and archive_path is not None and not dep.local_archive:
+                # Parts of the LLVM project share the archive and the patches.
+                deps_by_patch_key.setdefault(
+                    (archive_path, dep.patch_strip, tuple(dep.patches)), dep)
+
+        def verify(dep: Dependency) -> Optional[str]:
+            archive_path = self.fs_layout.get_archive_path(dep)
+            assert archive_path is not None
+            assert dep.download_url is not None
+            assert dep.patch_strip is not None
+            self.download_manager.ensure_file_downloaded(
+                url=dep.download_url,
+                file_path=archive_path,
+                enable_using_alternative_url=True)
+            try:
+                patch_util.verify_patches(
+                    archive_path,
+                    [os.path.join(YB_THIRDPARTY_DIR, 'patches', patch) for patch in dep.patches],
+                    strip=dep.patch_strip)
+            except patch_util.PatchApplicationError as ex:
+                return str(ex)
+            return None
+
+        deps = sorted(deps_by_patch_key.values(), key=lambda dep: dep.name)
+        log("Verifying patches of %d dependencies using %d threads",
+            len(deps), self.args.prefetch_parallelism)
+        start_time_sec = time.time()
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.args.prefetch_parallelism) as executor:
+            errors = list(executor.map(verify, deps))
+        self.download_manager.save_added_checksums()
+        failed_deps = [dep for dep, error in zip(deps, errors) if error is not None]
+        log("Verified patches of %d dependencies in %.1f sec:\n%s",
+            len(deps),
+            time.time() - start_time_sec,
+            '\n'.join(
+                '    %-30s %s' % (dep.name, 'FAILED' if error is not None else 'OK')
+                for dep, error in zip(deps, errors)))
+        for dep, error in zip(deps, errors):
+            if error is not None:
+                log("Patches of %s do not apply:\n%s", dep.name, error)
+        if failed_deps:
+            fatal("Patches of %d dependencies do not apply: %s",
+                  len(failed_deps), ', '.join(dep.name for dep in failed_deps))
+
+    def download_dependency_sources(self, dep: Dependency) -> None:
         src_path, src_path_type = self.fs_layout.get_source_path_with_type(dep)
 
-        def do_default_download() -> None:
+        def download_into(path: str) -> None:
             self.download_manager.download_dependency(
                 dep=dep,
-                src_path=src_path,
+                src_path=path,
                 archive_path=self.fs_layout.get_archive_path(dep))
 
+        def do_default_download() -> None:
+            if (self.source_store is not None and
+                    dep.download_url is not None and
+                    not dep.local_archive and
+                    not dep.mkdir_only):
+                self.source_store.materialize(
+                    self.get_source_store_key(dep), src_path, populate=download_into)
+            else:
+                download_into(src_path)
+
         if src_path_type == file_system_layout.SourcePathType.DEFAULT:
             log("Downloading %s", dep)
             do_default_download()
@@ -1275,14 +1858,6 @@ class Builder(BuilderInterface):
             raise ValueError("Unhandled source path type: %s for %s. Source path: %s" % (
                 src_path_type, dep.name, src_path))
 
-        self.fossa_deps.append({
-            "name": dep.name,
-            "version": dep.version,
-            "url": dep.download_url
-        })
-
-        self.set_custom_patchelf_path()
-
     def set_custom_patchelf_path(self) -> None:
         custom_patchelf_path = os.path.join(
             os.path.join(self.fs_layout.tp_installed_dir, 'uninstrumented', 'bin', 'patchelf'))
@@ -1291,6 +1866,20 @@ class Builder(BuilderInterface):
             ('ALREADY EXISTS.' if os.path.exists(custom_patchelf_path) else 'DOES NOT EXIST YET.'))
         patchelf_util.set_custom_patchelf_path(custom_patchelf_path)
 
+    def set_up_compiler_and_flags(self, dep: Dependency) -> None:
+        self.compiler_choice.set_compiler(
+            use_compiler_wrapper=self.args.use_compiler_wrapper or dep.need_compiler_wrapper(self))
+        self.init_flags(dep)
+
+        # This is needed at least for glog to be able to find gflags.
+        self.add_rpath(
+            os.path.join(self.fs_layout.tp_installed_dir, self.build_type.dir_name, 'lib'))
+
+        if self.build_type != BuildType.COMMON:
+            # Needed to find libunwind for Clang 10 when using compiler-rt.
+            self.add_rpath(os.path.join(
+                self.fs_layout.tp_installed_dir, BuildType.COMMON.dir_name, 'lib'))
+
     def get_clang_toolchain_dir(self) -> Optional[str]:
         if self.toolchain and self.compiler_choice.is_clang():
             return self.toolchain.toolchain_root
@@ -1306,23 +1895,12 @@ class Builder(BuilderInterface):
             the build.
         """
 
-        self.compiler_choice.set_compiler(
-            use_compiler_wrapper=self.args.use_compiler_wrapper or dep.need_compiler_wrapper(self))
         if self.args.download_extract_only:
             log("Skipping build of dependency %s, build type %s, --download-extract-only is "
                 "specified.", dep.name, self.build_type)
             return
 
-        self.init_flags(dep)
-
-        # This is needed at least for glog to be able to find gflags.
-        self.add_rpath(
-            os.path.join(self.fs_layout.tp_installed_dir, self.build_type.dir_name, 'lib'))
-
-        if self.build_type != BuildType.COMMON:
-            # Needed to find libunwind for Clang 10 when using compiler-rt.
-            self.add_rpath(os.path.join(
-                self.fs_layout.tp_installed_dir, BuildType.COMMON.dir_name, 'lib'))
+        self.set_up_compiler_and_flags(dep)
 
         if only_process_flags:
             log("Skipping the build of dependency %s (only_process_flags is set)", dep.name)
@@ -1401,6 +1979,34 @@ class Builder(BuilderInterface):
             # create some programs that have memory leaks and the configure process would fail.
             env_vars["ASAN_OPTIONS"] = ':'.join(["detect_odr_violation=0", "detect_leaks=0"])
 
+        if self.jobserver is not None:
+            # Used by the compiler wrapper when the build tool is not a jobserver client.
+            env_vars[env_var_names.JOBSERVER_FIFO] = self.jobserver.fifo_path
+
+        artifact_cache_key_and_inputs = self.get_artifact_cache_key_and_inputs(dep)
+        if artifact_cache_key_and_inputs is not None:
+            assert self.artifact_cache is not None
+            restored_files = self.artifact_cache.restore(
+                artifact_cache_key_and_inputs[0], self.fs_layout.tp_installed_dir)
+            if restored_files is not None:
+                log("Restored %s (%s) from the artifact cache instead of building it",
+                    dep.name, self.build_type)
+                # The restored files are known exactly, even if other dependencies are being
+                # built at the same time.
+                self.save_installed_file_manifest(dep, restored_files)
+                self.check_installed_libraries(dep, restored_files)
+                # The build directory is not used, but should_rebuild_dependency requires it to
+                # exist, in addition to an up-to-date build stamp.
+                file_util.mkdir_p(self.fs_layout.get_build_dir_for_dependency(dep, self.build_type))
+                self.save_build_stamp_for_dependency(dep)
+                return
+        installed_dir_snapshot: Optional[DirSnapshot] = None
+        if self.should_record_installed_files():
+            installed_dir_snapshot = self.get_installed_dir_snapshot()
+            # Make CMake overwrite installed files that are up to date, so that we can tell that
+            # they were installed by this dependency.
+            env_vars['CMAKE_INSTALL_ALWAYS'] = '1'
+
         compile_commands_tmp_dir = None
 
         clang_toolchain_dir = self.get_clang_toolchain_dir()
@@ -1426,12 +2032,25 @@ class Builder(BuilderInterface):
                     log("PATH=%s" % os.getenv('PATH'))
                     dep.build(self)
 
+            if installed_dir_snapshot is not None:
+                installed_files = get_new_or_modified_files(
+                    installed_dir_snapshot, self.get_installed_dir_snapshot())
+                self.save_installed_file_manifest(dep, installed_files)
+                # Check libraries before storing them in the artifact cache, because the check
+                # may modify them, e.g. remove unneeded dependencies on system libraries.
+                self.check_installed_libraries(dep, installed_files)
+                if (artifact_cache_key_and_inputs is not None and
+                        self.should_store_in_artifact_cache()):
+                    self.store_dependency_in_artifact_cache(
+                        dep, artifact_cache_key_and_inputs, installed_files)
+
             if compile_commands_tmp_dir is not None:
                 compile_commands.aggregate_compile_commands(
                     compile_commands_tmp_dir, build_dir, self.bazel_path_mapping,
                     clang_toolchain_dir, src_dir)
 
-            if self.args.delete_build_dir_after and dep.name not in ('abseil', 'icu4c'):
+            if (self.args.delete_build_dir_after and
+                    dep.name not in DEPENDENCIES_WITH_REUSED_BUILD_DIRS):
                 # We cannot delete the Abseil build directory because it is necessary by the
                 # Google tcmalloc Bazel build.
                 #
@@ -1449,8 +2068,256 @@ class Builder(BuilderInterface):
         log("Finished building %s (%s)", dep.name, self.build_type)
         log("")
 
+    def should_record_installed_files(self) -> bool:
+        # Files installed by a dependency are found by comparing the installation directory before
+        # and after the build, which is only possible if dependencies are built one at a time.
+        # Building them concurrently requires --skip-installed-file-tracking.
+        return not self.args.skip_installed_file_tracking
+
+    def should_store_in_artifact_cache(self) -> bool:
+        return (self.artifact_cache is not None and
+                not self.args.artifact_cache_read_only and
+                self.should_record_installed_files())
+
+    def save_installed_file_manifest(self, dep: Dependency, installed_files: List[str]) -> None:
+        """
+        Saves the list of files installed by the given dependency, relative to the top-level
+        installation directory, into the build directory of the current build type.
+        """
+        manifest_path = self.fs_layout.get_installed_file_manifest_path(dep, self.build_type)
+        file_util.mkdir_p(os.path.dirname(manifest_path))
+        write_json_file(manifest_path, {
+            'dependency': dep.name,
+            'version': dep.version,
+            'build_type': self.build_type.dir_name,
+            'files': installed_files,
+        })
+        log("Saved the list of %d files installed by %s (%s) to %s",
+            len(installed_files), dep.name, self.build_type, manifest_path)
+
+    def create_lib_tester(self) -> LibTestBase:
+        lib_tester = get_lib_tester(
+            fs_layout=self.fs_layout,
+            parallelism=self.args.lib_check_parallelism,
+            cross_validate_elf_reader=self.args.cross_validate_elf_reader)
+        lib_tester.add_allowed_shared_lib_paths(self.additional_allowed_shared_lib_paths)
+        if self.compiler_choice.is_linux_clang():
+            clang_library_dirs: List[str] = get_clang_library_dir(
+                self.compiler_choice.get_c_compiler(),
+                all_dirs=True
+            )
+            assert len(clang_library_dirs) > 0
+            lib_tester.add_allowed_shared_lib_paths(set(clang_library_dirs))
+        lib_tester.configure_for_compiler(self.compiler_choice)
+        return lib_tester
+
+    def check_installed_libraries(self, dep: Dependency, installed_files: List[str]) -> None:
+        """
+        Checks the executables and libraries installed by the given dependency right away, so that
+        the build fails before building the remaining dependencies if there are problems with them.
+        All installed files are checked again at the end of the build.
+        """
+        if self.args.skip_library_checking:
+            return
+        lib_tester = self.create_lib_tester()
+        files_to_check = lib_tester.select_installed_files_to_check(installed_files)
+        if not files_to_check:
+            return
+        log("Checking libraries installed by %s (%s)", dep.name, self.build_type)
+        lib_tester.check_files(files_to_check, use_cache=False)
+
+    def get_dependency_source_key_inputs(self, dep: Dependency) -> List[str]:
+        """
+        Returns the artifact cache key inputs describing the sources, patches, and the build
+        definition of the given dependency.
+        """
+        key_inputs = ['dependency=%s' % dep.name, 'version=%s' % dep.version]
+        key_inputs.extend(self.get_patched_source_key_inputs(dep))
+
+        # The module defining the dependency, as well as the modules of its base classes, e.g.
+        # llvm_part for parts of the LLVM project.
+        module_names = [
+            cls.__module__ for cls in type(dep).__mro__
+            if cls.__module__.startswith('build_definitions.')
+        ]
+        for module_name in sorted(set(module_names)):
+            module_path = sys.modules[module_name].__file__
+            assert module_path is not None
+            key_inputs.append('build_definition_sha256[%s]=%s' % (
+                module_name, self.get_input_file_sha256(module_path)))
+        return key_inputs
+
+    def get_patched_source_key_inputs(self, dep: Dependency) -> List[str]:
+        """
+        Returns the key inputs describing the source archives of the given dependency and the
+        patches applied to them.
+        """
+        key_inputs = []
+        archive_names = [dep.get_archive_name()] + [
+            extra.archive_name for extra in dep.extra_downloads]
+        for archive_name in archive_names:
+            if archive_name is not None:
+                key_inputs.append('archive_sha256[%s]=%s' % (
+                    archive_name, self.download_manager.get_expected_checksum(archive_name)))
+        key_inputs.append('patch_strip=%s' % dep.patch_strip)
+        for patch in dep.patches:
+            key_inputs.append('patch_sha256[%s]=%s' % (
+                patch, self.get_input_file_sha256(os.path.join('patches', patch))))
+        key_inputs.append('post_patch=%s' % shlex_join(dep.post_patch))
+        return key_inputs
+
+    def get_source_store_key(self, dep: Dependency) -> str:
+        """
+        Returns the source store key of the extracted and patched source tree of the given
+        dependency. The dependency name is not included, so that dependencies sharing a source
+        directory, such as parts of the LLVM project, share the store entry too.
+        """
+        key_inputs = self.get_patched_source_key_inputs(dep) + [
+            'patch_version=%s' % dep.patch_version,
+            'archive_subpaths=%s' % ','.join(dep.archive_subpaths),
+        ]
+        for extra in dep.extra_downloads:
+            key_inputs.append('extra_download[%s]=%s:%s' % (
+                extra.archive_name, extra.dir_name, extra.post_exec))
+        return compute_cache_key(key_inputs)
+
+    def get_input_file_sha256(self, path: str) -> str:
+        """
+        Returns the SHA-256 checksum of the given file, relative to the repository root unless
+        absolute. Input files do not change during the build, so checksums are computed once.
+        """
+        abs_path = os.path.join(YB_THIRDPARTY_DIR, path)
+        if abs_path not in self.input_file_sha256s:
+            if not os.path.exists(abs_path):
+                fatal("Build input file %s does not exist", abs_path)
+            self.input_file_sha256s[abs_path] = compute_file_sha256(abs_path)
+        return self.input_file_sha256s[abs_path]
+
+    def get_compiler_and_flags_key_inputs(self, dep: Dependency) -> List[str]:
+        """
+        Returns the build stamp and artifact cache key inputs describing the target platform,
+        compiler, and flags of the given dependency. Must be called after the flags for the
+        dependency are initialized.
+        """
+        sys_conf = local_sys_conf()
+        key_inputs = [
+            'os=%s' % sys_conf.short_os_name_and_version(),
+            'arch=%s' % sys_conf.architecture,
+            'build_type=%s' % self.build_type.dir_name,
+            'lto_type=%s' % self.lto_type,
+            'use_compiler_wrapper=%s' % self.compiler_choice.use_compiler_wrapper,
+        ]
+        for compiler_identification in (self.compiler_choice.cc_identification,
+                                        self.compiler_choice.cxx_identification):
+            assert compiler_identification is not None
+            key_inputs += [
+                'compiler_path=%s' % compiler_identification.compiler_path,
+                'compiler_version_output=%s' % compiler_identification.full_version_output_str,
+            ]
+        for flags_name, flags in [
+                ('compiler_flags', self.get_effective_compiler_flags(dep)),
+                ('c_flags', self.get_effective_c_flags(dep)),
+                ('cxx_flags', self.get_effective_cxx_flags(dep)),
+                ('preprocessor_flags', self.get_effective_preprocessor_flags(dep)),
+                ('assembler_flags', self.get_effective_assembler_flags(dep)),
+                ('ld_flags', self.get_effective_ld_flags(dep)),
+                ('executable_ld_flags', self.get_effective_executable_ld_flags(dep)),
+                ('libs', self.libs),
+                ('ld_flags_to_append', dep.get_compiler_wrapper_ld_flags_to_append(self)),
+                ('ld_flags_to_remove', sorted(dep.get_compiler_wrapper_ld_flags_to_remove(self))),
+                ]:
+            key_inputs.append('%s=%s' % (flags_name, shlex_join(flags)))
+        return key_inputs
+
+    def get_artifact_cache_key_and_inputs(
+            self, dep: Dependency) -> Optional[Tuple[str, List[str]]]:
+        """
+        Returns the artifact cache key for the given dependency in the current build type, and the
+        list of inputs the key is computed from, or None if the artifact cache should not be used
+        for this dependency. Must be called after the flags for the dependency are initialized.
+        """
+        if self.artifact_cache is None:
+            return None
+
+        reason_not_to_use_cache: Optional[str] = None
+        src_path_type = self.fs_layout.get_source_path_with_type(dep)[1]
+        if dep.local_archive:
+            reason_not_to_use_cache = 'it is built from a local directory'
+        elif src_path_type == file_system_layout.SourcePathType.DEV_REPO:
+            reason_not_to_use_cache = 'it is built from a development repository'
+        elif dep.name in DEPENDENCIES_WITH_REUSED_BUILD_DIRS:
+            reason_not_to_use_cache = 'its build directory is used by other builds'
+        elif self.args.compile_commands or self.args.postprocess_compile_commands_only:
+            reason_not_to_use_cache = 'compilation commands are being collected'
+        if reason_not_to_use_cache is not None:
+            log("Not using the artifact cache for %s because %s",
+                dep.name, reason_not_to_use_cache)
+            return None
+
+        key_inputs = self.get_dependency_source_key_inputs(dep)
+        # Dependencies built against a different version of a direct or indirect requirement are
+        # different.
+        for required_dep in self.get_transitive_requirements(dep):
+            key_inputs.extend(
+                'requires.' + key_input
+                for key_input in self.get_dependency_source_key_inputs(required_dep))
+
+        key_inputs.append('install_dir=%s' % self.fs_layout.tp_installed_dir)
+        key_inputs += self.get_compiler_and_flags_key_inputs(dep)
+        return compute_cache_key(key_inputs), key_inputs
+
+    def get_transitive_requirements(self, dep: Dependency) -> List[Dependency]:
+        """
+        Returns the dependencies the given dependency requires directly or indirectly, sorted by
+        name. Requirements on unknown dependencies are ignored.
+        """
+        required_deps: Dict[str, Dependency] = {}
+        names_to_visit = list(dep.requires)
+        while names_to_visit:
+            name = names_to_visit.pop()
+            required_dep = self.dependencies_by_name.get(name)
+            if required_dep is None or name in required_deps:
+                continue
+            required_deps[name] = required_dep
+            names_to_visit.extend(required_dep.requires)
+        return [required_deps[name] for name in sorted(required_deps)]
+
+    def get_installed_dir_snapshot(self) -> DirSnapshot:
+        """
+        Returns a snapshot of the installation directories a dependency of the current build type
+        may install files into, i.e. the directory of the build type and the common directory.
+        Paths are relative to the top-level installation directory.
+        """
+        snapshot: DirSnapshot = {}
+        for build_type_dir_name in sorted(set([self.build_type.dir_name,
+                                               BuildType.COMMON.dir_name])):
+            snapshot.update(snapshot_dir(self.fs_layout.tp_installed_dir, build_type_dir_name))
+        return snapshot
+
+    def store_dependency_in_artifact_cache(
+            self,
+            dep: Dependency,
+            cache_key_and_inputs: Tuple[str, List[str]],
+            installed_files: List[str]) -> None:
+        assert self.artifact_cache is not None
+        if not installed_files:
+            log("Dependency %s (%s) did not install any files, not storing it in the artifact "
+                "cache", dep.name, self.build_type)
+            return
+        cache_key, key_inputs = cache_key_and_inputs
+        self.artifact_cache.store(
+            cache_key,
+            self.fs_layout.tp_installed_dir,
+            installed_files,
+            metadata={
+                'dependency': dep.name,
+                'version': dep.version,
+                'build_type': self.build_type.dir_name,
+                'key_inputs': key_inputs,
+            })
+
     # Determines if we should rebuild a component with the given name based on the existing "stamp"
-    # file and the current value of the "stamp" (based on Git SHA1 and local changes) for the
+    # file and the current value of the "stamp" (see get_build_stamp_for_dependency) for the
     # component. The result is returned in should_rebuild_component_rv variable, which should have
     # been made local by the caller.
     def should_rebuild_dependency(self, dep: Dependency) -> bool:
@@ -1496,43 +2363,25 @@ class Builder(BuilderInterface):
             dep.name, indent_lines(new_build_stamp))
         return True
 
-    # Come up with a string that allows us to tell when to rebuild a particular third-party
-    # dependency. The result is returned in the get_build_stamp_for_component_rv variable, which
-    # should have been made local by the caller.
     def get_build_stamp_for_dependency(self, dep: Dependency) -> str:
-        module_name = dep.__class__.__module__
-        assert isinstance(module_name, str), "Dependency's module is not a string: %s" % module_name
-        assert module_name.startswith('build_definitions.'), "Invalid module name: %s" % module_name
-        module_name_components = module_name.split('.')
-        assert len(module_name_components) == 2, (
-                "Expected two components: %s" % module_name_components)
-        module_name_final = module_name_components[-1]
-        input_files_for_stamp = [
-            'python/yugabyte_db_thirdparty/yb_build_thirdparty_main.py',
-            'build_thirdparty.sh',
-            os.path.join('python', 'build_definitions', '%s.py' % module_name_final)
-        ]
-
-        for path in input_files_for_stamp:
-            abs_path = os.path.join(YB_THIRDPARTY_DIR, path)
-            if not os.path.exists(abs_path):
-                fatal("File '%s' does not exist -- expecting it to exist when creating a 'stamp' "
-                      "for the build configuration of '%s'.", abs_path, dep.name)
-
-        with PushDir(YB_THIRDPARTY_DIR):
-            git_commit_sha1 = subprocess.check_output(
-                ['git', 'log', '--pretty=%H', '-n', '1'] + input_files_for_stamp
-            ).strip().decode('utf-8')
-            build_stamp = 'git_commit_sha1={}\n'.format(git_commit_sha1)
-            for git_extra_arg in (None, '--cached'):
-                git_extra_args = [git_extra_arg] if git_extra_arg else []
-                git_diff = subprocess.check_output(
-                    ['git', 'diff'] + git_extra_args + input_files_for_stamp)
-                git_diff_sha256 = hashlib.sha256(git_diff).hexdigest()
-                build_stamp += 'git_diff_sha256{}={}\n'.format(
-                    '_'.join(git_extra_args).replace('--', '_'),
-                    git_diff_sha256)
-            return build_stamp
+        """
+        Returns a string that allows us to tell when to rebuild a particular third-party
+        dependency. It consists of checksums of the build scripts, the dependency's source archive,
+        patches, and build definition, and of the compiler and flags used to build it. The stamp is
+        computed once per dependency and build type, and the flags are captured at that time.
+        """
+        stamp_key = (self.build_type, dep.name)
+        if stamp_key not in self.build_stamps:
+            # The flags might not have been initialized for this dependency yet.
+            self.set_up_compiler_and_flags(dep)
+            stamp_lines = [
+                'sha256[%s]=%s' % (path, self.get_input_file_sha256(path))
+                for path in BUILD_STAMP_INPUT_FILES
+            ]
+            stamp_lines += self.get_dependency_source_key_inputs(dep)
+            stamp_lines += self.get_compiler_and_flags_key_inputs(dep)
+            self.build_stamps[stamp_key] = ''.join(line + '\n' for line in stamp_lines)
+        return self.build_stamps[stamp_key]
 
     def save_build_stamp_for_dependency(self, dep: Dependency) -> None:
         stamp = self.get_build_stamp_for_dependency(dep)
@@ -1569,11 +2418,13 @@ class Builder(BuilderInterface):
                 target_dirs = [build_dir]
 
             for target_dir in target_dirs:
-                log("Bootstrapping %s from %s using rsync", target_dir, src_dir)
+                log("Bootstrapping %s from %s", target_dir, src_dir)
                 bootstrap_start_sec = time.time()
-                subprocess.check_call(['rsync', '-a', src_dir + '/', target_dir])
+                # The build modifies files in the build directory, so hard links are not allowed.
+                clone_method = clone_tree(src_dir, target_dir)
                 bootstrap_elapsed_sec = time.time() - bootstrap_start_sec
-                log("Bootstrapping %s took %.3f sec", target_dir, bootstrap_elapsed_sec)
+                log("Bootstrapping %s using %s took %.3f sec",
+                    target_dir, clone_method, bootstrap_elapsed_sec)
 
         return build_dir
 
@@ -1589,14 +2440,21 @@ class Builder(BuilderInterface):
 
     def check_cxx_compiler_flag(self, flag: str) -> bool:
         compiler_path = self.compiler_choice.get_cxx_compiler()
-        log(f"Checking if the compiler {compiler_path} accepts the flag {flag}")
-        process = subprocess.Popen(
-            [compiler_path, '-x', 'c++', flag, '-'],
-            stdin=subprocess.PIPE)
-        assert process.stdin is not None
-        process.stdin.write("int main() { return 0; }".encode('utf-8'))
-        process.stdin.close()
-        return process.wait() == 0
+
+        def probe() -> bool:
+            log(f"Checking if the compiler {compiler_path} accepts the flag {flag}")
+            process = subprocess.Popen(
+                [compiler_path, '-x', 'c++', flag, '-'],
+                stdin=subprocess.PIPE)
+            assert process.stdin is not None
+            process.stdin.write("int main() { return 0; }".encode('utf-8'))
+            process.stdin.close()
+            return process.wait() == 0
+
+        probe_cache = self.compiler_choice.probe_cache
+        if probe_cache is None:
+            return probe()
+        return probe_cache.check_flag(compiler_path, 'c++:' + flag, probe)
 
     def add_checked_flag(self, flags: List[str], flag: str) -> None:
         if self.check_cxx_compiler_flag(flag):
@@ -0,0 +1,149 @@
+# Copyright (c) YugabyteDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+#
+
+"""
+An index of SHA-256 checksums of downloaded files, so that the checksum of a file that has not
+changed since it was verified does not have to be computed again. A file is considered unchanged if
+its size, modification time and inode number are the same.
+"""
+
+import concurrent.futures
+import fcntl
+import json
+import os
+import threading
+import time
+
+from typing import Any, Dict, List
+
+from yugabyte_db_thirdparty.custom_logging import log
+from yugabyte_db_thirdparty.file_util import mkdir_p
+from yugabyte_db_thirdparty.util import (
+    compute_file_sha256,
+    get_temporal_randomized_file_name_suffix,
+)
+
+CHECKSUM_INDEX_FILE_NAME = '.yb_checksum_index.json'
+
+
+def get_stat_key(file_path: str) -> List[int]:
+    st = os.stat(file_path)
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+
+class ChecksumIndex:
+    """
+    The index is stored in a JSON file, mapping absolute file paths to their stat key (see
+    get_stat_key) and checksum. Concurrent builder processes update the file under a lock, and the
+    file is replaced atomically.
+    """
+
+    index_file_path: str
+    entries: Dict[str, Dict[str, Any]]
+    lock: threading.Lock
+
+    def __init__(self, index_file_path: str) -> None:
+        self.index_file_path = index_file_path
+        self.entries = self.load()
+        self.lock = threading.Lock()
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.index_file_path):
+            return {}
+        try:
+            with open(self.index_file_path) as input_file:
+                entries = json.load(input_file)
+        except (OSError, ValueError) as ex:
+            log("Ignoring invalid checksum index file %s: %s", self.index_file_path, ex)
+            return {}
+        if not isinstance(entries, dict):
+            log("Ignoring invalid checksum index file %s", self.index_file_path)
+            return {}
+        return entries
+
+    def update(self, entries_update: Dict[str, Dict[str, Any]]) -> None:
+        with self.lock:
+            self.entries.update(entries_update)
+            mkdir_p(os.path.dirname(self.index_file_path))
+            with open(self.index_file_path + '.lock', 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                # Another process might have added entries since we loaded the file.
+                entries = self.load()
+                entries.update(entries_update)
+                tmp_file_path = '%s.tmp.%s' % (
+                    self.index_file_path, get_temporal_randomized_file_name_suffix())
+                with open(tmp_file_path, 'w') as output_file:
+                    json.dump(entries, output_file, indent=2, sort_keys=True)
+                    output_file.write('\n')
+                os.rename(tmp_file_path, self.index_file_path)
+                self.entries = entries
+
+    def record(self, file_path: str, sha256: str) -> None:
+        """
+        Records the checksum of the given file, which must have been computed from its current
+        contents.
+        """
+        self.update({
+            os.path.abspath(file_path): {'stat': get_stat_key(file_path), 'sha256': sha256}
+        })
+
+    def get_sha256(self, file_path: str) -> str:
+        """
+        Returns the checksum of the given file from the index if the file has not changed since it
+        was recorded, or computes and records it otherwise.
+        """
+        entry = self.entries.get(os.path.abspath(file_path))
+        if entry is not None and entry.get('stat') == get_stat_key(file_path):
+            log("Using the checksum of %s from %s", file_path, self.index_file_path)
+            return str(entry['sha256'])
+        sha256 = compute_file_sha256(file_path)
+        self.record(file_path, sha256)
+        return sha256
+
+    def get_sha256s(self, file_paths: List[str], parallelism: int) -> Dict[str, str]:
+        """
+        Like get_sha256, but for multiple files. Checksums that are not in the index are computed
+        in parallel, see recompute. Returns a map from file paths to checksums.
+        """
+        checksums: Dict[str, str] = {}
+        changed_file_paths: List[str] = []
+        for file_path in file_paths:
+            entry = self.entries.get(os.path.abspath(file_path))
+            if entry is not None and entry.get('stat') == get_stat_key(file_path):
+                checksums[file_path] = str(entry['sha256'])
+            else:
+                changed_file_paths.append(file_path)
+        if changed_file_paths:
+            checksums.update(self.recompute(changed_file_paths, parallelism))
+        return checksums
+
+    def recompute(self, file_paths: List[str], parallelism: int) -> Dict[str, str]:
+        """
+        Computes the checksums of the given files in parallel, ignoring the index, and records
+        them. Returns a map from file paths to checksums.
+        """
+        start_time_sec = time.time()
+        stat_keys = {file_path: get_stat_key(file_path) for file_path in file_paths}
+        # hashlib releases the GIL while hashing large blocks, so threads use multiple cores.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=parallelism) as executor:
+            checksums = dict(zip(file_paths, executor.map(compute_file_sha256, file_paths)))
+        self.update({
+            os.path.abspath(file_path): {'stat': stat_keys[file_path], 'sha256': sha256}
+            for file_path, sha256 in checksums.items()
+        })
+        elapsed_time_sec = time.time() - start_time_sec
+        total_size_mb = sum(stat_key[0] for stat_key in stat_keys.values()) / 1024.0 / 1024.0
+        log("Computed checksums of %d files (%.1f MB) using %d threads in %.1f sec (%.1f MB/s)",
+            len(file_paths), total_size_mb, parallelism, elapsed_time_sec,
+            total_size_mb / max(elapsed_time_sec, 0.001))
+        return checksums
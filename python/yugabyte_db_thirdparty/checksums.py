@@ -12,13 +12,96 @@
 #
 
 import os
+import re
 
-from yugabyte_db_thirdparty.util import YB_THIRDPARTY_DIR
+from typing import Dict, Iterable
+
+from yugabyte_db_thirdparty.custom_logging import log
+from yugabyte_db_thirdparty.file_util import exclusive_file_lock, LOCK_SUFFIX
+from yugabyte_db_thirdparty.util import (
+    get_temporal_randomized_file_name_suffix,
+    YB_THIRDPARTY_DIR,
+)
 
 
 CHECKSUM_FILE_NAME = 'thirdparty_src_checksums.txt'
 CHECKSUM_SUFFIX = '.sha256'
 
+CHECKSUM_RE = re.compile('^[0-9a-f]{64}$')
+
 
 def get_checksum_file_path() -> str:
     return os.path.join(YB_THIRDPARTY_DIR, CHECKSUM_FILE_NAME)
+
+
+def parse_checksum_lines(lines: Iterable[str]) -> Dict[str, str]:
+    """
+    Parses lines of the checksum file and returns a map from archive names to SHA-256 checksums.
+
+    >>> parse_checksum_lines(['# comment', '', '%s  b.tar.gz' % ('0' * 64)])
+    {'b.tar.gz': '0000000000000000000000000000000000000000000000000000000000000000'}
+    >>> try:
+    ...     parse_checksum_lines(['abc  b.tar.gz'])
+    ... except ValueError as ex:
+    ...     print(str(ex).split('. ')[0])
+    Invalid checksum: 'abc' for archive name: 'b.tar.gz'
+    """
+    file_name_to_checksum: Dict[str, str] = {}
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        checksum, file_name = line.split(None, 1)
+        if not CHECKSUM_RE.match(checksum):
+            raise ValueError(
+                "Invalid checksum: '%s' for archive name: '%s'. Expected to be a SHA-256 sum "
+                "(64 hex characters)." % (checksum, file_name))
+        file_name_to_checksum[file_name] = checksum
+    return file_name_to_checksum
+
+
+def load_checksum_file(checksum_file_path: str) -> Dict[str, str]:
+    with open(checksum_file_path, 'rt') as input_file:
+        return parse_checksum_lines(input_file)
+
+
+def format_checksum_lines(file_name_to_checksum: Dict[str, str]) -> str:
+    """
+    Formats the contents of the checksum file, sorted by archive name in the C locale order.
+
+    >>> print(format_checksum_lines({'b.zip': '1' * 64, 'B.zip': '2' * 64}), end='')
+    2222222222222222222222222222222222222222222222222222222222222222  B.zip
+    1111111111111111111111111111111111111111111111111111111111111111  b.zip
+    """
+    return ''.join(
+        '%s  %s\n' % (file_name_to_checksum[file_name], file_name)
+        for file_name in sorted(file_name_to_checksum))
+
+
+def add_checksums_to_file(
+        checksum_file_path: str,
+        new_checksums: Dict[str, str]) -> Dict[str, str]:
+    """
+    Merges the given checksums into the checksum file, and rewrites it sorted by archive name. The
+    file is re-read under a lock, so that checksums added by concurrent builder processes are not
+    lost, and is replaced atomically. Checksums that are already in the file are not changed.
+    Returns the merged map from archive names to checksums.
+    """
+    with exclusive_file_lock(checksum_file_path + LOCK_SUFFIX):
+        file_name_to_checksum = load_checksum_file(checksum_file_path)
+        num_added = 0
+        for file_name, checksum in sorted(new_checksums.items()):
+            existing_checksum = file_name_to_checksum.get(file_name)
+            if existing_checksum is None:
+                file_name_to_checksum[file_name] = checksum
+                num_added += 1
+            elif existing_checksum != checksum:
+                log("Not changing the checksum of %s in %s from %s to %s",
+                    file_name, checksum_file_path, existing_checksum, checksum)
+        tmp_file_path = '%s.tmp.%s' % (
+            checksum_file_path, get_temporal_randomized_file_name_suffix())
+        with open(tmp_file_path, 'wt') as output_file:
+            output_file.write(format_checksum_lines(file_name_to_checksum))
+        os.rename(tmp_file_path, checksum_file_path)
+    log("Added %d checksums to %s", num_added, checksum_file_path)
+    return file_name_to_checksum
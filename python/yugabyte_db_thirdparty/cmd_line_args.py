@@ -34,6 +34,7 @@ from yugabyte_db_thirdparty import intel_oneapi, env_var_names
 INCOMPATIBLE_ARGUMENTS: Dict[str, Set[str]] = {
     'toolchain': {'devtoolset', 'compiler_prefix', 'compiler_suffix'},
     'check_libs_only': {'download_extract_only', 'create_package', 'skip_library_checking'},
+    'verify_patches': {'download_extract_only', 'check_libs_only', 'create_package'},
 }
 
 
@@ -52,6 +53,10 @@ def parse_cmd_line_args() -> argparse.Namespace:
     parser.add_argument('--skip-tsan',
                         action='store_true',
                         help='Do not build TSAN instrumented dependencies.')
+    parser.add_argument('--parallel-build-types',
+                        action='store_true',
+                        help='Build the uninstrumented, ASAN, and TSAN dependencies at the same '
+                             'time, each build type in a separate process.')
     parser.add_argument('--clean',
                         action='store_true',
                         default=False,
@@ -105,6 +110,67 @@ def parse_cmd_line_args() -> argparse.Namespace:
               f'{env_var_names.MAKE_PARALLELISM} environment variable.',
               type=int)
 
+    parser.add_argument(
+        '--dependency-parallelism',
+        help='How many dependencies of the same build type to build at the same time, taking into '
+             'account the requirements declared by each dependency. The default is 1, which '
+             'builds dependencies one at a time in the order they are listed. This can also be '
+             f'specified using the {env_var_names.DEPENDENCY_PARALLELISM} environment variable.',
+        type=int,
+        default=int(os.getenv(env_var_names.DEPENDENCY_PARALLELISM, '1')))
+
+    parser.add_argument(
+        '--prefetch-parallelism',
+        help='How many dependencies to download, extract, and patch at the same time before '
+             'starting the build.',
+        type=int,
+        default=8)
+
+    parser.add_argument(
+        '--no-jobserver',
+        action='store_true',
+        help='Do not use a shared jobserver to limit the total number of concurrent compiler '
+             'processes across all build tool invocations to the make parallelism. Instead, pass '
+             'the -j option to each build tool invocation separately.')
+
+    parser.add_argument(
+        '--artifact-cache-dir',
+        help='A directory, possibly shared between hosts over NFS, for caching the files installed '
+             'by each dependency. A dependency is restored from this cache instead of being built '
+             'if its source archive, patches, build definition, flags, compiler, and build type '
+             'match a cache entry. This can also be specified using the '
+             f'{env_var_names.ARTIFACT_CACHE_DIR} environment variable.',
+        default=os.getenv(env_var_names.ARTIFACT_CACHE_DIR))
+
+    parser.add_argument(
+        '--artifact-cache-read-only',
+        action='store_true',
+        help='Only restore dependencies from the artifact cache, and do not add new entries to it.')
+
+    parser.add_argument(
+        '--download-cache-dir',
+        help='A directory to download source archives to instead of the download directory of '
+             'this checkout. It can be shared between multiple checkouts on the same host. '
+             'Concurrent builds wait for each other to download the same archive. This can also be '
+             f'specified using the {env_var_names.DOWNLOAD_CACHE_DIR} environment variable.',
+        default=os.getenv(env_var_names.DOWNLOAD_CACHE_DIR))
+
+    parser.add_argument(
+        '--source-store-dir',
+        help='A directory for storing extracted and patched source trees of dependencies, keyed by '
+             'the checksums of their source archives and patches. Source directories are cloned '
+             'from this store, using reflinks or hard links where the file system supports them, '
+             'instead of being extracted and patched again. This can also be specified using the '
+             f'{env_var_names.SOURCE_STORE_DIR} environment variable.',
+        default=os.getenv(env_var_names.SOURCE_STORE_DIR))
+
+    parser.add_argument(
+        '--shared-configure-cache',
+        action='store_true',
+        help='Share the results of autoconf configure checks that only depend on the compiler, '
+             'the C library, and the system between dependencies built with the same compiler, '
+             'build type, and flags. See configure_cache.py for the list of shared checks.')
+
     parser.add_argument(
         '--use-ccache',
         action='store_true',
@@ -144,6 +210,19 @@ def parse_cmd_line_args() -> argparse.Namespace:
         help='Only download and extract archives. Do not build any dependencies.',
         action='store_true')
 
+    parser.add_argument(
+        '--verify-patches',
+        help='Only check that the patches of the selected dependencies apply to their source '
+             'archives, in parallel. Do not build any dependencies.',
+        action='store_true')
+
+    parser.add_argument(
+        '--reverify-downloads',
+        help='Recompute the checksums of all archives in the download directory in parallel '
+             'instead of trusting previously verified checksums of unchanged files, and remove '
+             'archives with wrong checksums.',
+        action='store_true')
+
     parser.add_argument(
         '--license-report',
         action='store_true',
@@ -227,11 +306,35 @@ def parse_cmd_line_args() -> argparse.Namespace:
              'libraries.'
     )
 
+    parser.add_argument(
+        '--lib-check-parallelism',
+        help='How many processes to use for checking the dependencies of installed executables and '
+             'libraries. The default is the number of CPUs.',
+        type=int,
+        default=os.cpu_count() or 1)
+
+    parser.add_argument(
+        '--cross-validate-elf-reader',
+        action='store_true',
+        help='When checking the dependencies of installed executables and libraries on Linux, '
+             'also run ldd, patchelf and readelf on every file, and report any differences from '
+             'the results of the in-process ELF reader.')
+
     parser.add_argument(
         '--skip-library-checking',
         action='store_true',
         help='Skip checking the dependencies of installed executables and libraries.')
 
+    parser.add_argument(
+        '--skip-installed-file-tracking',
+        action='store_true',
+        help='Do not compare the installation directory before and after building each dependency '
+             'to find the files it installs. Installed-file manifests and per-dependency library '
+             'checks are then only produced for dependencies restored from the artifact cache, '
+             'and no new artifact cache entries are added. Required if --dependency-parallelism '
+             'is greater than 1, because concurrently built dependencies install into the same '
+             'directory.')
+
     parser.add_argument(
         '--snyk',
         help="Run Snyk Vulnerability scan on the downloaded and extracted dependencies. "
@@ -333,6 +436,33 @@ def parse_cmd_line_args() -> argparse.Namespace:
     if args.package_intel_oneapi and actual_arch != 'x86_64':
         raise ValueError('--package-intel-oneapi is only valid on x86_64')
 
+    if args.prefetch_parallelism < 1:
+        raise ValueError(
+            '--prefetch-parallelism must be at least 1, got %d' % args.prefetch_parallelism)
+
+    if args.lib_check_parallelism < 1:
+        raise ValueError(
+            '--lib-check-parallelism must be at least 1, got %d' % args.lib_check_parallelism)
+
+    if args.dependency_parallelism < 1:
+        raise ValueError(
+            '--dependency-parallelism must be at least 1, got %d' % args.dependency_parallelism)
+
+    if args.package_intel_oneapi and (args.dependency_parallelism > 1 or
+                                      args.parallel_build_types):
+        # Intel oneAPI packaging collects the needed libraries in global state during the DiskANN
+        # build, so it has to happen in this process.
+        log("Building dependencies one at a time because --package-intel-oneapi is specified")
+        args.dependency_parallelism = 1
+        args.parallel_build_types = False
+
+    if args.dependency_parallelism > 1 and not args.skip_installed_file_tracking:
+        raise ValueError(
+            '--dependency-parallelism greater than 1 requires --skip-installed-file-tracking: the '
+            'files installed by each dependency can only be found when dependencies are built one '
+            'at a time, so new artifact cache entries, installed-file manifests and per-dependency '
+            'library checks are not available when building dependencies concurrently.')
+
     if args.verbose:
         # This is used e.g. in compiler_wrapper.py.
         os.environ[env_var_names.VERBOSE] = '1'
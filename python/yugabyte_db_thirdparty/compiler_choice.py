@@ -24,6 +24,7 @@ from yugabyte_db_thirdparty.util import (
 from yugabyte_db_thirdparty.devtoolset import validate_devtoolset_compiler_path
 from yugabyte_db_thirdparty.linuxbrew import using_linuxbrew, get_linuxbrew_dir
 from yugabyte_db_thirdparty.arch import get_target_arch
+from yugabyte_db_thirdparty.compiler_probe_cache import CompilerProbeCache
 
 from yugabyte_db_thirdparty import env_var_names
 
@@ -52,6 +53,10 @@ class CompilerChoice:
     compiler_version_str: Optional[str]
     expected_major_compiler_version: Optional[int]
 
+    # Used to avoid invoking the same compiler to identify it in every run and for every
+    # dependency.
+    probe_cache: Optional[CompilerProbeCache]
+
     def __init__(
             self,
             compiler_family: str,
@@ -59,7 +64,8 @@ class CompilerChoice:
             compiler_suffix: str,
             devtoolset: Optional[int],
             use_ccache: bool,
-            expected_major_compiler_version: Optional[int]) -> None:
+            expected_major_compiler_version: Optional[int],
+            probe_cache: Optional[CompilerProbeCache] = None) -> None:
         assert compiler_family in ['gcc', 'clang']
         self.compiler_family = compiler_family
         self.compiler_prefix = compiler_prefix
@@ -78,6 +84,7 @@ class CompilerChoice:
         self.compiler_version_str = None
 
         self.expected_major_compiler_version = expected_major_compiler_version
+        self.probe_cache = probe_cache
 
         self.find_compiler()
         self.identify_compiler_version()
@@ -227,12 +234,17 @@ class CompilerChoice:
                 f"GCC version is too old: {compiler_identification}; "
                 f"required at least {LOWEST_GCC_VERSION_STR}")
 
+    def identify_compiler(self, compiler_path: str) -> CompilerIdentification:
+        if self.probe_cache is not None:
+            return self.probe_cache.identify_compiler(compiler_path)
+        return identify_compiler(compiler_path)
+
     def identify_compiler_version(self) -> None:
         c_compiler = self.get_c_compiler()
         cxx_compiler = self.get_cxx_compiler()
 
-        self.cc_identification = identify_compiler(c_compiler)
-        self.cxx_identification = identify_compiler(cxx_compiler)
+        self.cc_identification = self.identify_compiler(c_compiler)
+        self.cxx_identification = self.identify_compiler(cxx_compiler)
         if not self.cc_identification.is_compatible_with(self.cxx_identification):
             raise RuntimeError(
                 "C compiler and C++ compiler look incompatible. "
@@ -0,0 +1,132 @@
+# Copyright (c) YugabyteDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+#
+
+"""
+A persistent cache of compiler identification results and compiler flag probes. Results are keyed
+by a fingerprint of the compiler executable (its real path, size, modification time and ELF build
+ID), so they are reused across runs and build types until the compiler changes.
+"""
+
+import fcntl
+import json
+import os
+import threading
+
+from typing import Any, Callable, Dict, Optional
+
+from compiler_identification import CompilerIdentification, identify_compiler
+
+from yugabyte_db_thirdparty import elf_util
+from yugabyte_db_thirdparty.custom_logging import log
+from yugabyte_db_thirdparty.file_util import mkdir_p
+from yugabyte_db_thirdparty.util import get_temporal_randomized_file_name_suffix
+
+
+def get_compiler_fingerprint(compiler_path: str) -> str:
+    """
+    Returns a string that changes whenever the given compiler executable changes. The path as
+    invoked is included too, because e.g. clang and clang++ are usually the same executable that
+    behaves differently depending on its name.
+    """
+    real_path = os.path.realpath(compiler_path)
+    st = os.stat(real_path)
+    elf_file = elf_util.read_elf_file(real_path)
+    return '%s:%s:%d:%d:%s' % (
+        os.path.abspath(compiler_path), real_path, st.st_size, st.st_mtime_ns,
+        elf_file.build_id if elf_file is not None else None)
+
+
+class CompilerProbeCache:
+    """
+    The cache is stored in a JSON file, mapping compiler fingerprints to the output of the compiler
+    invoked with -v, and to the results of flag probes. Concurrent builder processes update the
+    file under a lock, and the file is replaced atomically.
+    """
+
+    cache_file_path: str
+    entries: Dict[str, Dict[str, Any]]
+    lock: threading.Lock
+
+    def __init__(self, cache_file_path: str) -> None:
+        self.cache_file_path = cache_file_path
+        self.entries = self.load()
+        self.lock = threading.Lock()
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.cache_file_path):
+            return {}
+        try:
+            with open(self.cache_file_path) as input_file:
+                entries = json.load(input_file)
+        except (OSError, ValueError) as ex:
+            log("Ignoring invalid compiler probe cache file %s: %s", self.cache_file_path, ex)
+            return {}
+        if not isinstance(entries, dict):
+            log("Ignoring invalid compiler probe cache file %s", self.cache_file_path)
+            return {}
+        return entries
+
+    def update(self, fingerprint: str, entry_update: Dict[str, Any]) -> None:
+        """
+        Merges the given update into the entry for the given compiler fingerprint, both in memory
+        and in the cache file.
+        """
+        with self.lock:
+            self.entries.setdefault(fingerprint, {}).update(entry_update)
+            mkdir_p(os.path.dirname(self.cache_file_path))
+            with open(self.cache_file_path + '.lock', 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                # Another process might have added entries since we loaded the file.
+                entries = self.load()
+                entry = entries.setdefault(fingerprint, {})
+                for key, value in self.entries[fingerprint].items():
+                    if isinstance(value, dict):
+                        entry.setdefault(key, {}).update(value)
+                    else:
+                        entry[key] = value
+                tmp_file_path = '%s.tmp.%s' % (
+                    self.cache_file_path, get_temporal_randomized_file_name_suffix())
+                with open(tmp_file_path, 'w') as output_file:
+                    json.dump(entries, output_file, indent=2, sort_keys=True)
+                    output_file.write('\n')
+                os.rename(tmp_file_path, self.cache_file_path)
+                self.entries = entries
+
+    def identify_compiler(self, compiler_path: str) -> CompilerIdentification:
+        fingerprint = get_compiler_fingerprint(compiler_path)
+        version_output = self.entries.get(fingerprint, {}).get('version_output')
+        if version_output is not None:
+            return CompilerIdentification(version_output, os.path.abspath(compiler_path))
+        compiler_identification = identify_compiler(compiler_path)
+        self.update(
+            fingerprint, {'version_output': compiler_identification.full_version_output_str})
+        return compiler_identification
+
+    def check_flag(
+            self,
+            compiler_path: str,
+            probe_name: str,
+            probe_fn: Callable[[], bool]) -> bool:
+        """
+        Returns the cached result of a flag probe with the given name for the given compiler, or
+        runs the given function to find out whether the compiler accepts the flag.
+        """
+        fingerprint = get_compiler_fingerprint(compiler_path)
+        result = self.entries.get(fingerprint, {}).get('flag_probes', {}).get(probe_name)
+        if result is not None:
+            log("Compiler %s %s flag %s (cached)",
+                compiler_path, 'accepts' if result else 'does not accept', probe_name)
+            return bool(result)
+        result = probe_fn()
+        self.update(fingerprint, {'flag_probes': {probe_name: result}})
+        return result
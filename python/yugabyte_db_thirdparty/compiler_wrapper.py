@@ -22,6 +22,7 @@ from copy import deepcopy
 
 from typing import List, Set, Optional
 
+from yugabyte_db_thirdparty.jobserver import JobToken
 from yugabyte_db_thirdparty.util import shlex_join, is_shared_library_name
 
 from yugabyte_db_thirdparty import file_util
@@ -334,22 +335,26 @@ class CompilerWrapper:
                     env_var_names.LD_FLAGS_TO_REMOVE))
             cmd_args = [arg for arg in cmd_args if arg not in ld_flags_to_remove]
 
-        self.handle_compilation_command(output_files)
+        # When the build tool is not a jobserver client, take a jobserver token for the duration of
+        # the compiler invocation here instead.
+        with JobToken(os.getenv(env_var_names.JOBSERVER_FIFO)):
+            self.handle_compilation_command(output_files)
 
-        cmd_str = '( cd %s; %s )' % (shlex.quote(os.getcwd()), shlex_join(cmd_args))
+            cmd_str = '( cd %s; %s )' % (shlex.quote(os.getcwd()), shlex_join(cmd_args))
 
-        if verbose:
-            sys.stderr.write("Running command: %s" % cmd_str)
+            if verbose:
+                sys.stderr.write("Running command: %s" % cmd_str)
 
-        try:
-            subprocess.check_call(cmd_args)
-        except subprocess.CalledProcessError as ex:
-            sys.stderr.write(
-                "Command failed with exit code %d (one argument per line): %s\n" % (
-                    ex.returncode,
-                    cmd_join_one_arg_per_line(cmd_args)))
-            sys.stderr.write("Command failed with exit code %d: %s\n" % (ex.returncode, cmd_str))
-            raise ex
+            try:
+                subprocess.check_call(cmd_args)
+            except subprocess.CalledProcessError as ex:
+                sys.stderr.write(
+                    "Command failed with exit code %d (one argument per line): %s\n" % (
+                        ex.returncode,
+                        cmd_join_one_arg_per_line(cmd_args)))
+                sys.stderr.write(
+                    "Command failed with exit code %d: %s\n" % (ex.returncode, cmd_str))
+                raise ex
 
 
 def run_compiler_wrapper(is_cxx: bool) -> None:
@@ -0,0 +1,323 @@
+# Copyright (c) YugabyteDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+#
+
+"""
+Sharing of autoconf cache variables (see --cache-file in the autoconf documentation) between
+configure runs of different dependencies, so that the same checks are not repeated for every
+dependency.
+
+Each configure run gets a private cache file that is seeded from a shared cache file and is merged
+back into it after configure succeeds. Only variables matching SHAREABLE_CACHE_VAR_PATTERNS are
+shared. These describe the compiler, the C library, and the system, and do not depend on other
+third-party dependencies that might or might not be installed at the time of the check. A shared
+cache file is only used for one combination of compilers, build type, and flags, see
+get_configure_cache_scope_key.
+"""
+
+import fcntl
+import hashlib
+import os
+import re
+
+from typing import Dict, List
+
+from yugabyte_db_thirdparty import env_var_names
+from yugabyte_db_thirdparty.custom_logging import log
+from yugabyte_db_thirdparty.file_util import mkdir_p
+from yugabyte_db_thirdparty.util import get_temporal_randomized_file_name_suffix
+
+# Headers checked with ac_cv_header_... that are part of the C library or the system.
+SYSTEM_HEADERS = [
+    'dlfcn_h',
+    'errno_h',
+    'fcntl_h',
+    'inttypes_h',
+    'limits_h',
+    'locale_h',
+    'malloc_h',
+    'memory_h',
+    'poll_h',
+    'pthread_h',
+    'signal_h',
+    'stdarg_h',
+    'stdbool_h',
+    'stddef_h',
+    'stdint_h',
+    'stdio_h',
+    'stdlib_h',
+    'string_h',
+    'strings_h',
+    'syslog_h',
+    'time_h',
+    'unistd_h',
+    'wchar_h',
+    'wctype_h',
+]
+
+# Functions checked with ac_cv_func_... that are part of the C library. Other functions are not
+# shared, because they may be checked after another dependency's library has been added to LIBS,
+# e.g. ac_cv_func_SSL_get_shutdown or ac_cv_func_iconv. Some entries are the results of checks for
+# specific behavior of C library functions, e.g. ac_cv_func_malloc_0_nonnull.
+SYSTEM_FUNCTIONS = [
+    'alarm',
+    'atexit',
+    'bzero',
+    'clock_gettime',
+    'dup2',
+    'fcntl',
+    'fork',
+    'fork_works',
+    'fseeko',
+    'ftruncate',
+    'getcwd',
+    'gethostbyname',
+    'getpagesize',
+    'getpid',
+    'getrlimit',
+    'gettimeofday',
+    'gmtime_r',
+    'isascii',
+    'localtime_r',
+    'lstat',
+    'lstat_dereferences_slashed_symlink',
+    'malloc_0_nonnull',
+    'mbrtowc',
+    'memchr',
+    'memmove',
+    'memset',
+    'mkdir',
+    'mmap',
+    'mmap_fixed_mapped',
+    'munmap',
+    'nanosleep',
+    'poll',
+    'posix_memalign',
+    'pread',
+    'pwrite',
+    'realloc_0_nonnull',
+    'realpath',
+    'select',
+    'setenv',
+    'setlocale',
+    'sigaction',
+    'snprintf',
+    'socket',
+    'stat_empty_string_bug',
+    'strcasecmp',
+    'strchr',
+    'strdup',
+    'strerror',
+    'strerror_r',
+    'strftime',
+    'strncasecmp',
+    'strndup',
+    'strnlen',
+    'strrchr',
+    'strstr',
+    'strtol',
+    'strtoul',
+    'strtoull',
+    'sysconf',
+    'uname',
+    'usleep',
+    'vfork',
+    'vfork_works',
+    'vsnprintf',
+    'wcwidth',
+    'working_mktime',
+]
+
+# Types of the C language and the C library checked with ac_cv_sizeof_... and ac_cv_type_... Other
+# types are not shared, because the results of these checks depend on the headers included by each
+# dependency's configure script and on the headers installed by other dependencies. Types whose size
+# depends on feature macros, such as off_t, are not shared either.
+SYSTEM_TYPE_SIZES = [
+    'char',
+    'double',
+    'float',
+    'int',
+    'long',
+    'long_double',
+    'long_long',
+    'short',
+    'size_t',
+    'unsigned_char',
+    'unsigned_int',
+    'unsigned_long',
+    'unsigned_long_long',
+    'unsigned_short',
+    'void_p',
+]
+SYSTEM_TYPES = [
+    'long_double',
+    'long_long_int',
+    'mode_t',
+    'off_t',
+    'pid_t',
+    'ptrdiff_t',
+    'size_t',
+    'ssize_t',
+    'uid_t',
+    'unsigned_long_long_int',
+]
+
+# Results of ac_cv_sys_... checks for large file support, which only depend on the compiler and
+# the C library.
+SYSTEM_CHECKS = [
+    'file_offset_bits',
+    'large_files',
+    'largefile_CC',
+    'largefile_source',
+]
+
+SHAREABLE_CACHE_VAR_PATTERNS = [
+    re.compile(pattern) for pattern in [
+        r'^ac_cv_(build|host|target|objext|exeext)$',
+        r'^ac_cv_(c|cxx)_\w+$',
+        r'^ac_cv_prog_(cc|cxx|CC|CXX)_\w+$',
+        r'^ac_cv_sizeof_(%s)$' % '|'.join(SYSTEM_TYPE_SIZES),
+        r'^ac_cv_type_(%s)$' % '|'.join(SYSTEM_TYPES),
+        r'^ac_cv_sys_(%s)$' % '|'.join(SYSTEM_CHECKS),
+        r'^ac_cv_func_(%s)$' % '|'.join(SYSTEM_FUNCTIONS),
+        r'^ac_cv_header_stdc$',
+        r'^ac_cv_header_(sys|arpa|net|netinet|linux)_\w+$',
+        r'^ac_cv_header_(%s)$' % '|'.join(SYSTEM_HEADERS),
+    ]
+]
+
+# A line in an autoconf cache file, e.g. ac_cv_sizeof_long=${ac_cv_sizeof_long=8}
+CACHE_LINE_RE = re.compile(r'^(\w+)=\$\{\1=.*\}$')
+
+CACHE_FILE_HEADER = '# Shared autoconf cache file created by yugabyte-db-thirdparty.\n'
+
+# Environment variables that affect the results of configure checks. Their values are part of the
+# scope of a shared cache file.
+SCOPE_ENV_VAR_NAMES = [
+    'CC',
+    'CXX',
+    'CFLAGS',
+    'CXXFLAGS',
+    'CPPFLAGS',
+    'LDFLAGS',
+    'LIBS',
+    env_var_names.LD_FLAGS_TO_APPEND,
+    env_var_names.LD_FLAGS_TO_REMOVE,
+    env_var_names.DISALLOWED_INCLUDE_DIRS,
+]
+
+
+def is_shareable_cache_var(var_name: str) -> bool:
+    """
+    >>> is_shareable_cache_var('ac_cv_sizeof_long')
+    True
+    >>> is_shareable_cache_var('ac_cv_sizeof_off_t')
+    False
+    >>> is_shareable_cache_var('ac_cv_type_uint8_t')
+    False
+    >>> is_shareable_cache_var('ac_cv_header_sys_types_h')
+    True
+    >>> is_shareable_cache_var('ac_cv_header_openssl_ssl_h')
+    False
+    >>> is_shareable_cache_var('ac_cv_lib_z_deflate')
+    False
+    >>> is_shareable_cache_var('ac_cv_func_memmove')
+    True
+    >>> is_shareable_cache_var('ac_cv_func_SSL_get_shutdown')
+    False
+    >>> is_shareable_cache_var('ac_cv_env_CFLAGS_value')
+    False
+    """
+    return any(pattern.match(var_name) for pattern in SHAREABLE_CACHE_VAR_PATTERNS)
+
+
+def get_configure_cache_scope_key(scope_inputs: List[str]) -> str:
+    """
+    Returns the name of the shared cache file to use for configure runs with the given scope
+    inputs, such as compiler fingerprints and build type, and the current values of environment
+    variables affecting configure checks. The list of shareable variables is included too, so that
+    changing it invalidates existing shared cache files.
+    """
+    scope_inputs = scope_inputs + [
+        '%s=%s' % (env_var_name, os.getenv(env_var_name, ''))
+        for env_var_name in SCOPE_ENV_VAR_NAMES
+    ] + [pattern.pattern for pattern in SHAREABLE_CACHE_VAR_PATTERNS]
+    return hashlib.sha256('\n'.join(scope_inputs).encode('utf-8')).hexdigest()[:32]
+
+
+def is_autoconf_configure_script(script_path: str) -> bool:
+    if not os.path.isfile(script_path):
+        return False
+    with open(script_path, 'rb') as script_file:
+        return b'Generated by GNU Autoconf' in script_file.read(4096)
+
+
+def read_shareable_cache_lines(cache_file_path: str) -> Dict[str, str]:
+    """
+    Returns a map from the names of shareable variables in the given autoconf cache file to the
+    corresponding lines.
+    """
+    lines: Dict[str, str] = {}
+    if not os.path.exists(cache_file_path):
+        return lines
+    with open(cache_file_path) as cache_file:
+        for line in cache_file:
+            line = line.rstrip('\n')
+            match = CACHE_LINE_RE.match(line)
+            if match and is_shareable_cache_var(match.group(1)):
+                lines[match.group(1)] = line
+    return lines
+
+
+def write_cache_lines(cache_file_path: str, lines: Dict[str, str]) -> None:
+    tmp_file_path = '%s.tmp.%s' % (cache_file_path, get_temporal_randomized_file_name_suffix())
+    with open(tmp_file_path, 'w') as cache_file:
+        cache_file.write(CACHE_FILE_HEADER)
+        for var_name in sorted(lines):
+            cache_file.write(lines[var_name] + '\n')
+    os.rename(tmp_file_path, cache_file_path)
+
+
+class SharedConfigureCache:
+    shared_cache_path: str
+
+    def __init__(self, shared_cache_path: str) -> None:
+        self.shared_cache_path = shared_cache_path
+
+    def seed(self, private_cache_path: str) -> None:
+        """
+        Creates a private cache file for a configure run from the shared cache file.
+        """
+        lines = read_shareable_cache_lines(self.shared_cache_path)
+        write_cache_lines(private_cache_path, lines)
+        log("Seeded %s with %d variables from shared configure cache %s",
+            private_cache_path, len(lines), self.shared_cache_path)
+
+    def merge(self, private_cache_path: str) -> None:
+        """
+        Adds shareable variables from the private cache file of a successful configure run to the
+        shared cache file.
+        """
+        new_lines = read_shareable_cache_lines(private_cache_path)
+        mkdir_p(os.path.dirname(self.shared_cache_path))
+        with open(self.shared_cache_path + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            lines = read_shareable_cache_lines(self.shared_cache_path)
+            # Variables that were in the shared cache file when the private one was seeded have
+            # not been recomputed. Other configure runs could have added the same variables in the
+            # meantime, and the first value stays.
+            added_var_names = sorted(set(new_lines) - set(lines))
+            for var_name in added_var_names:
+                lines[var_name] = new_lines[var_name]
+            write_cache_lines(self.shared_cache_path, lines)
+        log("Added %d variables to shared configure cache %s",
+            len(added_var_names), self.shared_cache_path)
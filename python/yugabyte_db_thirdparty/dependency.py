@@ -15,7 +15,7 @@ from typing import Optional, List, Set, TYPE_CHECKING
 
 from sys_detection import is_linux, is_macos
 
-from build_definitions import ExtraDownload, BuildGroup
+from build_definitions import ExtraDownload, BuildGroup, BuildType
 from yugabyte_db_thirdparty.archive_handling import make_archive_name
 from yugabyte_db_thirdparty.git_util import parse_github_url
 from yugabyte_db_thirdparty.custom_logging import log
@@ -36,6 +36,10 @@ class Dependency:
     archive_name: Optional[str]
     local_archive: Optional[str]
 
+    # If not empty, only these paths relative to the top-level directory of the archive are
+    # extracted. Used for large archives of which only a small part is needed.
+    archive_subpaths: List[str]
+
     # For dependencies built with configure/autotools, where out-of-source build is not possible,
     # this tells the initial step to create separate build directories for shared and static builds.
     shared_and_static: bool
@@ -49,6 +53,16 @@ class Dependency:
     github_repo_name: Optional[str]
     github_ref: Optional[str]
 
+    # Names of other dependencies that have to be installed before this dependency is built. Only
+    # dependencies built as part of the same build type are taken into account, so e.g. a
+    # requirement on a COMMON dependency from an instrumented one is always considered satisfied.
+    requires: List[str]
+
+    # If this is set, all other dependencies of the same build type have to wait for this one to be
+    # built. This is used for the C++ runtime libraries (libc++ and libc++abi) that everything else
+    # is linked with.
+    required_by_all: bool
+
     def __init__(
             self,
             name: str,
@@ -75,6 +89,7 @@ class Dependency:
             self.archive_name = make_archive_name(
                 archive_name_prefix or name, version, self.download_url)
         self.local_archive = local_archive
+        self.archive_subpaths = []
 
         self.patch_version = 0
         self.extra_downloads = []
@@ -92,6 +107,9 @@ class Dependency:
         self.shared_and_static = False
         self.bazel_project_subdir_name = None
 
+        self.requires = []
+        self.required_by_all = False
+
         if self.download_url is not None:
             parse_result = parse_github_url(self.download_url)
             self.github_org_name = None
@@ -151,6 +169,14 @@ class Dependency:
     def should_build(self, builder: 'BuilderInterface') -> bool:
         return True
 
+    def get_prerequisite_build_types(self, build_type: BuildType) -> List[BuildType]:
+        """
+        Returns the build types in which this dependency has to be built before building it for the
+        given build type, e.g. because the build uses files from another build type's build
+        directory. Only matters when multiple build types are being built concurrently.
+        """
+        return []
+
     def postprocess_ninja_build_file(
             self,
             builder: 'BuilderInterface',
@@ -0,0 +1,138 @@
+# Copyright (c) YugabyteDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+#
+
+"""
+Builds a set of dependencies concurrently, respecting the requirements declared by each dependency
+(Dependency.requires and Dependency.required_by_all).
+"""
+
+import functools
+
+from multiprocessing.connection import Connection, wait
+
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+from yugabyte_db_thirdparty.custom_logging import fatal, log
+from yugabyte_db_thirdparty.dependency import Dependency
+from yugabyte_db_thirdparty.process_util import ForkedCall
+
+
+def get_requirements(dependencies: List[Dependency]) -> Dict[str, Set[str]]:
+    """
+    Returns a map from each dependency name to the names of dependencies from the same list that
+    have to be built before it. Requirements on dependencies not present in the list (e.g. built as
+    part of a different build type, or not selected for this build) are ignored.
+    """
+    names = set(dep.name for dep in dependencies)
+    requirements: Dict[str, Set[str]] = {}
+    # Dependencies marked as required by all others are built in their original relative order.
+    required_by_all: List[str] = []
+    for dep in dependencies:
+        dep_requirements = set(name for name in dep.requires if name in names)
+        if dep.required_by_all:
+            dep_requirements.update(required_by_all)
+            required_by_all.append(dep.name)
+        requirements[dep.name] = dep_requirements
+
+    for dep in dependencies:
+        if not dep.required_by_all:
+            requirements[dep.name].update(required_by_all)
+
+    check_for_cycles(requirements)
+    return requirements
+
+
+def check_for_cycles(requirements: Dict[str, Set[str]]) -> None:
+    remaining = {name: set(required) for name, required in requirements.items()}
+    while remaining:
+        ready = [name for name, required in remaining.items() if not required]
+        if not ready:
+            fatal("Circular requirements between dependencies: %s", sorted(remaining))
+        for name in ready:
+            del remaining[name]
+        for required in remaining.values():
+            required.difference_update(ready)
+
+
+class DependencyScheduler:
+    """
+    Runs dependency builds in forked child processes, up to the given number at a time. Each child
+    process gets its own copy of the builder state, environment variables, and current directory, so
+    builds cannot affect each other through these.
+
+    Callbacks:
+    - prepare_fn is invoked in the parent process when all requirements of a dependency have been
+      built. It returns False if the dependency does not need to be built in a child process, e.g.
+      when it is up to date.
+    - build_fn is invoked in the child process and its return value must be picklable.
+    - result_fn is invoked in the parent process with the value returned by build_fn.
+    """
+
+    dependencies: List[Dependency]
+    parallelism: int
+
+    def __init__(self, dependencies: List[Dependency], parallelism: int) -> None:
+        self.dependencies = dependencies
+        self.parallelism = max(1, parallelism)
+
+    def run(
+            self,
+            prepare_fn: Callable[[Dependency], bool],
+            build_fn: Callable[[Dependency], Any],
+            result_fn: Callable[[Dependency, Any], None]) -> None:
+        requirements = get_requirements(self.dependencies)
+        pending: List[Dependency] = list(self.dependencies)
+        running: Dict[Connection, Tuple[Dependency, ForkedCall]] = {}
+        failed: List[str] = []
+
+        def mark_done(dep: Dependency) -> None:
+            for required in requirements.values():
+                required.discard(dep.name)
+
+        while pending or running:
+            while pending and len(running) < self.parallelism and not failed:
+                # Preserve the original order among the dependencies that are ready to be built.
+                ready_deps = [dep for dep in pending if not requirements[dep.name]]
+                if not ready_deps:
+                    break
+                dep = ready_deps[0]
+                pending.remove(dep)
+                if not prepare_fn(dep):
+                    mark_done(dep)
+                    continue
+                call = ForkedCall('build-%s' % dep.name, functools.partial(build_fn, dep))
+                running[call.connection] = (dep, call)
+                log("Started building %s in process %s (%d running, %d pending)",
+                    dep.name, call.pid, len(running), len(pending))
+
+            if not running:
+                break
+
+            for conn in wait(list(running.keys())):
+                assert isinstance(conn, Connection)
+                dep, call = running.pop(conn)
+                success, result = call.wait_for_result()
+                if success:
+                    log("Finished building %s in %.1f sec", dep.name, call.elapsed_sec())
+                    result_fn(dep, result)
+                    mark_done(dep)
+                else:
+                    log("Failed building %s after %.1f sec:\n%s",
+                        dep.name, call.elapsed_sec(), result)
+                    failed.append(dep.name)
+
+        if failed:
+            fatal("Failed to build dependencies: %s", ', '.join(failed))
+        if pending:
+            fatal("Could not build dependencies because their requirements were not built: %s",
+                  ', '.join(dep.name for dep in pending))
@@ -12,38 +12,51 @@
 #
 
 import os
-import re
 import shutil
+import hashlib
+import http.client
 import subprocess
+import threading
 import time
 
 from typing import Optional, List, Dict, cast, TYPE_CHECKING
 from urllib.parse import urlparse
 
-from yugabyte_db_thirdparty.archive_handling import ARCHIVE_TYPES
-from yugabyte_db_thirdparty.archive_handling import split_archive_file_name
+from yugabyte_db_thirdparty.archive_handling import (
+    ARCHIVE_TYPES,
+    ArchiveExtractionError,
+    extract_archive_into_dir,
+    get_streaming_extract_cmds,
+    split_archive_file_name,
+    StreamingArchiveExtractor,
+)
+from yugabyte_db_thirdparty.checksum_index import ChecksumIndex, CHECKSUM_INDEX_FILE_NAME
 from yugabyte_db_thirdparty.checksums import (
-    get_checksum_file_path, CHECKSUM_SUFFIX)
+    add_checksums_to_file, get_checksum_file_path, load_checksum_file, CHECKSUM_SUFFIX)
 from yugabyte_db_thirdparty.custom_logging import log, fatal
 from yugabyte_db_thirdparty.dependency import Dependency
-from yugabyte_db_thirdparty.string_util import shlex_join
+from yugabyte_db_thirdparty.http_downloader import (
+    DOWNLOAD_RETRY_SLEEP_INCREASE_SEC,
+    HttpDownloader,
+    INITIAL_DOWNLOAD_RETRY_SLEEP_TIME_SEC,
+    is_transient_error,
+    PARTIAL_SUFFIX,
+    RangeRequestsNotSupportedError,
+)
+from yugabyte_db_thirdparty.patch_util import apply_patch, PatchApplicationError
 from yugabyte_db_thirdparty.util import (
-    PushDir,
     compute_file_sha256,
     remove_path,
     YB_THIRDPARTY_DIR,
-    which_must_exist,
     get_temporal_randomized_file_name_suffix,
     read_file
 )
-from yugabyte_db_thirdparty.file_util import mkdir_p
+from yugabyte_db_thirdparty.file_util import exclusive_file_lock, LOCK_SUFFIX, mkdir_p
 from yugabyte_db_thirdparty.constants import ADD_CHECKSUM_ARG
 
 
-MAX_FETCH_ATTEMPTS = 20
 MAX_REDOWNLOAD_ATTEMPTS_AFTER_WRONG_CHECKSUM = 3
-INITIAL_DOWNLOAD_RETRY_SLEEP_TIME_SEC = 1.0
-DOWNLOAD_RETRY_SLEEP_INCREASE_SEC = 0.5
+MAX_DOWNLOAD_ATTEMPTS_PER_URL = 3
 ALTERNATIVE_URL_PREFIX = 'https://downloads.yugabyte.com/yugabyte-db-thirdparty/'
 
 
@@ -59,8 +72,12 @@ class DownloadManager:
     should_add_checksum: bool
     download_dir: str
     file_name_to_checksum: Dict[str, str]
+    # Checksums to be added to the checksum file by save_added_checksums.
+    added_checksums: Dict[str, str]
     checksum_file_path: str
-    curl_path: str
+    checksum_file_lock: threading.Lock
+    http_downloader: HttpDownloader
+    checksum_index: ChecksumIndex
 
     def __init__(
             self,
@@ -69,41 +86,67 @@ class DownloadManager:
         self.should_add_checksum = should_add_checksum
         self.download_dir = download_dir
         self.checksum_file_path = get_checksum_file_path()
-
-        # TODO: do not use curl for downloads. Use a Python HTTP library.
-        self.curl_path = which_must_exist('curl')
+        self.checksum_file_lock = threading.Lock()
+        self.added_checksums = {}
+        self.http_downloader = HttpDownloader()
+        self.checksum_index = ChecksumIndex(os.path.join(download_dir, CHECKSUM_INDEX_FILE_NAME))
 
         self.load_expected_checksums()
 
-    def extract_archive(
+    def ensure_archive_downloaded_and_extracted(
             self,
-            archive_file_name: str,
+            url: str,
+            archive_path: str,
             out_dir: str,
-            out_name: Optional[str] = None) -> None:
+            out_name: Optional[str],
+            enable_using_alternative_url: bool,
+            expected_checksum: Optional[str] = None,
+            subpaths: Optional[List[str]] = None) -> None:
         """
-        Extract the given archive into a subdirectory of out_dir, optionally renaming it to
-        the specified name out_name. The archive is expected to contain exactly one directory.
-        If out_name is not specified, the name of the directory inside the archive becomes
-        the name of the destination directory.
+        Downloads the given archive using ensure_file_downloaded and extracts it into a
+        subdirectory of out_dir, optionally renaming it to out_name. The archive is expected to
+        contain exactly one directory. If out_name is not specified, the name of the directory
+        inside the archive becomes the name of the destination directory.
+
+        If the archive has to be downloaded, it is extracted while it is being downloaded when
+        possible. The extracted directory only appears in out_dir after the checksum has been
+        verified.
 
-        out_dir is the parent directory that should contain the extracted directory when the
-        function returns.
+        If subpaths are specified, only those paths within the top-level directory of the archive
+        are extracted, after the archive has been downloaded.
         """
+        if out_name and self.extracted_dir_already_exists(
+                os.path.join(out_dir, out_name), archive_path):
+            return
 
-        def dest_dir_already_exists(full_out_path: str) -> bool:
-            if os.path.exists(full_out_path):
-                log("Directory already exists: %s, skipping extracting %s" % (
-                        full_out_path, archive_file_name))
-                return True
-            return False
-
-        full_out_path = None
-        if out_name:
-            full_out_path = os.path.join(out_dir, out_name)
-            if dest_dir_already_exists(full_out_path):
-                return
+        mkdir_p(out_dir)
+        tmp_out_dir = self.create_tmp_extract_dir(archive_path, out_dir)
+        try:
+            # Keep the archive locked until it is extracted, so that a concurrent build cannot
+            # remove it in the meantime, e.g. with --clean-downloads.
+            with exclusive_file_lock(archive_path + LOCK_SUFFIX):
+                extracted = self._ensure_file_downloaded(
+                    url=url,
+                    file_path=archive_path,
+                    enable_using_alternative_url=enable_using_alternative_url,
+                    expected_checksum=expected_checksum,
+                    verify_checksum=True,
+                    extract_into_dir=None if subpaths else tmp_out_dir)
+                if not extracted:
+                    self.run_extract_cmd(archive_path, tmp_out_dir, subpaths)
+            self.move_extracted_dir(archive_path, tmp_out_dir, out_dir, out_name)
+        finally:
+            log("Removing temporary directory: %s", tmp_out_dir)
+            shutil.rmtree(tmp_out_dir)
+
+    def extracted_dir_already_exists(self, full_out_path: str, archive_file_name: str) -> bool:
+        if os.path.exists(full_out_path):
+            log("Directory already exists: %s, skipping extracting %s" % (
+                    full_out_path, archive_file_name))
+            return True
+        return False
 
-        # Extract the archive into a temporary directory.
+    def create_tmp_extract_dir(self, archive_file_name: str, out_dir: str) -> str:
         tmp_out_dir = os.path.join(
             out_dir, 'tmp-extract-%s-%s' % (
                 os.path.basename(archive_file_name),
@@ -113,63 +156,62 @@ class DownloadManager:
             raise IOError("Just-generated unique directory name already exists: %s" % tmp_out_dir)
         os.makedirs(tmp_out_dir)
         assert os.path.isdir(tmp_out_dir), f"Failed to create directory {tmp_out_dir}"
+        return tmp_out_dir
 
-        archive_extension = None
-        for ext in ARCHIVE_TYPES:
-            if archive_file_name.endswith(ext):
-                archive_extension = ext
-                break
-        if not archive_extension:
-            fatal("Unknown archive type for: {}".format(archive_file_name))
-        assert archive_extension is not None
+    def run_extract_cmd(
+            self,
+            archive_file_name: str,
+            tmp_out_dir: str,
+            subpaths: Optional[List[str]] = None) -> None:
+        # We pass the directory to extract into explicitly rather than changing the current
+        # directory, so that multiple archives can be extracted concurrently.
+        if subpaths:
+            log("Extracting %s from %s in temporary directory %s",
+                ', '.join(subpaths), archive_file_name, tmp_out_dir)
+        else:
+            log("Extracting %s in temporary directory %s", archive_file_name, tmp_out_dir)
+        extract_archive_into_dir(archive_file_name, tmp_out_dir, subpaths)
 
-        try:
-            with PushDir(tmp_out_dir):
-                cmd = ARCHIVE_TYPES[archive_extension].format(archive_file_name)
-                log("Extracting %s in temporary directory %s", cmd, tmp_out_dir)
-                subprocess.check_call(cmd, shell=True)
-                extracted_subdirs = [
-                    subdir_name for subdir_name in os.listdir(tmp_out_dir)
-                    if not subdir_name.startswith('.')
-                ]
-                if len(extracted_subdirs) != 1:
-                    raise IOError(
-                        "Expected the extracted archive %s to contain exactly one "
-                        "subdirectory and no files, found: %s" % (
-                            archive_file_name, extracted_subdirs))
-                extracted_subdir_basename = extracted_subdirs[0]
-                extracted_subdir_path = os.path.join(tmp_out_dir, extracted_subdir_basename)
-                if not os.path.isdir(extracted_subdir_path):
-                    raise IOError(
-                        "This is a file, expected it to be a directory: %s" %
-                        extracted_subdir_path)
-
-                if not full_out_path:
-                    full_out_path = os.path.join(out_dir, extracted_subdir_basename)
-                    if dest_dir_already_exists(full_out_path):
-                        return
-
-                log("Moving %s to %s", extracted_subdir_path, full_out_path)
-                shutil.move(extracted_subdir_path, full_out_path)
-        finally:
-            log("Removing temporary directory: %s", tmp_out_dir)
-            shutil.rmtree(tmp_out_dir)
+    def move_extracted_dir(
+            self,
+            archive_file_name: str,
+            tmp_out_dir: str,
+            out_dir: str,
+            out_name: Optional[str]) -> None:
+        """
+        Moves the only directory extracted from the given archive into tmp_out_dir to out_dir.
+        """
+        extracted_subdirs = [
+            subdir_name for subdir_name in os.listdir(tmp_out_dir)
+            if not subdir_name.startswith('.')
+        ]
+        if len(extracted_subdirs) != 1:
+            raise IOError(
+                "Expected the extracted archive %s to contain exactly one "
+                "subdirectory and no files, found: %s" % (
+                    archive_file_name, extracted_subdirs))
+        extracted_subdir_basename = extracted_subdirs[0]
+        extracted_subdir_path = os.path.join(tmp_out_dir, extracted_subdir_basename)
+        if not os.path.isdir(extracted_subdir_path):
+            raise IOError(
+                "This is a file, expected it to be a directory: %s" %
+                extracted_subdir_path)
+
+        full_out_path = os.path.join(out_dir, out_name or extracted_subdir_basename)
+        if self.extracted_dir_already_exists(full_out_path, archive_file_name):
+            return
+
+        log("Moving %s to %s", extracted_subdir_path, full_out_path)
+        shutil.move(extracted_subdir_path, full_out_path)
 
     def load_expected_checksums(self) -> None:
         if not os.path.exists(self.checksum_file_path):
             fatal("Expected checksum file not found at %s", self.checksum_file_path)
 
-        self.file_name_to_checksum = {}
-        with open(self.checksum_file_path, 'rt') as inp:
-            for line in inp:
-                line = line.strip()
-                if not line or line.startswith('#'):
-                    continue
-                sum, fname = line.split(None, 1)
-                if not re.match('^[0-9a-f]{64}$', sum):
-                    fatal("Invalid checksum: '%s' for archive name: '%s' in %s. Expected to be a "
-                          "SHA-256 sum (64 hex characters).", sum, fname, self.checksum_file_path)
-                self.file_name_to_checksum[fname] = sum
+        try:
+            self.file_name_to_checksum = load_checksum_file(self.checksum_file_path)
+        except ValueError as ex:
+            fatal("%s in %s", ex, self.checksum_file_path)
 
     def get_expected_checksum(self, file_name: str) -> str:
         checksum = self.get_expected_checksum_and_maybe_add_to_file(
@@ -182,26 +224,74 @@ class DownloadManager:
     def get_expected_checksum_and_maybe_add_to_file(
             self,
             file_name: str,
-            downloaded_path: Optional[str]) -> Optional[str]:
+            downloaded_path: Optional[str],
+            downloaded_checksum: Optional[str] = None) -> Optional[str]:
+        """
+        downloaded_checksum is the checksum of the file at downloaded_path if it is already known.
+        New checksums are only written to the checksum file by save_added_checksums.
+        """
+        # Dependencies could be downloaded concurrently, so serialize updates to the checksums.
+        with self.checksum_file_lock:
+            return self._get_expected_checksum_and_maybe_add_to_file(
+                file_name, downloaded_path, downloaded_checksum)
+
+    def _get_expected_checksum_and_maybe_add_to_file(
+            self,
+            file_name: str,
+            downloaded_path: Optional[str],
+            downloaded_checksum: Optional[str]) -> Optional[str]:
         if file_name not in self.file_name_to_checksum:
             if self.should_add_checksum and downloaded_path:
-                with open(self.checksum_file_path, 'rt') as inp:
-                    lines = inp.readlines()
-                lines = [line.rstrip() for line in lines]
-                checksum = compute_file_sha256(downloaded_path)
-                lines.append("%s  %s" % (checksum, file_name))
-                with open(self.checksum_file_path, 'wt') as out:
-                    for line in lines:
-                        out.write(line + "\n")
+                checksum = downloaded_checksum or self.checksum_index.get_sha256(downloaded_path)
                 self.file_name_to_checksum[file_name] = checksum
-                log("Added checksum for %s to %s: %s", file_name, self.checksum_file_path, checksum)
+                self.added_checksums[file_name] = checksum
+                log("Will add checksum for %s to %s: %s",
+                    file_name, self.checksum_file_path, checksum)
                 return checksum
 
             return None
         return self.file_name_to_checksum[file_name]
 
-    def verify_checksum(self, file_name: str, expected_checksum: Optional[str]) -> bool:
-        real_checksum = compute_file_sha256(file_name)
+    def add_missing_checksums(self, archive_paths: List[str], parallelism: int) -> None:
+        """
+        Computes the checksums of the given existing archives that are not in the checksum file
+        yet in parallel. They are written to the checksum file by save_added_checksums.
+        """
+        assert self.should_add_checksum
+        with self.checksum_file_lock:
+            missing_paths = sorted(set(
+                archive_path for archive_path in archive_paths
+                if os.path.basename(archive_path) not in self.file_name_to_checksum and
+                os.path.isfile(archive_path)))
+        if not missing_paths:
+            return
+        log("Computing checksums of %d archives missing from %s",
+            len(missing_paths), self.checksum_file_path)
+        checksums = self.checksum_index.get_sha256s(missing_paths, parallelism)
+        with self.checksum_file_lock:
+            for archive_path, checksum in checksums.items():
+                self._get_expected_checksum_and_maybe_add_to_file(
+                    os.path.basename(archive_path),
+                    downloaded_path=archive_path,
+                    downloaded_checksum=checksum)
+
+    def save_added_checksums(self) -> None:
+        """
+        Merges the checksums added since the last call into the checksum file, all at once.
+        """
+        with self.checksum_file_lock:
+            if not self.added_checksums:
+                return
+            add_checksums_to_file(self.checksum_file_path, self.added_checksums)
+            self.added_checksums = {}
+
+    def verify_checksum(
+            self,
+            file_name: str,
+            expected_checksum: Optional[str],
+            real_checksum: Optional[str] = None) -> bool:
+        if real_checksum is None:
+            real_checksum = compute_file_sha256(file_name)
         file_basename = os.path.basename(file_name)
         if expected_checksum is None:
             fatal(
@@ -212,13 +302,79 @@ class DownloadManager:
             )
         return real_checksum == expected_checksum
 
+    def reverify_downloads(self, parallelism: int) -> None:
+        """
+        Recomputes the checksums of all archives in the download directory in parallel, without
+        using the checksum index. Archives with wrong checksums are removed, so that they are
+        downloaded again.
+        """
+        if not os.path.isdir(self.download_dir):
+            return
+        archive_paths = sorted(
+            os.path.join(self.download_dir, file_name)
+            for file_name in os.listdir(self.download_dir)
+            if split_archive_file_name(file_name)[1] in ARCHIVE_TYPES and
+            os.path.isfile(os.path.join(self.download_dir, file_name)))
+        log("Re-verifying checksums of %d archives in %s",
+            len(archive_paths), self.download_dir)
+        checksums = self.checksum_index.recompute(archive_paths, parallelism)
+        num_removed = 0
+        for archive_path, real_checksum in sorted(checksums.items()):
+            expected_checksum = self.file_name_to_checksum.get(os.path.basename(archive_path))
+            if expected_checksum is not None and expected_checksum != real_checksum:
+                log("Archive %s has wrong checksum %s, expected %s, removing it",
+                    archive_path, real_checksum, expected_checksum)
+                with exclusive_file_lock(archive_path + LOCK_SUFFIX):
+                    # Another build could have downloaded the archive again in the meantime.
+                    if (os.path.exists(archive_path) and
+                            self.checksum_index.get_sha256(archive_path) == real_checksum):
+                        remove_path(archive_path)
+                num_removed += 1
+        log("Re-verified %d archives, removed %d with wrong checksums",
+            len(archive_paths), num_removed)
+
+    def start_streaming_extraction(
+            self, file_name: str, extract_into_dir: str) -> StreamingArchiveExtractor:
+        # Clean up after a previous attempt.
+        remove_path(extract_into_dir)
+        mkdir_p(extract_into_dir)
+        log("Extracting %s into %s while downloading it", file_name, extract_into_dir)
+        return StreamingArchiveExtractor(file_name, extract_into_dir)
+
     def ensure_file_downloaded(
             self,
             url: str,
             file_path: str,
             enable_using_alternative_url: bool,
             expected_checksum: Optional[str] = None,
-            verify_checksum: bool = True) -> None:
+            verify_checksum: bool = True,
+            extract_into_dir: Optional[str] = None) -> bool:
+        """
+        If extract_into_dir is specified, the file has to be downloaded, and it is an archive that
+        can be extracted from a stream, it is extracted into that directory while it is being
+        downloaded, and its checksum is computed at the same time. Returns True in that case.
+
+        The download directory can be shared between checkouts, so the file is locked while it is
+        being checked and downloaded. Concurrent builds needing the same file wait for the download
+        in progress instead of starting another one.
+        """
+        with exclusive_file_lock(file_path + LOCK_SUFFIX):
+            return self._ensure_file_downloaded(
+                url=url,
+                file_path=file_path,
+                enable_using_alternative_url=enable_using_alternative_url,
+                expected_checksum=expected_checksum,
+                verify_checksum=verify_checksum,
+                extract_into_dir=extract_into_dir)
+
+    def _ensure_file_downloaded(
+            self,
+            url: str,
+            file_path: str,
+            enable_using_alternative_url: bool,
+            expected_checksum: Optional[str],
+            verify_checksum: bool,
+            extract_into_dir: Optional[str]) -> bool:
         log(f"Ensuring {url} is downloaded to path {file_path}")
         file_name = os.path.basename(file_path)
 
@@ -228,18 +384,21 @@ class DownloadManager:
             # We check the file name against our checksum map only if the file exists. This is done
             # so that we would still download the file even if we don't know the checksum, making it
             # easier to add new third-party dependencies.
+            existing_file_checksum = self.checksum_index.get_sha256(file_path)
             if expected_checksum is None:
                 expected_checksum = self.get_expected_checksum_and_maybe_add_to_file(
-                    file_name, downloaded_path=file_path)
-            if self.verify_checksum(file_path, expected_checksum):
+                    file_name, downloaded_path=file_path,
+                    downloaded_checksum=existing_file_checksum)
+            if self.verify_checksum(file_path, expected_checksum, existing_file_checksum):
                 log("No need to re-download %s: checksum already correct", file_name)
-                return
+                return False
             log("File %s already exists but has wrong checksum, removing", file_path)
             remove_path(file_path)
 
         log("Fetching %s from %s", file_name, url)
 
         download_successful = False
+        extracted = False
         alternative_url = ALTERNATIVE_URL_PREFIX + file_name
         total_attempts = 0
 
@@ -247,61 +406,103 @@ class DownloadManager:
         if enable_using_alternative_url:
             url_candidates += [alternative_url]
 
+        stream_extract = (
+            extract_into_dir is not None and get_streaming_extract_cmds(file_name) is not None)
+
         for effective_url in url_candidates:
             if effective_url == alternative_url:
                 log("Switching to alternative download URL %s after %d attempts",
                     alternative_url, total_attempts)
+            num_checksum_failures = 0
+            num_download_errors = 0
             sleep_time_sec = INITIAL_DOWNLOAD_RETRY_SLEEP_TIME_SEC
-            for attempt_index in range(1, MAX_FETCH_ATTEMPTS + 1):
+            while True:
+                total_attempts += 1
+                extractor: Optional[StreamingArchiveExtractor] = None
+                real_checksum: Optional[str] = None
                 try:
-                    total_attempts += 1
-                    curl_cmd_line = [
-                        self.curl_path,
-                        '-o',
-                        file_path,
-                        '-L',  # follow redirects
-                        '--silent',
-                        '--show-error',
-                        '--location',
-                        effective_url]
-                    log("Running command: %s", shlex_join(curl_cmd_line))
-                    subprocess.check_call(curl_cmd_line)
-
-                    if is_downloaded_file_not_found(file_path):
-                        os.remove(file_path)
-                        raise ValueError(f"Could not download {self.curl_path}: not found")
-
-                    if verify_checksum:
-                        if expected_checksum is None:
-                            expected_checksum = self.get_expected_checksum_and_maybe_add_to_file(
-                                file_name, downloaded_path=file_path)
-                        if not self.verify_checksum(file_path, expected_checksum):
-                            error_msg = (
-                                "File '%s' has wrong checksum after downloading from '%s'. "
-                                "Has %s, but expected: %s." % (
-                                    file_path,
-                                    url,
-                                    compute_file_sha256(file_path),
-                                    expected_checksum))
-                            if attempt_index <= MAX_REDOWNLOAD_ATTEMPTS_AFTER_WRONG_CHECKSUM:
-                                error_msg += " Will delete and re-download."
-                                remove_path(file_path)
-                                log(error_msg)
-                                continue
-                            else:
-                                raise IOError(error_msg + ("Attempt: %d" % attempt_index))
-
-                    download_successful = True
-                    break
-                except subprocess.CalledProcessError as ex:
-                    log("Error downloading %s (attempt %d for this URL, total attempts %d): %s",
-                        self.curl_path, attempt_index, total_attempts, str(ex))
-                    if attempt_index == MAX_FETCH_ATTEMPTS and effective_url == alternative_url:
-                        log("Giving up after %d attempts", MAX_FETCH_ATTEMPTS)
-                        raise ex
+                    if stream_extract:
+                        assert extract_into_dir is not None
+                        extractor = self.start_streaming_extraction(file_name, extract_into_dir)
+                    # Transient errors are retried by the downloader, resuming where the previous
+                    # attempt stopped.
+                    try:
+                        self.http_downloader.download(
+                            effective_url,
+                            file_path,
+                            chunk_consumer=extractor.consume if extractor is not None else None)
+                    except RangeRequestsNotSupportedError:
+                        if extractor is None:
+                            raise
+                        assert extract_into_dir is not None
+                        # The beginning of the archive, read from a partial file left over from a
+                        # previous run, has already been extracted. Start over from scratch.
+                        log("Server does not support resuming the download of %s, restarting",
+                            effective_url)
+                        extractor.abort()
+                        remove_path(file_path + PARTIAL_SUFFIX)
+                        extractor = self.start_streaming_extraction(file_name, extract_into_dir)
+                        self.http_downloader.download(
+                            effective_url, file_path, chunk_consumer=extractor.consume)
+                    if extractor is not None:
+                        real_checksum = extractor.finish()
+                except (http.client.HTTPException, OSError, ArchiveExtractionError) as ex:
+                    if extractor is not None:
+                        extractor.abort()
+                    if isinstance(ex, ArchiveExtractionError):
+                        # The downloaded data is probably invalid, so do not resume from it.
+                        remove_path(file_path)
+                        remove_path(file_path + PARTIAL_SUFFIX)
+                    log("Error downloading %s (total attempts %d): %s",
+                        effective_url, total_attempts, str(ex))
+                    # The downloader retries individual requests, but the connection could still
+                    # fail e.g. while a mirror is restarting. Retry the whole download a few more
+                    # times, resuming from the partial file, before trying the next URL.
+                    num_download_errors += 1
+                    if (isinstance(ex, ArchiveExtractionError) or
+                            not is_transient_error(ex) or
+                            num_download_errors == MAX_DOWNLOAD_ATTEMPTS_PER_URL):
+                        break
                     log("Will retry after %.1f seconds", sleep_time_sec)
                     time.sleep(sleep_time_sec)
                     sleep_time_sec += DOWNLOAD_RETRY_SLEEP_INCREASE_SEC
+                    continue
+
+                if extractor is None and is_downloaded_file_not_found(file_path):
+                    os.remove(file_path)
+                    log("Could not download %s: not found", effective_url)
+                    break
+
+                if verify_checksum:
+                    if real_checksum is None:
+                        real_checksum = compute_file_sha256(file_path)
+                    if expected_checksum is None:
+                        expected_checksum = self.get_expected_checksum_and_maybe_add_to_file(
+                            file_name, downloaded_path=file_path,
+                            downloaded_checksum=real_checksum)
+                    if not self.verify_checksum(file_path, expected_checksum, real_checksum):
+                        error_msg = (
+                            "File '%s' has wrong checksum after downloading from '%s'. "
+                            "Has %s, but expected: %s." % (
+                                file_path,
+                                effective_url,
+                                real_checksum,
+                                expected_checksum))
+                        num_checksum_failures += 1
+                        if num_checksum_failures <= MAX_REDOWNLOAD_ATTEMPTS_AFTER_WRONG_CHECKSUM:
+                            error_msg += " Will delete and re-download."
+                            remove_path(file_path)
+                            log(error_msg)
+                            continue
+                        else:
+                            raise IOError(error_msg + ("Attempt: %d" % num_checksum_failures))
+
+                if verify_checksum:
+                    assert real_checksum is not None
+                    self.checksum_index.record(file_path, real_checksum)
+                download_successful = True
+                extracted = extractor is not None
+                break
 
             if download_successful:
                 break
@@ -310,15 +511,20 @@ class DownloadManager:
             fatal("Failed to download URL %s", url)
         if not os.path.exists(file_path):
             fatal("Downloaded '%s' but but unable to find '%s'", url, file_path)
+        return extracted
 
     def download_dependency(
             self,
             dep: Dependency,
             src_path: str,
             archive_path: Optional[str]) -> None:
-        patch_marker_file_path = os.path.join(
-                src_path, 'patchmarker-version{}-{}patches'.format(
-                    dep.patch_version, len(dep.patches)))
+        patch_marker_file_name = 'patchmarker-version{}-{}patches'.format(
+            dep.patch_version, len(dep.patches))
+        if dep.archive_subpaths:
+            # Extract the source directory again if the set of extracted paths changes.
+            patch_marker_file_name += '-subpaths-' + hashlib.sha256(
+                '\n'.join(dep.archive_subpaths).encode('utf-8')).hexdigest()[:12]
+        patch_marker_file_path = os.path.join(src_path, patch_marker_file_name)
         log("Patch marker file: %s", patch_marker_file_path)
         if os.path.exists(patch_marker_file_path) and not dep.local_archive:
             log("Patch marker file %s already exists, skipping download", patch_marker_file_path)
@@ -343,50 +549,47 @@ class DownloadManager:
             if archive_path is None:
                 log("archive_path is not set, skipping download")
                 return
-            self.ensure_file_downloaded(
+            self.ensure_archive_downloaded_and_extracted(
                 url=download_url,
-                file_path=archive_path,
-                enable_using_alternative_url=True)
-            self.extract_archive(archive_path,
-                                 os.path.dirname(src_path),
-                                 os.path.basename(src_path))
+                archive_path=archive_path,
+                out_dir=os.path.dirname(src_path),
+                out_name=os.path.basename(src_path),
+                enable_using_alternative_url=True,
+                subpaths=dep.archive_subpaths)
 
         if hasattr(dep, 'extra_downloads'):
             for extra in dep.extra_downloads:
                 assert extra.archive_name is not None
                 archive_path = os.path.join(self.download_dir, extra.archive_name)
                 log("Downloading %s from %s", extra.archive_name, extra.download_url)
-                self.ensure_file_downloaded(
+                output_path = os.path.join(src_path, extra.dir_name)
+                self.ensure_archive_downloaded_and_extracted(
                     url=extra.download_url,
-                    file_path=archive_path,
+                    archive_path=archive_path,
+                    out_dir=output_path,
+                    out_name=None,
                     enable_using_alternative_url=True)
-                output_path = os.path.join(src_path, extra.dir_name)
-                self.extract_archive(archive_path, output_path)
                 if extra.post_exec is not None:
-                    with PushDir(output_path):
-                        assert isinstance(extra.post_exec, list)
-                        if isinstance(extra.post_exec[0], str):
-                            subprocess.check_call(cast(List[str], extra.post_exec))
-                        else:
-                            for command in extra.post_exec:
-                                subprocess.check_call(command)
+                    assert isinstance(extra.post_exec, list)
+                    if isinstance(extra.post_exec[0], str):
+                        subprocess.check_call(cast(List[str], extra.post_exec), cwd=output_path)
+                    else:
+                        for command in extra.post_exec:
+                            subprocess.check_call(command, cwd=output_path)
 
         if hasattr(dep, 'patches'):
-            with PushDir(src_path):
-                for patch in dep.patches:
-                    log("Applying patch: %s", patch)
-                    process = subprocess.Popen(['patch', '-p{}'.format(dep.patch_strip)],
-                                               stdin=subprocess.PIPE)
-                    with open(os.path.join(YB_THIRDPARTY_DIR, 'patches', patch), 'rt') as inp:
-                        patch = inp.read()
-                    assert process.stdin is not None
-                    process.stdin.write(patch.encode('utf-8'))
-                    process.stdin.close()
-                    exit_code = process.wait()
-                    if exit_code:
-                        fatal("Patch {} failed with code: {}".format(dep.name, exit_code))
-                if dep.post_patch:
-                    subprocess.check_call(dep.post_patch)
+            assert dep.patch_strip is not None
+            for patch in dep.patches:
+                log("Applying patch: %s", patch)
+                try:
+                    apply_patch(
+                        os.path.join(YB_THIRDPARTY_DIR, 'patches', patch),
+                        src_path,
+                        strip=dep.patch_strip)
+                except PatchApplicationError as ex:
+                    fatal("Patch %s of %s failed: %s", patch, dep.name, ex)
+            if dep.post_patch:
+                subprocess.check_call(dep.post_patch, cwd=src_path)
 
         with open(patch_marker_file_path, 'wb') as out:
             # Just create an empty file.
@@ -417,63 +620,64 @@ class DownloadManager:
 
         mkdir_p(dest_parent_dir)
 
-        tmp_suffix = ".tmp-%s" % get_temporal_randomized_file_name_suffix()
-
-        archive_temporary_dest_path = os.path.join(
-            dest_parent_dir,
-            "".join([
-                dest_dir_name,
-                tmp_suffix,
-                archive_extension
-            ])
-        )
-        archive_temporary_dest_checksum_path = archive_temporary_dest_path + CHECKSUM_SUFFIX
+        # The toolchain directory is shared by all builds on the host.
+        with exclusive_file_lock(toolchain_dest_dir_path + LOCK_SUFFIX):
+            if os.path.exists(toolchain_dest_dir_path):
+                log(f"Toolchain directory '{toolchain_dest_dir_path}' was created by another build")
+                return toolchain_dest_dir_path
+
+            tmp_suffix = ".tmp-%s" % get_temporal_randomized_file_name_suffix()
+
+            archive_temporary_dest_path = os.path.join(
+                dest_parent_dir,
+                "".join([
+                    dest_dir_name,
+                    tmp_suffix,
+                    archive_extension
+                ])
+            )
+            archive_temporary_dest_checksum_path = archive_temporary_dest_path + CHECKSUM_SUFFIX
 
-        try:
-            self.ensure_file_downloaded(
-                toolchain_url + CHECKSUM_SUFFIX,
-                archive_temporary_dest_checksum_path,
-                enable_using_alternative_url=False,
-                verify_checksum=False)
-            with open(archive_temporary_dest_checksum_path) as checksum_file:
-                expected_checksum = checksum_file.read().strip().split()[0]
-
-            self.ensure_file_downloaded(
-                toolchain_url,
-                archive_temporary_dest_path,
-                enable_using_alternative_url=False,
-                expected_checksum=expected_checksum)
-
-            if dest_dir_name.startswith('linuxbrew'):
+            try:
+                self.ensure_file_downloaded(
+                    toolchain_url + CHECKSUM_SUFFIX,
+                    archive_temporary_dest_checksum_path,
+                    enable_using_alternative_url=False,
+                    verify_checksum=False)
+                with open(archive_temporary_dest_checksum_path) as checksum_file:
+                    expected_checksum = checksum_file.read().strip().split()[0]
+
+                is_linuxbrew = dest_dir_name.startswith('linuxbrew')
                 dest_dir_name_tmp = dest_dir_name + tmp_suffix
-                self.extract_archive(
-                    archive_file_name=archive_temporary_dest_path,
-                    out_dir=dest_parent_dir,
-                    out_name=dest_dir_name_tmp
-                )
-                orig_brew_home = read_file(
-                    os.path.join(dest_parent_dir, dest_dir_name_tmp, 'ORIG_BREW_HOME')
-                ).strip()
-                os.rename(os.path.join(dest_parent_dir, dest_dir_name_tmp), orig_brew_home)
-                os.symlink(os.path.basename(orig_brew_home), toolchain_dest_dir_path)
-            else:
-                self.extract_archive(
-                    archive_file_name=archive_temporary_dest_path,
+                self.ensure_archive_downloaded_and_extracted(
+                    url=toolchain_url,
+                    archive_path=archive_temporary_dest_path,
                     out_dir=dest_parent_dir,
-                    out_name=dest_dir_name
-                )
-
-            if not os.path.isdir(toolchain_dest_dir_path):
-                raise RuntimeError(
-                    f"Extracting the archive downloaded from {toolchain_url} did not create "
-                    f"directory '{toolchain_dest_dir_path}'.")
-
-        finally:
-            for path_to_remove in [
-                archive_temporary_dest_path,
-                archive_temporary_dest_checksum_path
-            ]:
-                if os.path.exists(path_to_remove):
-                    log("Removing temporary file '%s'", path_to_remove)
-                    os.remove(path_to_remove)
+                    out_name=dest_dir_name_tmp if is_linuxbrew else dest_dir_name,
+                    enable_using_alternative_url=False,
+                    expected_checksum=expected_checksum)
+
+                if is_linuxbrew:
+                    orig_brew_home = read_file(
+                        os.path.join(dest_parent_dir, dest_dir_name_tmp, 'ORIG_BREW_HOME')
+                    ).strip()
+                    os.rename(os.path.join(dest_parent_dir, dest_dir_name_tmp), orig_brew_home)
+                    os.symlink(os.path.basename(orig_brew_home), toolchain_dest_dir_path)
+
+                if not os.path.isdir(toolchain_dest_dir_path):
+                    raise RuntimeError(
+                        f"Extracting the archive downloaded from {toolchain_url} did not create "
+                        f"directory '{toolchain_dest_dir_path}'.")
+
+            finally:
+                for path_to_remove in [
+                    archive_temporary_dest_path,
+                    archive_temporary_dest_path + PARTIAL_SUFFIX,
+                    archive_temporary_dest_path + LOCK_SUFFIX,
+                    archive_temporary_dest_checksum_path,
+                    archive_temporary_dest_checksum_path + LOCK_SUFFIX,
+                ]:
+                    if os.path.exists(path_to_remove):
+                        log("Removing temporary file '%s'", path_to_remove)
+                        os.remove(path_to_remove)
         return toolchain_dest_dir_path
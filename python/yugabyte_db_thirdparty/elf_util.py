@@ -0,0 +1,589 @@
+# Copyright (c) YugabyteDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+#
+
+"""
+Reading the dynamic linking information of ELF files in-process, without running readelf, patchelf
+or ldd. Files are memory-mapped, and only the ELF header, the program headers, and the parts of the
+file referenced by the dynamic section are read.
+
+Shared library dependencies are resolved the way the glibc dynamic loader resolves them when ldd
+is run with a clean environment: DT_RPATH of the loading object and its loaders (unless the loading
+object has DT_RUNPATH), DT_RUNPATH of the loading object, /etc/ld.so.cache, and the default
+directories, skipping libraries for a different ELF class or machine. $ORIGIN is expanded, but
+other dynamic string tokens and glibc-hwcaps subdirectories are not supported.
+"""
+
+import copy
+import functools
+import mmap
+import os
+import struct
+
+from typing import Dict, List, Optional, Tuple
+
+ELF_MAGIC = b'\x7fELF'
+
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+
+ELFDATA2LSB = 1
+ELFDATA2MSB = 2
+
+EM_X86_64 = 62
+EM_AARCH64 = 183
+
+PT_LOAD = 1
+PT_DYNAMIC = 2
+PT_INTERP = 3
+PT_NOTE = 4
+
+NT_GNU_BUILD_ID = 3
+
+DT_NULL = 0
+DT_NEEDED = 1
+DT_STRTAB = 5
+DT_STRSZ = 10
+DT_SONAME = 14
+DT_RPATH = 15
+DT_RUNPATH = 29
+DT_VERDEF = 0x6ffffffc
+DT_VERDEFNUM = 0x6ffffffd
+DT_VERNEED = 0x6ffffffe
+DT_VERNEEDNUM = 0x6fffffff
+
+VER_FLG_WEAK = 2
+
+LD_SO_CACHE_PATH = '/etc/ld.so.cache'
+LD_SO_CACHE_MAGIC = b'glibc-ld.so.cache1.1'
+
+# The dynamic loader used for shared libraries, which do not specify an interpreter.
+DEFAULT_INTERPRETERS = {
+    EM_X86_64: '/lib64/ld-linux-x86-64.so.2',
+    EM_AARCH64: '/lib/ld-linux-aarch64.so.1',
+}
+
+# Default library directories of the dynamic loader on Red Hat and Debian based distributions.
+DEFAULT_LIBRARY_DIRS = {
+    EM_X86_64: [
+        '/lib/x86_64-linux-gnu', '/usr/lib/x86_64-linux-gnu', '/lib64', '/usr/lib64',
+    ],
+    EM_AARCH64: [
+        '/lib/aarch64-linux-gnu', '/usr/lib/aarch64-linux-gnu', '/lib64', '/usr/lib64', '/lib',
+        '/usr/lib',
+    ],
+}
+
+ORIGIN_TOKENS = ('${ORIGIN}', '$ORIGIN')
+
+
+class ElfFormatError(ValueError):
+    pass
+
+
+class ElfFile:
+    """
+    The dynamic linking information of an ELF file. rpaths and runpaths contain the values of all
+    DT_RPATH and DT_RUNPATH entries, normally at most one of each. version_requirements maps the
+    names of needed libraries to the symbol versions required from them (DT_VERNEED), except for
+    weak requirements, which the dynamic loader does not enforce. version_definitions contains the
+    symbol versions defined in the file (DT_VERDEF), and is empty if the file does not use symbol
+    versioning. build_id is the GNU build ID as a hex string.
+    """
+
+    path: str
+    elf_class: int
+    machine: int
+    interpreter: Optional[str]
+    is_dynamic: bool
+    needed: List[str]
+    soname: Optional[str]
+    rpaths: List[str]
+    runpaths: List[str]
+    version_requirements: Dict[str, List[str]]
+    version_definitions: List[str]
+    build_id: Optional[str]
+
+    def __init__(self, path: str, elf_class: int, machine: int) -> None:
+        self.path = path
+        self.elf_class = elf_class
+        self.machine = machine
+        self.interpreter = None
+        self.is_dynamic = False
+        self.needed = []
+        self.soname = None
+        self.rpaths = []
+        self.runpaths = []
+        self.version_requirements = {}
+        self.version_definitions = []
+        self.build_id = None
+
+    def is_compatible_with(self, other: 'ElfFile') -> bool:
+        return self.elf_class == other.elf_class and self.machine == other.machine
+
+    def get_search_path(self, dynamic_tag: int, origin: str) -> List[str]:
+        """
+        Returns the directories listed in DT_RPATH or DT_RUNPATH, with $ORIGIN expanded to the
+        given directory. As in the dynamic loader, DT_RPATH is ignored if DT_RUNPATH is present.
+        """
+        if dynamic_tag == DT_RPATH and self.runpaths:
+            return []
+        return [
+            expand_origin(dir_path, origin)
+            for value in (self.rpaths if dynamic_tag == DT_RPATH else self.runpaths)
+            for dir_path in value.split(':')
+            if dir_path
+        ]
+
+
+def expand_origin(dir_path: str, origin: str) -> str:
+    """
+    >>> expand_origin('$ORIGIN/../lib', '/opt/yb/bin')
+    '/opt/yb/bin/../lib'
+    >>> expand_origin('${ORIGIN}', '/opt/yb/lib')
+    '/opt/yb/lib'
+    """
+    for token in ORIGIN_TOKENS:
+        dir_path = dir_path.replace(token, origin)
+    return dir_path
+
+
+class _ElfReader:
+    """
+    Reads structures from a memory-mapped ELF file, checking that they are within the file.
+    """
+
+    data: mmap.mmap
+    byte_order: str
+    is_64_bit: bool
+
+    def __init__(self, data: mmap.mmap, byte_order: str, is_64_bit: bool) -> None:
+        self.data = data
+        self.byte_order = byte_order
+        self.is_64_bit = is_64_bit
+
+    def unpack(self, fmt: str, offset: int) -> Tuple[int, ...]:
+        try:
+            return struct.unpack_from(self.byte_order + fmt, self.data, offset)
+        except struct.error as ex:
+            raise ElfFormatError("Truncated ELF structure at offset %d: %s" % (offset, ex))
+
+    def read_string(self, offset: int) -> str:
+        end = self.data.find(b'\0', offset)
+        if offset < 0 or end < 0:
+            raise ElfFormatError("Invalid string offset %d" % offset)
+        return self.data[offset:end].decode('utf-8', errors='surrogateescape')
+
+
+def read_elf_file(file_path: str) -> Optional[ElfFile]:
+    """
+    Reads the dynamic linking information of the given file. Returns None if the file is not an ELF
+    file, e.g. a script or a linker script such as libc++.so.
+    """
+    with open(file_path, 'rb') as input_file:
+        if os.fstat(input_file.fileno()).st_size < 64:
+            return None
+        with mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:4] != ELF_MAGIC:
+                return None
+            try:
+                return _read_elf_file(file_path, data)
+            except ElfFormatError as ex:
+                raise ElfFormatError("Invalid ELF file %s: %s" % (file_path, ex))
+
+
+def _read_elf_file(file_path: str, data: mmap.mmap) -> ElfFile:
+    elf_class = data[4]
+    if elf_class not in (ELFCLASS32, ELFCLASS64):
+        raise ElfFormatError("Unknown ELF class %d" % elf_class)
+    if data[5] not in (ELFDATA2LSB, ELFDATA2MSB):
+        raise ElfFormatError("Unknown ELF data encoding %d" % data[5])
+    is_64_bit = elf_class == ELFCLASS64
+    reader = _ElfReader(data, '<' if data[5] == ELFDATA2LSB else '>', is_64_bit)
+
+    if is_64_bit:
+        _, machine, _, _, phoff, _, _, _, phentsize, phnum = reader.unpack('HHIQQQIHHH', 16)
+        program_header_format = 'IIQQQQQQ'
+    else:
+        _, machine, _, _, phoff, _, _, _, phentsize, phnum = reader.unpack('HHIIIIIHHH', 16)
+        program_header_format = 'IIIIIIII'
+    elf_file = ElfFile(file_path, elf_class, machine)
+
+    # Loadable segments as (virtual address, file offset, size in file), used to convert the
+    # addresses in the dynamic section to file offsets.
+    segments: List[Tuple[int, int, int]] = []
+    dynamic_segment: Optional[Tuple[int, int]] = None
+    for i in range(phnum):
+        fields = reader.unpack(program_header_format, phoff + i * phentsize)
+        if is_64_bit:
+            p_type, _, p_offset, p_vaddr, _, p_filesz, _, p_align = fields
+        else:
+            p_type, p_offset, p_vaddr, _, p_filesz, _, _, p_align = fields
+        if p_type == PT_LOAD:
+            segments.append((p_vaddr, p_offset, p_filesz))
+        elif p_type == PT_DYNAMIC:
+            dynamic_segment = (p_offset, p_filesz)
+        elif p_type == PT_INTERP:
+            elf_file.interpreter = reader.read_string(p_offset)
+        elif p_type == PT_NOTE and elf_file.build_id is None:
+            elf_file.build_id = _read_build_id(reader, p_offset, p_filesz, p_align)
+
+    if dynamic_segment is None:
+        return elf_file
+    elf_file.is_dynamic = True
+
+    def address_to_offset(address: int) -> int:
+        for vaddr, offset, size in segments:
+            if vaddr <= address < vaddr + size:
+                return address - vaddr + offset
+        raise ElfFormatError("Address 0x%x is not in a loadable segment" % address)
+
+    entries: List[Tuple[int, int]] = []
+    dynamic_offset, dynamic_size = dynamic_segment
+    entry_format, entry_size = ('qQ', 16) if is_64_bit else ('iI', 8)
+    for entry_offset in range(dynamic_offset, dynamic_offset + dynamic_size, entry_size):
+        tag, value = reader.unpack(entry_format, entry_offset)
+        if tag == DT_NULL:
+            break
+        entries.append((tag, value))
+
+    string_table_addresses = [value for tag, value in entries if tag == DT_STRTAB]
+    if not string_table_addresses:
+        raise ElfFormatError("No DT_STRTAB entry in the dynamic section")
+    string_table_offset = address_to_offset(string_table_addresses[0])
+
+    def read_dynamic_string(string_offset: int) -> str:
+        return reader.read_string(string_table_offset + string_offset)
+
+    verneed_address: Optional[int] = None
+    verneed_count = 0
+    verdef_address: Optional[int] = None
+    verdef_count = 0
+    for tag, value in entries:
+        if tag == DT_NEEDED:
+            elf_file.needed.append(read_dynamic_string(value))
+        elif tag == DT_SONAME:
+            elf_file.soname = read_dynamic_string(value)
+        elif tag == DT_RPATH:
+            elf_file.rpaths.append(read_dynamic_string(value))
+        elif tag == DT_RUNPATH:
+            elf_file.runpaths.append(read_dynamic_string(value))
+        elif tag == DT_VERNEED:
+            verneed_address = value
+        elif tag == DT_VERNEEDNUM:
+            verneed_count = value
+        elif tag == DT_VERDEF:
+            verdef_address = value
+        elif tag == DT_VERDEFNUM:
+            verdef_count = value
+
+    if verneed_address is not None:
+        # Elf_Verneed and Elf_Vernaux have the same layout in 32-bit and 64-bit files.
+        verneed_offset = address_to_offset(verneed_address)
+        for _ in range(verneed_count):
+            _, aux_count, file_name_offset, aux_offset, next_offset = reader.unpack(
+                'HHIII', verneed_offset)
+            versions = elf_file.version_requirements.setdefault(
+                read_dynamic_string(file_name_offset), [])
+            vernaux_offset = verneed_offset + aux_offset
+            for _ in range(aux_count):
+                _, version_flags, _, version_name_offset, next_aux_offset = reader.unpack(
+                    'IHHII', vernaux_offset)
+                if not version_flags & VER_FLG_WEAK:
+                    versions.append(read_dynamic_string(version_name_offset))
+                vernaux_offset += next_aux_offset
+            if next_offset == 0:
+                break
+            verneed_offset += next_offset
+
+    if verdef_address is not None:
+        # Elf_Verdef and Elf_Verdaux have the same layout in 32-bit and 64-bit files. The first
+        # auxiliary entry of a version definition contains its name.
+        verdef_offset = address_to_offset(verdef_address)
+        for _ in range(verdef_count):
+            _, _, _, aux_count, _, aux_offset, next_offset = reader.unpack(
+                'HHHHIII', verdef_offset)
+            if aux_count > 0:
+                version_name_offset, = reader.unpack('I', verdef_offset + aux_offset)
+                elf_file.version_definitions.append(read_dynamic_string(version_name_offset))
+            if next_offset == 0:
+                break
+            verdef_offset += next_offset
+    return elf_file
+
+
+def _read_build_id(reader: _ElfReader, offset: int, size: int, alignment: int) -> Optional[str]:
+    """
+    Returns the GNU build ID from the given note segment, if it contains one.
+    """
+    alignment = 8 if alignment == 8 else 4
+    position = offset
+    while position + 12 <= offset + size:
+        name_size, desc_size, note_type = reader.unpack('III', position)
+        name_start = position + 12
+        desc_start = name_start + (name_size + alignment - 1) // alignment * alignment
+        if (note_type == NT_GNU_BUILD_ID and
+                reader.data[name_start:name_start + name_size] == b'GNU\x00'):
+            return bytes(reader.data[desc_start:desc_start + desc_size]).hex()
+        position = desc_start + (desc_size + alignment - 1) // alignment * alignment
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def load_ld_so_cache(cache_path: str = LD_SO_CACHE_PATH) -> Dict[str, List[str]]:
+    """
+    Returns a map from library names to their paths from the dynamic loader cache, in the order the
+    dynamic loader would try them. Only the format written by glibc 2.32+ (and by older versions
+    in addition to the legacy format) is supported. Returns an empty map if the cache is missing.
+    """
+    result: Dict[str, List[str]] = {}
+    if not os.path.exists(cache_path):
+        return result
+    with open(cache_path, 'rb') as input_file:
+        data = input_file.read()
+    cache_start = data.find(LD_SO_CACHE_MAGIC)
+    if cache_start < 0:
+        return result
+    num_libs, = struct.unpack_from('=I', data, cache_start + len(LD_SO_CACHE_MAGIC))
+    # The header is 48 bytes, followed by entries of flags, key, value, OS version and hwcap.
+    for i in range(num_libs):
+        _, key, value, _, _ = struct.unpack_from('=iIIIQ', data, cache_start + 48 + i * 24)
+        name = data[cache_start + key:data.index(b'\0', cache_start + key)].decode()
+        path = data[cache_start + value:data.index(b'\0', cache_start + value)].decode()
+        result.setdefault(name, []).append(path)
+    return result
+
+
+class ResolvedLibrary:
+    """
+    A library loaded while resolving the dependencies of an ELF file. path is None if the library
+    was not found. Like in the dynamic loader, paths are not normalized, and $ORIGIN is the
+    directory part of the path that the library was found at, even if it is a symlink. names
+    contains all names the library is known by, i.e. the names it was needed as and its soname.
+    """
+
+    name: str
+    path: Optional[str]
+    elf_file: Optional[ElfFile]
+    loader: Optional['ResolvedLibrary']
+    names: List[str]
+
+    def __init__(
+            self,
+            name: str,
+            path: Optional[str],
+            elf_file: Optional[ElfFile],
+            loader: Optional['ResolvedLibrary']) -> None:
+        self.name = name
+        self.path = path
+        self.elf_file = elf_file
+        self.loader = loader
+        self.names = []
+
+    def get_search_path(self, dynamic_tag: int) -> List[str]:
+        assert self.path is not None
+        assert self.elf_file is not None
+        return self.elf_file.get_search_path(
+            dynamic_tag, os.path.dirname(os.path.join(os.getcwd(), self.path)))
+
+
+class DependencyResolver:
+    """
+    Resolves shared library dependencies like the dynamic loader, see the module docstring.
+    Information read from files is cached until their size, modification time or inode number
+    change, so one resolver can be reused for many files.
+
+    runpath_overrides maps real file paths to RUNPATH entries used instead of those in the
+    files, to resolve dependencies as if the RUNPATHs had been changed without modifying the files.
+    """
+
+    ld_so_cache: Dict[str, List[str]]
+    elf_file_cache: Dict[Tuple[str, int, int, int], Optional[ElfFile]]
+    runpath_overrides: Dict[str, List[str]]
+
+    def __init__(
+            self,
+            ld_so_cache_path: str = LD_SO_CACHE_PATH,
+            runpath_overrides: Optional[Dict[str, List[str]]] = None) -> None:
+        self.ld_so_cache = load_ld_so_cache(ld_so_cache_path)
+        self.elf_file_cache = {}
+        self.runpath_overrides = runpath_overrides or {}
+
+    def read_elf_file(self, file_path: str) -> Optional[ElfFile]:
+        st = os.stat(file_path)
+        cache_key = (os.path.abspath(file_path), st.st_size, st.st_mtime_ns, st.st_ino)
+        if cache_key not in self.elf_file_cache:
+            elf_file = read_elf_file(file_path)
+            real_path = os.path.realpath(file_path)
+            if elf_file is not None and real_path in self.runpath_overrides:
+                elf_file = copy.copy(elf_file)
+                elf_file.rpaths = []
+                elf_file.runpaths = [':'.join(self.runpath_overrides[real_path])]
+            self.elf_file_cache[cache_key] = elf_file
+        return self.elf_file_cache[cache_key]
+
+    def get_candidate_paths(self, name: str, loader: ResolvedLibrary) -> List[str]:
+        if '/' in name:
+            return [name]
+        search_dirs: List[str] = []
+        assert loader.elf_file is not None
+        if not loader.elf_file.runpaths:
+            current: Optional[ResolvedLibrary] = loader
+            while current is not None:
+                search_dirs.extend(current.get_search_path(DT_RPATH))
+                current = current.loader
+        search_dirs.extend(loader.get_search_path(DT_RUNPATH))
+        return (
+            [os.path.join(dir_path, name) for dir_path in search_dirs] +
+            self.ld_so_cache.get(name, []) +
+            [os.path.join(dir_path, name)
+             for dir_path in DEFAULT_LIBRARY_DIRS.get(loader.elf_file.machine, [])])
+
+    def find_library(
+            self, name: str, loader: ResolvedLibrary) -> Tuple[Optional[str], Optional[ElfFile]]:
+        assert loader.elf_file is not None
+        for candidate_path in self.get_candidate_paths(name, loader):
+            if not os.path.isfile(candidate_path):
+                continue
+            try:
+                elf_file = self.read_elf_file(candidate_path)
+            except ElfFormatError:
+                continue
+            if elf_file is not None and elf_file.is_compatible_with(loader.elf_file):
+                return candidate_path, elf_file
+        return None, None
+
+    def resolve(self, file_path: str) -> Optional[List[ResolvedLibrary]]:
+        """
+        Returns the libraries loaded for the given file in the order the dynamic loader loads
+        them (breadth first), including the dynamic loader itself, or None if the file is not a
+        dynamically linked ELF file.
+        """
+        root_elf_file = self.read_elf_file(file_path)
+        if root_elf_file is None or not root_elf_file.is_dynamic:
+            return None
+        root = ResolvedLibrary(file_path, file_path, root_elf_file, None)
+
+        loaded: List[ResolvedLibrary] = []
+        # Libraries are only loaded once, whether they are referred to by the name used in
+        # DT_NEEDED, by their DT_SONAME, or by a different path to the same file.
+        loaded_by_name: Dict[str, ResolvedLibrary] = {}
+        loaded_by_file_id: Dict[Tuple[int, int], ResolvedLibrary] = {}
+
+        def add_name(library: ResolvedLibrary, name: str) -> None:
+            loaded_by_name[name] = library
+            library.names.append(name)
+
+        def register(library: ResolvedLibrary) -> None:
+            add_name(library, library.name)
+            if library.elf_file is not None and library.elf_file.soname:
+                add_name(library, library.elf_file.soname)
+            if library.path is not None:
+                st = os.stat(library.path)
+                loaded_by_file_id[(st.st_dev, st.st_ino)] = library
+
+        register(root)
+        interpreter_path = root_elf_file.interpreter or DEFAULT_INTERPRETERS.get(
+            root_elf_file.machine)
+        interpreter: Optional[ResolvedLibrary] = None
+        if interpreter_path is not None and os.path.exists(interpreter_path):
+            interpreter = ResolvedLibrary(
+                interpreter_path, interpreter_path, self.read_elf_file(interpreter_path), None)
+            register(interpreter)
+            add_name(interpreter, os.path.basename(interpreter_path))
+
+        # The dynamic loader is only listed if it is the interpreter of the file or if another
+        # library, normally libc, depends on it.
+        is_interpreter_used = root_elf_file.interpreter is not None
+
+        queue: List[ResolvedLibrary] = [root]
+        while queue:
+            loader = queue.pop(0)
+            assert loader.elf_file is not None
+            for name in loader.elf_file.needed:
+                existing = loaded_by_name.get(name)
+                if existing is None:
+                    path, elf_file = self.find_library(name, loader)
+                    if path is not None:
+                        st = os.stat(path)
+                        existing = loaded_by_file_id.get((st.st_dev, st.st_ino))
+                        if existing is not None:
+                            add_name(existing, name)
+                if existing is not None:
+                    if existing is interpreter:
+                        is_interpreter_used = True
+                    continue
+                library = ResolvedLibrary(name, path, elf_file, loader)
+                register(library)
+                loaded.append(library)
+                if elf_file is not None:
+                    queue.append(library)
+        if interpreter is not None and is_interpreter_used:
+            loaded.append(interpreter)
+        return loaded
+
+
+def get_ldd_output_lines(
+        file_path: str,
+        resolver: Optional[DependencyResolver] = None) -> List[str]:
+    """
+    Returns lines in the format of the output of ldd for the given file, with zero load addresses.
+    """
+    resolver = resolver or DependencyResolver()
+    elf_file = resolver.read_elf_file(file_path)
+    if elf_file is not None and elf_file.is_dynamic and not elf_file.needed:
+        return ['\tstatically linked']
+    libraries = resolver.resolve(file_path)
+    if libraries is None:
+        return ['\tnot a dynamic executable']
+    assert elf_file is not None
+    lines = get_missing_version_lines(file_path, elf_file, libraries)
+    lines.append('\tlinux-vdso.so.1 (0x0)')
+    for library in libraries:
+        if library.loader is None:
+            # The dynamic loader.
+            lines.append('\t%s (0x0)' % library.path)
+        elif library.path is None:
+            lines.append('\t%s => not found' % library.name)
+        else:
+            lines.append('\t%s => %s (0x0)' % (library.name, library.path))
+    return lines
+
+
+def get_missing_version_lines(
+        file_path: str,
+        elf_file: ElfFile,
+        libraries: List[ResolvedLibrary]) -> List[str]:
+    """
+    Returns lines in the format of the errors ldd prints for symbol versions required by the given
+    file or the libraries loaded for it that are not defined by the libraries they are required
+    from. Like in the dynamic loader, libraries that do not use symbol versioning are not checked.
+    """
+    libraries_by_name = {
+        name: library for library in libraries for name in library.names
+    }
+    requirers = [(file_path, elf_file)] + [
+        (library.path, library.elf_file) for library in libraries
+        if library.path is not None and library.elf_file is not None]
+    lines: List[str] = []
+    for requirer_path, requirer_elf_file in requirers:
+        for name, versions in requirer_elf_file.version_requirements.items():
+            provider = libraries_by_name.get(name)
+            if (provider is None or
+                    provider.elf_file is None or
+                    not provider.elf_file.version_definitions):
+                continue
+            for version in versions:
+                if version not in provider.elf_file.version_definitions:
+                    lines.append("%s: %s: version `%s' not found (required by %s)" % (
+                        file_path, provider.path, version, requirer_path))
+    return lines
@@ -18,6 +18,7 @@ import sys
 
 from typing import List, Optional, Set, Dict, Any, Mapping, Optional
 
+from yugabyte_db_thirdparty import env_var_names
 from yugabyte_db_thirdparty.devtoolset import DEVTOOLSET_ENV_VARS
 from yugabyte_db_thirdparty.string_util import split_into_word_set, parse_bool
 from yugabyte_db_thirdparty.custom_logging import log, heading, log_separator
@@ -42,14 +43,23 @@ ENV_VARS_TO_SAVE = split_into_word_set("""
     AS
 """)
 
+# The jobserver FIFO is deleted at the end of the build, so scripts that source the saved
+# environment to re-run a dependency's build by hand must not use it.
+ENV_VARS_NOT_TO_SAVE = {env_var_names.JOBSERVER_FIFO}
+
+
+def get_env_vars_to_save() -> Dict[str, str]:
+    return {
+        k: v for k, v in os.environ.items()
+        if (k in ENV_VARS_TO_SAVE or k in DEVTOOLSET_ENV_VARS or k.startswith('YB_')) and
+        k not in ENV_VARS_NOT_TO_SAVE
+    }
+
 
 def write_env_vars(file_path: str) -> None:
     env_script = ''
-    for k, v in sorted(dict(os.environ).items()):
-        if (k in ENV_VARS_TO_SAVE or
-                k in DEVTOOLSET_ENV_VARS or
-                k.startswith('YB_')):
-            env_script += 'export %s=%s\n' % (k, shlex.quote(v))
+    for k, v in sorted(get_env_vars_to_save().items()):
+        env_script += 'export %s=%s\n' % (k, shlex.quote(v))
     with open(file_path, 'w') as output_file:
         output_file.write(env_script)
 
@@ -19,8 +19,12 @@ import re
 
 # Set these to empty strings, and they will be automatically set to YB_THIRDPARTY_<name>,
 # e.g. YB_THIRDPARTY_LD_FLAGS_TO_APPEND.
+ARTIFACT_CACHE_DIR = ''
 CONFIGURING = ''
+DEPENDENCY_PARALLELISM = ''
 DISALLOWED_INCLUDE_DIRS = ''
+DOWNLOAD_CACHE_DIR = ''
+JOBSERVER_FIFO = ''
 LD_FLAGS_TO_APPEND = ''
 LD_FLAGS_TO_REMOVE = ''
 MAKE_PARALLELISM = ''
@@ -29,6 +33,7 @@ REAL_CXX_COMPILER = ''
 REMOTE_BUILD_DIR = ''
 REMOTE_BUILD_SERVER = ''
 SAVE_USED_INCLUDE_TAGS_IN_DIR = ''
+SOURCE_STORE_DIR = ''
 TRACK_INCLUDES_IN_SUBDIRS_OF = ''
 USE_CCACHE = ''
 VERBOSE = ''
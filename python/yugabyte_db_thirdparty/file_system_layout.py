@@ -20,6 +20,8 @@ from enum import Enum
 from yugabyte_db_thirdparty.util import YB_THIRDPARTY_DIR, remove_path
 from yugabyte_db_thirdparty.dependency import Dependency
 from yugabyte_db_thirdparty.custom_logging import heading, log
+from yugabyte_db_thirdparty.file_util import exclusive_file_lock, LOCK_SUFFIX
+from yugabyte_db_thirdparty.http_downloader import PARTIAL_SUFFIX
 from yugabyte_db_thirdparty.compiler_choice import CompilerChoice
 from yugabyte_db_thirdparty.linuxbrew import using_linuxbrew
 from yugabyte_db_thirdparty.arch import get_target_arch
@@ -33,6 +35,7 @@ class SourcePathType(Enum):
 
 
 class FileSystemLayout:
+    tp_build_parent_dir: str
     tp_build_dir: str
     tp_src_dir: str
     tp_download_dir: str
@@ -47,6 +50,7 @@ class FileSystemLayout:
     def __init__(self) -> None:
         self.tp_src_dir = os.path.join(YB_THIRDPARTY_DIR, 'src')
         self.tp_download_dir = os.path.join(YB_THIRDPARTY_DIR, 'download')
+        self.tp_build_parent_dir = os.path.join(YB_THIRDPARTY_DIR, 'build')
         self.dev_repo_mappings = {}
 
     def finish_initialization(
@@ -59,7 +63,7 @@ class FileSystemLayout:
             or if this is None, the value is determined automatically based on the contents of the
             build directory.
         """
-        build_parent_dir = self.tp_build_dir = os.path.join(YB_THIRDPARTY_DIR, 'build')
+        build_parent_dir = self.tp_build_dir = self.tp_build_parent_dir
         installed_parent_dir = os.path.join(YB_THIRDPARTY_DIR, 'installed')
         if (per_build_subdirs is None and
                 os.path.exists(build_parent_dir) and
@@ -140,19 +144,41 @@ class FileSystemLayout:
                         description="source")
 
             if clean_downloads:
-                self.remove_path_for_dependency(
-                    dep=dependency,
-                    path=self.get_archive_path(dependency),
-                    description="downloaded archive")
+                self.remove_archive_for_dependency(dependency)
+
+    def remove_archive_for_dependency(self, dep: Dependency) -> None:
+        archive_path = self.get_archive_path(dep)
+        if archive_path is None:
+            self.remove_path_for_dependency(dep=dep, path=None, description="downloaded archive")
+            return
+        # The download directory can be shared with concurrent builds. Take the same lock as the
+        # download manager, so that an archive being downloaded or extracted is not removed.
+        with exclusive_file_lock(archive_path + LOCK_SUFFIX):
+            self.remove_path_for_dependency(
+                dep=dep,
+                path=archive_path,
+                description="downloaded archive")
+            remove_path(archive_path + PARTIAL_SUFFIX)
 
     def get_build_stamp_path_for_dependency(self, dep: Dependency, build_type: BuildType) -> str:
         return os.path.join(self.tp_build_dir,
                             build_type.dir_name,
                             '.build-stamp-{}'.format(dep.name))
 
+    def get_installed_file_manifest_path(self, dep: Dependency, build_type: BuildType) -> str:
+        return os.path.join(self.tp_build_dir,
+                            build_type.dir_name,
+                            '.installed-files-{}.json'.format(dep.name))
+
     def get_build_dir_for_dependency(self, dep: Dependency, build_type: BuildType) -> str:
         return os.path.join(self.tp_build_dir, build_type.dir_name, dep.dir_name)
 
+    def get_compiler_probe_cache_path(self) -> str:
+        """
+        The compiler probe cache is keyed by compiler, so it is shared by all build directories.
+        """
+        return os.path.join(self.tp_build_parent_dir, 'compiler_probe_cache.json')
+
     def get_llvm_tool_dir(self) -> str:
         """
         Returns a directory name where we will put various tools with standard names, such as nm,
@@ -10,17 +10,44 @@
 # or implied. See the License for the specific language governing permissions and limitations
 # under the License.
 
+import contextlib
+import fcntl
 import os
 import pathlib
 import shutil
+import time
+
+from typing import Iterator
 
 from yugabyte_db_thirdparty.custom_logging import log
 
+LOCK_SUFFIX = '.lock'
+
 
 def mkdir_p(path: str) -> None:
     pathlib.Path(path).mkdir(parents=True, exist_ok=True)
 
 
+@contextlib.contextmanager
+def exclusive_file_lock(lock_file_path: str) -> Iterator[None]:
+    """
+    Holds an exclusive lock on the given file, creating it if necessary, while the context is
+    active. Builder processes on the same host, as well as threads of the same process, wait for
+    each other.
+    """
+    mkdir_p(os.path.dirname(lock_file_path))
+    with open(lock_file_path, 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            log("Waiting for lock %s held by another build", lock_file_path)
+            wait_start_time_sec = time.time()
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            log("Acquired lock %s after waiting for %.1f sec",
+                lock_file_path, time.time() - wait_start_time_sec)
+        yield
+
+
 def create_intermediate_dirs_for_rel_path(
         base_dir: str,
         rel_path: str) -> str:
@@ -0,0 +1,496 @@
+# Copyright (c) YugabyteDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+#
+
+"""
+An HTTP client for downloading archives, based on http.client. Connections are kept open and
+pooled per host, interrupted downloads are resumed using Range requests, and large files are
+downloaded as several ranges in parallel if the server supports it.
+"""
+
+import concurrent.futures
+import glob
+import http.client
+import os
+import re
+import shutil
+import ssl
+import threading
+import time
+import urllib.request
+
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse, ParseResult
+
+from yugabyte_db_thirdparty.custom_logging import log
+from yugabyte_db_thirdparty.util import remove_path
+
+MAX_FETCH_ATTEMPTS = 20
+INITIAL_DOWNLOAD_RETRY_SLEEP_TIME_SEC = 1.0
+DOWNLOAD_RETRY_SLEEP_INCREASE_SEC = 0.5
+
+MAX_REDIRECTS = 10
+CONNECTION_TIMEOUT_SEC = 60
+READ_CHUNK_SIZE = 1024 * 1024
+USER_AGENT = 'yugabyte-db-thirdparty'
+
+# Files of at least twice this size are downloaded as multiple ranges in parallel.
+MIN_RANGE_SIZE_BYTES = 8 * 1024 * 1024
+MAX_PARALLEL_RANGES = 4
+
+# Data downloaded so far is kept in files with these suffixes, so that the download can be resumed
+# after a failure, including in a later run.
+PARTIAL_SUFFIX = '.partial'
+RANGE_PART_SUFFIX = '.part'
+
+REDIRECT_STATUSES = [301, 302, 303, 307, 308]
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+# Scheme, host, port, and the proxy URL or an empty string.
+ConnectionKey = Tuple[str, str, int, str]
+
+ChunkConsumer = Callable[[bytes], None]
+
+
+class HttpError(IOError):
+    status: int
+
+    def __init__(self, url: str, status: int, reason: str) -> None:
+        super().__init__("HTTP error %d (%s) for URL %s" % (status, reason, url))
+        self.status = status
+
+    def is_retriable(self) -> bool:
+        return self.status >= 500 or self.status in [408, 429]
+
+
+class HttpNotFoundError(HttpError):
+    pass
+
+
+class RangeRequestsNotSupportedError(IOError):
+    pass
+
+
+def is_transient_error(ex: Exception) -> bool:
+    """
+    Returns True if a request that failed with the given error is worth retrying.
+
+    >>> is_transient_error(ConnectionResetError())
+    True
+    >>> is_transient_error(HttpError('http://example.com', 503, 'Service Unavailable'))
+    True
+    >>> is_transient_error(HttpNotFoundError('http://example.com', 404, 'Not Found'))
+    False
+    """
+    if isinstance(ex, RangeRequestsNotSupportedError):
+        return False
+    if isinstance(ex, HttpError):
+        return ex.is_retriable()
+    return isinstance(ex, (http.client.HTTPException, OSError))
+
+
+def split_into_ranges(total_size: int, num_ranges: int) -> List[Tuple[int, int]]:
+    """
+    Splits the given number of bytes into ranges of almost equal size. Range ends are exclusive.
+
+    >>> split_into_ranges(10, 3)
+    [(0, 4), (4, 7), (7, 10)]
+    >>> split_into_ranges(8, 2)
+    [(0, 4), (4, 8)]
+    """
+    ranges = []
+    start = 0
+    for i in range(num_ranges):
+        end = start + total_size // num_ranges + (1 if i < total_size % num_ranges else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def get_num_parallel_ranges(total_size: int) -> int:
+    """
+    >>> get_num_parallel_ranges(10 * 1024 * 1024)
+    1
+    >>> get_num_parallel_ranges(20 * 1024 * 1024)
+    2
+    >>> get_num_parallel_ranges(1024 * 1024 * 1024)
+    4
+    """
+    return max(1, min(MAX_PARALLEL_RANGES, total_size // MIN_RANGE_SIZE_BYTES))
+
+
+def get_path_and_query(parsed_url: ParseResult) -> str:
+    path = parsed_url.path or '/'
+    if parsed_url.query:
+        path += '?' + parsed_url.query
+    return path
+
+
+def get_file_size_or_zero(file_path: str) -> int:
+    if os.path.exists(file_path):
+        return os.path.getsize(file_path)
+    return 0
+
+
+class ConnectionPool:
+    """
+    Keeps idle connections per host, so that multiple requests to the same host, e.g. redirects
+    and range requests, do not have to establish a new connection every time. Connections are not
+    shared with forked child processes.
+    """
+
+    idle_connections: Dict[ConnectionKey, List[http.client.HTTPConnection]]
+    lock: threading.Lock
+    pid: int
+    ssl_context: ssl.SSLContext
+
+    def __init__(self) -> None:
+        self.idle_connections = {}
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.ssl_context = ssl.create_default_context()
+
+    def get_connection_key(self, parsed_url: ParseResult) -> ConnectionKey:
+        scheme = parsed_url.scheme
+        if scheme not in ['http', 'https']:
+            raise ValueError("Unsupported URL scheme: %s" % parsed_url.geturl())
+        host = parsed_url.hostname
+        if not host:
+            raise ValueError("No host in URL: %s" % parsed_url.geturl())
+        port = parsed_url.port or (443 if scheme == 'https' else 80)
+        proxy_url = ''
+        if not urllib.request.proxy_bypass(host):
+            proxy_url = urllib.request.getproxies().get(scheme, '')
+        return (scheme, host, port, proxy_url)
+
+    def get_connection(
+            self, key: ConnectionKey) -> Tuple[http.client.HTTPConnection, bool]:
+        """
+        Returns an idle connection for the given key, or a new one. The second element of the
+        result is True if the connection has been used before.
+        """
+        with self.lock:
+            if self.pid != os.getpid():
+                # We are in a forked child process. The parent process still owns the connections.
+                self.idle_connections = {}
+                self.pid = os.getpid()
+            connections = self.idle_connections.get(key)
+            if connections:
+                return connections.pop(), True
+
+        scheme, host, port, proxy_url = key
+        connection: http.client.HTTPConnection
+        if proxy_url:
+            parsed_proxy_url = urlparse(proxy_url)
+            proxy_host = parsed_proxy_url.hostname or ''
+            proxy_port = parsed_proxy_url.port or 80
+            if scheme == 'https':
+                connection = http.client.HTTPSConnection(
+                    proxy_host, proxy_port, timeout=CONNECTION_TIMEOUT_SEC,
+                    context=self.ssl_context)
+                connection.set_tunnel(host, port)
+            else:
+                connection = http.client.HTTPConnection(
+                    proxy_host, proxy_port, timeout=CONNECTION_TIMEOUT_SEC)
+        elif scheme == 'https':
+            connection = http.client.HTTPSConnection(
+                host, port, timeout=CONNECTION_TIMEOUT_SEC, context=self.ssl_context)
+        else:
+            connection = http.client.HTTPConnection(host, port, timeout=CONNECTION_TIMEOUT_SEC)
+        return connection, False
+
+    def release_connection(
+            self,
+            key: ConnectionKey,
+            connection: http.client.HTTPConnection,
+            response: http.client.HTTPResponse) -> None:
+        """
+        Returns a connection to the pool once the given response on it has been read completely.
+        """
+        if response.will_close or not response.isclosed():
+            connection.close()
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                self.idle_connections.setdefault(key, []).append(connection)
+                return
+        connection.close()
+
+
+class HttpResponse:
+    """
+    A response to a GET request, after following redirects. Must be closed after use, which returns
+    the connection to the pool if the body has been read completely.
+    """
+
+    pool: ConnectionPool
+    key: ConnectionKey
+    connection: http.client.HTTPConnection
+    response: http.client.HTTPResponse
+    url: str
+
+    def __init__(
+            self,
+            pool: ConnectionPool,
+            key: ConnectionKey,
+            connection: http.client.HTTPConnection,
+            response: http.client.HTTPResponse,
+            url: str) -> None:
+        self.pool = pool
+        self.key = key
+        self.connection = connection
+        self.response = response
+        self.url = url
+
+    @property
+    def status(self) -> int:
+        return self.response.status
+
+    def close(self) -> None:
+        self.pool.release_connection(self.key, self.connection, self.response)
+
+    def raise_for_status(self) -> None:
+        if self.status == 404:
+            raise HttpNotFoundError(self.url, self.status, self.response.reason)
+        if self.status >= 400:
+            raise HttpError(self.url, self.status, self.response.reason)
+
+
+class HttpDownloader:
+    pool: ConnectionPool
+
+    def __init__(self) -> None:
+        self.pool = ConnectionPool()
+
+    def send_request(
+            self,
+            url: str,
+            key: ConnectionKey,
+            headers: Dict[str, str]) -> HttpResponse:
+        parsed_url = urlparse(url)
+        # A plain HTTP request through a proxy specifies the absolute URL.
+        proxy_url = key[3]
+        path = url if proxy_url and key[0] == 'http' else get_path_and_query(parsed_url)
+        while True:
+            connection, is_reused = self.pool.get_connection(key)
+            try:
+                connection.request('GET', path, headers=dict(headers, **{
+                    'User-Agent': USER_AGENT,
+                }))
+                return HttpResponse(self.pool, key, connection, connection.getresponse(), url)
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                # The server might have closed an idle connection, retry with a new one.
+                if not is_reused:
+                    raise
+
+    def open_url(self, url: str, headers: Dict[str, str]) -> HttpResponse:
+        """
+        Sends a GET request for the given URL, following redirects.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            key = self.pool.get_connection_key(urlparse(url))
+            response = self.send_request(url, key, headers)
+            if response.status not in REDIRECT_STATUSES:
+                return response
+            location = response.response.getheader('Location')
+            response.response.read()
+            response.close()
+            if not location:
+                raise HttpError(url, response.status, "redirect without a Location header")
+            url = urljoin(url, location)
+        raise IOError("Too many redirects for URL %s" % url)
+
+    def get_size_if_ranges_supported(self, url: str) -> Optional[int]:
+        """
+        Returns the size of the file at the given URL if the server supports range requests for
+        it, or None otherwise. Transient errors are retried.
+        """
+        sleep_time_sec = INITIAL_DOWNLOAD_RETRY_SLEEP_TIME_SEC
+        attempt_index = 1
+        while True:
+            try:
+                return self.check_range_support(url)
+            except (http.client.HTTPException, OSError) as ex:
+                if not is_transient_error(ex):
+                    raise
+                if attempt_index == MAX_FETCH_ATTEMPTS:
+                    log("Giving up on %s after %d attempts", url, MAX_FETCH_ATTEMPTS)
+                    raise
+                log("Error checking range request support for %s (attempt %d), will retry after "
+                    "%.1f seconds: %s", url, attempt_index, sleep_time_sec, ex)
+                time.sleep(sleep_time_sec)
+                sleep_time_sec += DOWNLOAD_RETRY_SLEEP_INCREASE_SEC
+                attempt_index += 1
+
+    def check_range_support(self, url: str) -> Optional[int]:
+        response = self.open_url(url, {'Range': 'bytes=0-0'})
+        try:
+            response.raise_for_status()
+            if response.status != 206:
+                # Closing the response without reading the whole file closes the connection.
+                return None
+            content_range_match = CONTENT_RANGE_RE.match(
+                response.response.getheader('Content-Range', ''))
+            response.response.read()
+            if not content_range_match:
+                return None
+            return int(content_range_match.group(3))
+        finally:
+            response.close()
+
+    def fetch_range(
+            self,
+            url: str,
+            file_path: str,
+            start: int,
+            end: Optional[int],
+            chunk_consumer: Optional[ChunkConsumer] = None) -> None:
+        """
+        Downloads bytes from start to end (exclusive) of the file at the given URL to file_path, or
+        the whole file if start is 0 and end is None. If file_path already exists, it is assumed to
+        contain the beginning of the range, and the download continues from there. Transient
+        errors are retried in the same way. Downloaded data is also passed to chunk_consumer, if
+        specified.
+        """
+        sleep_time_sec = INITIAL_DOWNLOAD_RETRY_SLEEP_TIME_SEC
+        for attempt_index in range(1, MAX_FETCH_ATTEMPTS + 1):
+            offset = start + get_file_size_or_zero(file_path)
+            if end is not None and offset >= end:
+                return
+            headers = {}
+            if offset > 0 or end is not None:
+                headers['Range'] = 'bytes=%d-%s' % (offset, '' if end is None else end - 1)
+            try:
+                response = self.open_url(url, headers)
+                try:
+                    if response.status == 416 and end is None and offset > 0:
+                        log("%s already contains the whole file downloaded from %s",
+                            file_path, url)
+                        return
+                    response.raise_for_status()
+                    file_mode = 'ab'
+                    if response.status == 200 and headers:
+                        if start > 0 or end is not None or chunk_consumer is not None:
+                            raise RangeRequestsNotSupportedError(
+                                "Server does not support range requests for URL %s" % url)
+                        log("Server does not support resuming the download of %s, restarting",
+                            url)
+                        file_mode = 'wb'
+                    content_length = response.response.getheader('Content-Length')
+                    num_bytes_read = 0
+                    with open(file_path, file_mode) as output_file:
+                        while True:
+                            chunk = response.response.read(READ_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            output_file.write(chunk)
+                            num_bytes_read += len(chunk)
+                            if chunk_consumer is not None:
+                                chunk_consumer(chunk)
+                finally:
+                    response.close()
+                # The connection could be closed before the whole response body is received.
+                if content_length is not None and num_bytes_read != int(content_length):
+                    raise IOError("Expected %s bytes from %s, got %d" % (
+                        content_length, url, num_bytes_read))
+                if end is not None and start + get_file_size_or_zero(file_path) != end:
+                    raise IOError("Expected %d bytes in %s, got %d" % (
+                        end - start, file_path, get_file_size_or_zero(file_path)))
+                return
+            except (http.client.HTTPException, OSError) as ex:
+                if not is_transient_error(ex):
+                    raise
+                if attempt_index == MAX_FETCH_ATTEMPTS:
+                    log("Giving up on %s after %d attempts", url, MAX_FETCH_ATTEMPTS)
+                    raise
+                log("Error downloading %s (attempt %d), will resume from byte %d after %.1f "
+                    "seconds: %s",
+                    url, attempt_index, start + get_file_size_or_zero(file_path),
+                    sleep_time_sec, ex)
+                time.sleep(sleep_time_sec)
+                sleep_time_sec += DOWNLOAD_RETRY_SLEEP_INCREASE_SEC
+
+    def download(
+            self,
+            url: str,
+            file_path: str,
+            chunk_consumer: Optional[ChunkConsumer] = None) -> None:
+        """
+        Downloads the file at the given URL to file_path. The file only appears at file_path once
+        it has been downloaded completely. If chunk_consumer is specified, the contents of the file
+        are passed to it in order while the file is being downloaded, and the file is downloaded as
+        a single stream.
+        """
+        start_time_sec = time.time()
+        partial_path = file_path + PARTIAL_SUFFIX
+        if chunk_consumer is not None:
+            if os.path.exists(partial_path):
+                log("Resuming download of %s into %s", url, partial_path)
+                with open(partial_path, 'rb') as partial_file:
+                    while True:
+                        chunk = partial_file.read(READ_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        chunk_consumer(chunk)
+            self.fetch_range(url, partial_path, 0, None, chunk_consumer)
+            self.finish_download(url, partial_path, file_path, start_time_sec)
+            return
+
+        total_size = self.get_size_if_ranges_supported(url)
+        num_ranges = 1 if total_size is None else get_num_parallel_ranges(total_size)
+
+        ranges: List[Tuple[int, int]] = []
+        if total_size is not None and num_ranges > 1:
+            ranges = split_into_ranges(total_size, num_ranges)
+        # Range part file names include the range, so that parts left over from a previous
+        # download of a file with a different size are not reused.
+        part_paths = [
+            '%s.%d-%d%s' % (partial_path, start, end, RANGE_PART_SUFFIX)
+            for start, end in ranges
+        ]
+        for stale_part_path in glob.glob(glob.escape(partial_path) + '.*' + RANGE_PART_SUFFIX):
+            if stale_part_path not in part_paths:
+                remove_path(stale_part_path)
+
+        if not ranges:
+            self.fetch_range(url, partial_path, 0, None)
+        else:
+            log("Downloading %s as %d ranges in parallel", url, num_ranges)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=num_ranges) as executor:
+                futures = [
+                    executor.submit(self.fetch_range, url, part_path, start, end)
+                    for (start, end), part_path in zip(ranges, part_paths)
+                ]
+                for future in futures:
+                    future.result()
+            with open(partial_path, 'wb') as output_file:
+                for part_path in part_paths:
+                    with open(part_path, 'rb') as part_file:
+                        shutil.copyfileobj(part_file, output_file, READ_CHUNK_SIZE)
+            for part_path in part_paths:
+                remove_path(part_path)
+
+        self.finish_download(url, partial_path, file_path, start_time_sec)
+
+    def finish_download(
+            self,
+            url: str,
+            partial_path: str,
+            file_path: str,
+            start_time_sec: float) -> None:
+        os.rename(partial_path, file_path)
+        elapsed_time_sec = time.time() - start_time_sec
+        size_mb = os.path.getsize(file_path) / 1024.0 / 1024.0
+        log("Downloaded %.1f MB from %s in %.1f sec (%.1f MB/s)",
+            size_mb, url, elapsed_time_sec, size_mb / max(elapsed_time_sec, 0.001))
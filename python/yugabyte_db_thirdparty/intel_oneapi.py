@@ -15,6 +15,7 @@ Utilities for finding and using an Intel OneAPI installation. Because Intel OneA
 disk space, we copy only the necesary files from it to the thirdparty installed directory.
 """
 
+import concurrent.futures
 import glob
 import os
 import re
@@ -28,6 +29,7 @@ from typing import Set, Optional, List
 from yugabyte_db_thirdparty.custom_logging import log
 from yugabyte_db_thirdparty.util import shlex_join, is_shared_library_name
 from yugabyte_db_thirdparty import (
+    elf_util,
     ldd_util,
     file_util,
     rpath_util,
@@ -216,9 +218,10 @@ class IntelOneAPIInstallation:
         - If we are not packging Intel oneAPI, copies the needed libraries to the specific
           destination directory.
 
-        In both cases, before running ldd on an ELF file, removes the destination directory from
-        the RPATHs of the file, and adds those in rpaths_for_ldd. Afterwards, the changes are
-        reversed.
+        In both cases, dependencies of ELF files are resolved as if the destination directory was
+        removed from the RPATHs of the files, and those in rpaths_for_ldd were added. This is done
+        in-process without modifying the files. Afterwards, the destination directory is moved to
+        the front of the RPATHs, and the files whose RPATHs change are written once.
         """
         path_prefixes: Set[str] = set()
         executables_and_libraries: List[str] = []
@@ -227,21 +230,23 @@ class IntelOneAPIInstallation:
             for file_name in files:
                 file_path = os.path.join(root, file_name)
                 if ldd_util.should_use_ldd_on_file(file_path):
-                    ldd_result = ldd_util.run_ldd(file_path)
-                    if not ldd_result.not_a_dynamic_executable():
+                    elf_file = elf_util.read_elf_file(file_path)
+                    if elf_file is not None and elf_file.is_dynamic:
                         executables_and_libraries.append(file_path)
 
-        try:
-            for file_path in executables_and_libraries:
-                rpath_util.modify_rpaths(file_path, remove=dest_lib_dir, add_first=rpaths_for_ldd)
-            for file_path in executables_and_libraries:
-                ldd_result = ldd_util.run_ldd(file_path)
-                for full_path in list(ldd_result.resolved_dependencies):
-                    if self.is_path_within_base_dir(full_path):
-                        path_prefixes.add(ldd_util.remove_shared_lib_suffix(full_path))
-        finally:
-            for file_path in executables_and_libraries:
-                rpath_util.modify_rpaths(file_path, remove=rpaths_for_ldd, add_first=dest_lib_dir)
+        rpath_editor = rpath_util.RpathEditor()
+        for file_path in executables_and_libraries:
+            rpath_editor.modify_rpaths(file_path, remove=dest_lib_dir, add_first=rpaths_for_ldd)
+        resolver = elf_util.DependencyResolver(
+            runpath_overrides=rpath_editor.get_pending_rpaths())
+        for file_path in executables_and_libraries:
+            ldd_result = ldd_util.get_ldd_result(file_path, resolver)
+            for full_path in list(ldd_result.resolved_dependencies):
+                if self.is_path_within_base_dir(full_path):
+                    path_prefixes.add(ldd_util.remove_shared_lib_suffix(full_path))
+        for file_path in executables_and_libraries:
+            rpath_editor.modify_rpaths(file_path, remove=rpaths_for_ldd, add_first=dest_lib_dir)
+        rpath_editor.write_changes()
         if not path_prefixes:
             raise AssertionError(
                 f"Did not find any dependencies of executables or shared libraries in the subtree "
@@ -393,6 +398,52 @@ def download_intel_oneapi() -> IntelOneAPIInstallation:
     return IntelOneAPIInstallation(base_dir=download_root)
 
 
+_oneapi_download_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+_oneapi_download_future: Optional['concurrent.futures.Future[IntelOneAPIInstallation]'] = None
+
+
+def start_intel_oneapi_download() -> None:
+    """
+    Starts downloading Intel oneAPI in a background thread, so that the dependency that needs it
+    does not have to wait for the whole download later. join_intel_oneapi_download has to be called
+    before forking any processes.
+    """
+    global _oneapi_download_executor, _oneapi_download_future
+    if _oneapi_download_future is not None:
+        return
+    log("Starting to download Intel oneAPI in the background")
+    _oneapi_download_executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix='intel_oneapi_download')
+    _oneapi_download_future = _oneapi_download_executor.submit(download_intel_oneapi)
+
+
+def join_intel_oneapi_download() -> None:
+    """
+    Waits for the download started by start_intel_oneapi_download to finish and for the
+    downloading thread to exit. Download errors are reported here.
+    """
+    global _oneapi_download_executor
+    future = _oneapi_download_future
+    assert future is not None, "Intel oneAPI download has not been started"
+    if not future.done():
+        log("Waiting for the download of Intel oneAPI to finish")
+    if _oneapi_download_executor is not None:
+        _oneapi_download_executor.shutdown(wait=True)
+        _oneapi_download_executor = None
+    future.result()
+
+
+def wait_for_intel_oneapi_download() -> IntelOneAPIInstallation:
+    """
+    Returns the result of the download started by start_intel_oneapi_download, or downloads Intel
+    oneAPI now if the download was not started.
+    """
+    if _oneapi_download_future is not None:
+        join_intel_oneapi_download()
+        return _oneapi_download_future.result()
+    return download_intel_oneapi()
+
+
 def find_complete_intel_oneapi_installation() -> IntelOneAPIInstallation:
     """
     Find a complete Intel oneAPI installation that was installed using the official installation
@@ -419,7 +470,7 @@ def find_intel_oneapi(base_dir: Optional[str] = None) -> IntelOneAPIInstallation
     elif base_dir is not None:
         _oneapi_installation = IntelOneAPIInstallation(base_dir=base_dir)
     else:
-        _oneapi_installation = download_intel_oneapi()
+        _oneapi_installation = wait_for_intel_oneapi_download()
     log(f"Using Intel oneAPI installation at {_oneapi_installation.base_dir}")
     return _oneapi_installation
 
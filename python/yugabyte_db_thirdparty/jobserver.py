@@ -0,0 +1,151 @@
+# Copyright (c) YugabyteDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+#
+
+"""
+A GNU make compatible jobserver shared by all build tool invocations of the builder, so that the
+total number of concurrently running compiler processes stays within the configured budget even
+when multiple dependencies or build types are being built at the same time.
+
+The jobserver is a named pipe (FIFO) pre-filled with tokens. GNU make 4.4 or later and Ninja 1.13
+or later are jobserver clients and take tokens from it when it is specified in MAKEFLAGS. When an
+older build tool is used, it is given the usual -j option, and the compiler wrapper takes a token
+from the jobserver for each compiler invocation instead.
+
+See https://www.gnu.org/software/make/manual/html_node/POSIX-Jobserver.html
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from yugabyte_db_thirdparty import env_var_names
+
+TOKEN = b'+'
+
+_tool_versions: Dict[str, Optional[Tuple[int, ...]]] = {}
+
+# The minimum versions of build tools that can act as clients of a FIFO-based jobserver.
+MIN_JOBSERVER_CLIENT_VERSIONS: Dict[str, Tuple[int, ...]] = {
+    'make': (4, 4),
+    'ninja': (1, 13),
+}
+
+
+def parse_tool_version(version_output: str) -> Optional[Tuple[int, ...]]:
+    """
+    >>> parse_tool_version('GNU Make 4.4.1\\nBuilt for x86_64-pc-linux-gnu')
+    (4, 4, 1)
+    >>> parse_tool_version('1.13.0')
+    (1, 13, 0)
+    >>> parse_tool_version('1.10.2.git.kitware.jobserver-1')
+    (1, 10, 2)
+    >>> parse_tool_version('unknown') is None
+    True
+    """
+    match = re.search(r'\b(\d+)[.](\d+)(?:[.](\d+))?', version_output)
+    if match is None:
+        return None
+    return tuple(int(component) for component in match.groups() if component is not None)
+
+
+def get_tool_version(tool: str) -> Optional[Tuple[int, ...]]:
+    if tool not in _tool_versions:
+        try:
+            version_output = subprocess.check_output(
+                [tool, '--version'], stderr=subprocess.STDOUT).decode('utf-8')
+            _tool_versions[tool] = parse_tool_version(version_output)
+        except (OSError, subprocess.CalledProcessError):
+            _tool_versions[tool] = None
+    return _tool_versions[tool]
+
+
+def is_jobserver_client(tool: str) -> bool:
+    min_version = MIN_JOBSERVER_CLIENT_VERSIONS.get(tool)
+    if min_version is None:
+        return False
+    version = get_tool_version(tool)
+    return version is not None and version >= min_version
+
+
+class JobServer:
+    num_jobs: int
+    fifo_dir: str
+    fifo_path: str
+
+    # We keep the FIFO open for reading and writing for the lifetime of the jobserver. Otherwise
+    # the tokens in it would be discarded once no process has it open.
+    fd: int
+
+    def __init__(self, num_jobs: int, parent_dir: str) -> None:
+        self.num_jobs = max(1, num_jobs)
+        os.makedirs(parent_dir, exist_ok=True)
+        self.fifo_dir = tempfile.mkdtemp(prefix='jobserver-', dir=parent_dir)
+        self.fifo_path = os.path.join(self.fifo_dir, 'fifo')
+        os.mkfifo(self.fifo_path, 0o600)
+        self.fd = os.open(self.fifo_path, os.O_RDWR)
+        # Unlike GNU make, we put num_jobs tokens into the pipe rather than num_jobs - 1, because
+        # compiler wrapper invocations do not have an implicit token. As a result, each running
+        # make or ninja client may run one job in excess of the budget using its implicit token.
+        os.write(self.fd, TOKEN * self.num_jobs)
+
+    def get_makeflags(self) -> str:
+        return '-j%d --jobserver-auth=fifo:%s' % (self.num_jobs, self.fifo_path)
+
+    def get_build_tool_args_and_env(
+            self, build_tool: str) -> Tuple[List[str], Dict[str, Optional[str]]]:
+        """
+        Returns the parallelism arguments and environment variables to invoke the given build tool
+        (make or ninja) with.
+        """
+        if is_jobserver_client(build_tool):
+            return [], {
+                'MAKEFLAGS': self.get_makeflags(),
+                # The build tool itself takes tokens for compiler invocations.
+                env_var_names.JOBSERVER_FIFO: None,
+            }
+        return ['-j%d' % self.num_jobs], {}
+
+    def close(self) -> None:
+        os.close(self.fd)
+        shutil.rmtree(self.fifo_dir, ignore_errors=True)
+
+
+class JobToken:
+    """
+    Holds a token from the jobserver specified by the given FIFO path for the duration of a with
+    block. Does nothing if the path is None.
+    """
+
+    fifo_path: Optional[str]
+    fd: Optional[int]
+
+    def __init__(self, fifo_path: Optional[str]) -> None:
+        self.fifo_path = fifo_path
+        self.fd = None
+
+    def __enter__(self) -> 'JobToken':
+        if self.fifo_path:
+            self.fd = os.open(self.fifo_path, os.O_RDWR)
+            # Blocks until a token is available.
+            os.read(self.fd, 1)
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, traceback: Any) -> None:
+        if self.fd is not None:
+            os.write(self.fd, TOKEN)
+            os.close(self.fd)
+            self.fd = None
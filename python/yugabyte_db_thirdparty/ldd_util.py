@@ -15,6 +15,7 @@ import re
 
 from typing import List, Optional, Set
 
+from yugabyte_db_thirdparty import elf_util
 from yugabyte_db_thirdparty.util import capture_all_output
 
 
@@ -24,6 +25,10 @@ RESOLVED_DEPENDENCY_RE = re.compile(r'^(\S+) => (\S+) [(]0x[0-9a-f]+[)]$')
 
 SHARED_LIB_SUFFIX_RE = re.compile(r'^(.*)[.]so([.\d]+)?$')
 
+LOAD_ADDRESS_RE = re.compile(r' [(]0x[0-9a-f]+[)]$')
+
+MISSING_VERSION_RE = re.compile(r": version `[^']+' not found [(]required by ")
+
 
 class LddResult:
     file_path: str
@@ -86,6 +91,37 @@ def run_ldd(file_path: str) -> LddResult:
             allowed_exit_codes={1}))
 
 
+def get_ldd_result(
+        file_path: str,
+        resolver: Optional[elf_util.DependencyResolver] = None) -> LddResult:
+    """
+    Like run_ldd, but resolves the dependencies in-process, see elf_util.
+    """
+    return LddResult(
+        file_path=file_path,
+        output_lines=elf_util.get_ldd_output_lines(file_path, resolver))
+
+
+def normalize_ldd_output(output_lines: List[str]) -> List[str]:
+    """
+    Normalizes ldd output for comparing the output of run_ldd and get_ldd_result: keeps only the
+    lines describing dependencies, which are indented, and errors about missing symbol versions,
+    removes load addresses and the vDSO, and sorts the lines.
+
+    >>> normalize_ldd_output([
+    ...     '\\tlinux-vdso.so.1 (0x00007ffd)',
+    ...     '\\tlibc.so.6 => /lib64/libc.so.6 (0x00007f01)',
+    ...     "a: /lib64/libc.so.6: version `V2' not found (required by a)",
+    ...     'ldd: warning: you do not have execution permission for a.so'])
+    ["a: /lib64/libc.so.6: version `V2' not found (required by a)", 'libc.so.6 => /lib64/libc.so.6']
+    """
+    return sorted(
+        LOAD_ADDRESS_RE.sub('', line.strip())
+        for line in output_lines
+        if ((line.startswith('\t') and not line.strip().startswith('linux-vdso')) or
+            MISSING_VERSION_RE.search(line)))
+
+
 def remove_shared_lib_suffix(shared_lib_path: str) -> str:
     """
     >>> remove_shared_lib_suffix('/opt/intel/oneapi/mkl/2024.1/lib/libmkl_intel_ilp64.so')
@@ -0,0 +1,116 @@
+# Copyright (c) YugabyteDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+#
+
+"""
+A cache of library checking results, so that only installed files that changed since they last
+passed the check, or whose resolved dependencies changed, are checked again.
+"""
+
+import json
+import os
+
+from typing import Any, Dict, List, Optional
+
+from yugabyte_db_thirdparty.checksum_index import get_stat_key
+from yugabyte_db_thirdparty.custom_logging import log
+from yugabyte_db_thirdparty.file_util import mkdir_p
+from yugabyte_db_thirdparty.util import get_temporal_randomized_file_name_suffix
+
+LIB_CHECK_CACHE_FILE_NAME = 'lib_check_cache.json'
+
+# Increment this when the way files are checked changes in a way not reflected in the allow-lists.
+LIB_CHECK_CACHE_VERSION = 1
+
+
+def get_optional_stat_key(file_path: str) -> Optional[List[int]]:
+    return get_stat_key(file_path) if os.path.exists(file_path) else None
+
+
+class LibCheckCache:
+    """
+    The cache is stored in a JSON file, mapping absolute file paths to their stat key (see
+    get_stat_key), the problems found in them, and the stat keys of their resolved dependencies.
+    The whole cache is discarded if the configuration key, computed from the allow-lists and other
+    settings of the library checker, changes. Entries of files with problems are never reused, so
+    that fixes are picked up. A new library shadowing a previously resolved dependency in the search
+    path is not detected.
+    """
+
+    cache_file_path: str
+    config_key: str
+    entries: Dict[str, Dict[str, Any]]
+
+    def __init__(self, cache_file_path: str, config_key: str) -> None:
+        self.cache_file_path = cache_file_path
+        self.config_key = config_key
+        self.entries = self.load()
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.cache_file_path):
+            return {}
+        try:
+            with open(self.cache_file_path) as input_file:
+                data = json.load(input_file)
+        except (OSError, ValueError) as ex:
+            log("Ignoring invalid library check cache file %s: %s", self.cache_file_path, ex)
+            return {}
+        if (not isinstance(data, dict) or
+                data.get('version') != LIB_CHECK_CACHE_VERSION or
+                data.get('config_key') != self.config_key or
+                not isinstance(data.get('entries'), dict)):
+            log("Library check settings changed, not using %s", self.cache_file_path)
+            return {}
+        return data['entries']
+
+    def save(self, entries: Dict[str, Dict[str, Any]]) -> None:
+        mkdir_p(os.path.dirname(self.cache_file_path))
+        tmp_file_path = '%s.tmp.%s' % (
+            self.cache_file_path, get_temporal_randomized_file_name_suffix())
+        with open(tmp_file_path, 'w') as output_file:
+            json.dump({
+                'version': LIB_CHECK_CACHE_VERSION,
+                'config_key': self.config_key,
+                'entries': entries,
+            }, output_file, indent=2, sort_keys=True)
+            output_file.write('\n')
+        os.rename(tmp_file_path, self.cache_file_path)
+        self.entries = entries
+
+    @staticmethod
+    def make_entry(
+            file_path: str,
+            problems: List[str],
+            dependency_paths: List[str]) -> Dict[str, Any]:
+        return {
+            'stat': get_stat_key(file_path),
+            'problems': problems,
+            'dependencies': {
+                dependency_path: get_optional_stat_key(dependency_path)
+                for dependency_path in sorted(dependency_paths)
+            },
+        }
+
+    def get_valid_entry(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached result for the given file if the file passed the check and neither the
+        file nor its resolved dependencies changed since then.
+        """
+        entry = self.entries.get(file_path)
+        if (entry is None or
+                entry.get('problems') or
+                entry.get('stat') != get_stat_key(file_path)):
+            return None
+        for dependency_path, stat_key in entry.get('dependencies', {}).items():
+            if get_optional_stat_key(dependency_path) != stat_key:
+                return None
+        return entry
@@ -16,6 +16,8 @@ Checking that the executables and shared libraries we have built don't depend on
 shared libraries installed on this system.
 """
 
+import concurrent.futures
+import functools
 import os
 import sys
 import re
@@ -25,16 +27,19 @@ import logging
 
 from sys_detection import is_macos, is_linux
 
-from typing import List, Any, Set, Optional, Pattern, Type
+from typing import Callable, Dict, List, Any, Set, Optional, Pattern
 
+from yugabyte_db_thirdparty.artifact_cache import compute_cache_key
 from yugabyte_db_thirdparty.custom_logging import log, fatal, heading
 from yugabyte_db_thirdparty.util import YB_THIRDPARTY_DIR, capture_all_output, shlex_join
 from yugabyte_db_thirdparty.macos import get_min_supported_macos_version
 from yugabyte_db_thirdparty.file_system_layout import FileSystemLayout
 from yugabyte_db_thirdparty.compiler_choice import CompilerChoice
-from yugabyte_db_thirdparty.ldd_util import run_ldd
+from yugabyte_db_thirdparty.ldd_util import get_ldd_result, normalize_ldd_output, run_ldd
+from yugabyte_db_thirdparty.lib_check_cache import LibCheckCache, LIB_CHECK_CACHE_FILE_NAME
+from yugabyte_db_thirdparty.process_util import get_fork_context
 
-from yugabyte_db_thirdparty import patchelf_util
+from yugabyte_db_thirdparty import elf_util, patchelf_util, rpath_util
 
 from build_definitions import BuildType
 
@@ -63,6 +68,10 @@ IGNORED_DIR_SUFFIXES = (
     '/include/c++/v1/ext',
 )
 
+# Files to examine are much reduced if we look only at bin and lib directories. A special case is
+# the DiskANN dependency, which has its own subdirectory.
+CHECKED_DIR_RE = re.compile('^(lib|libcxx|[s]bin|diskann)$')
+
 ALLOWED_SYSTEM_LIBRARIES = (
     # These libraries are part of glibc.
     'libc',
@@ -91,6 +100,20 @@ SYSTEM_LIBRARY_RE = re.compile(
     r'^.* => /lib(?:64|/(?:x86_64|aarch64)-linux-gnu)/([^ /]+) .*$')
 
 
+# The library tester in a worker process of the pool used by LibTestBase.map_files.
+_worker_lib_tester: Optional['LibTestBase'] = None
+
+
+def _init_worker(lib_tester: 'LibTestBase') -> None:
+    global _worker_lib_tester
+    _worker_lib_tester = lib_tester
+
+
+def _call_worker_lib_tester(method_name: str, file_path: str) -> Any:
+    assert _worker_lib_tester is not None
+    return getattr(_worker_lib_tester, method_name)(file_path)
+
+
 def compile_re_list(re_list: List[str]) -> Any:
     return re.compile("|".join(re_list))
 
@@ -98,6 +121,14 @@ def compile_re_list(re_list: List[str]) -> Any:
 def get_needed_libs(file_path: str) -> List[str]:
     if file_path.endswith(IGNORED_EXTENSIONS) or os.path.basename(file_path) in IGNORED_FILE_NAMES:
         return []
+    elf_file = elf_util.read_elf_file(file_path)
+    return elf_file.needed if elf_file is not None else []
+
+
+def get_needed_libs_using_patchelf(file_path: str) -> List[str]:
+    """
+    Like get_needed_libs, but runs patchelf. Used for cross-validating get_needed_libs.
+    """
     return capture_all_output(
         [patchelf_util.get_patchelf_path(), '--print-needed', file_path],
         allowed_exit_codes={1},
@@ -114,6 +145,19 @@ def is_text_based_so_file(so_path: str) -> bool:
         return first_bytes.startswith(b'INPUT')
 
 
+def is_in_checked_dir(rel_path: str) -> bool:
+    """
+    Determines if the given path, relative to the installation directory of a build type, is in one
+    of the directories whose files are checked.
+
+    >>> [is_in_checked_dir(rel_path) for rel_path in [
+    ...     'lib/libz.so', 'sbin/tool', 'bin/tool', 'include/zlib.h', 'lib']]
+    [True, True, False, False, False]
+    """
+    path_parts = rel_path.split(os.sep)
+    return len(path_parts) > 1 and bool(CHECKED_DIR_RE.match(path_parts[0]))
+
+
 class LibTestBase:
     """
     Verify correct library paths are used in installed dynamically-linked executables and
@@ -129,12 +173,10 @@ class LibTestBase:
     # additional pattern).
     allowed_patterns: Pattern
 
-    # To make sure that we log each allowed pattern no more than once.
-    logged_allowed_patterns: Set[str]
-
     extra_allowed_shared_lib_paths: Set[str]
 
-    # We collect all files to check in this list.
+    # We collect all files to check in this list, except for files with valid results in the
+    # library check cache.
     files_to_check: List[str]
 
     allowed_system_libraries: Set[str]
@@ -142,14 +184,17 @@ class LibTestBase:
 
     fs_layout: FileSystemLayout
 
-    def __init__(self, fs_layout: FileSystemLayout) -> None:
+    # The number of worker processes checking files in parallel.
+    parallelism: int
+
+    def __init__(self, fs_layout: FileSystemLayout, parallelism: int = 1) -> None:
         self.lib_re_list = []
-        self.logged_allowed_patterns = set()
         self.extra_allowed_shared_lib_paths = set()
         self.allowed_system_libraries = set(ALLOWED_SYSTEM_LIBRARIES)
         self.needed_libs_to_remove = set(NEEDED_LIBS_TO_REMOVE)
         self.fs_layout = fs_layout
         self.tp_installed_dir = fs_layout.tp_installed_dir
+        self.parallelism = parallelism
 
     def configure_for_compiler(self, compiler_choice: CompilerChoice) -> None:
         if compiler_choice.using_gcc():
@@ -176,37 +221,78 @@ class LibTestBase:
 
     def check_lib_deps(
             self,
-            file_path: str,
             cmd_output: List[str],
-            additional_allowed_pattern: Optional[Pattern] = None) -> bool:
-
-        status = True
-        for line in cmd_output:
+            additional_allowed_pattern: Optional[Pattern] = None) -> List[str]:
+        """
+        Returns the descriptions of the lines of the given command output that do not match the
+        allowed patterns.
+        """
+        return [
+            "Bad path: %s" % line
+            for line in cmd_output
             if (not self.allowed_patterns.match(line) and
-                    not (additional_allowed_pattern is not None and
-                         additional_allowed_pattern.match(line))):
-                # Log the allowed patterns for easier debugging.
-                for allowed_pattern in [self.allowed_patterns] + (
-                    [additional_allowed_pattern] if additional_allowed_pattern else []
-                ):
-                    if allowed_pattern.pattern not in self.logged_allowed_patterns:
-                        log("Allowed pattern: %s", allowed_pattern.pattern)
-                        self.logged_allowed_patterns.add(allowed_pattern.pattern)
-
-                if status:
-                    log(file_path + ":")
-                    status = False
-                log("Bad path: %s", line)
-
-        return status
-
-    def check_libs_for_file(self, file_path: str) -> bool:
+                not (additional_allowed_pattern is not None and
+                     additional_allowed_pattern.match(line)))
+        ]
+
+    def get_problems_for_file(self, file_path: str) -> List[str]:
         """
-        Checks if the given file's shared libraries resolve in a correct way. Overridden in
-        OS-specific classes.
+        Checks if the given file's shared libraries resolve in a correct way. Returns the
+        descriptions of the problems found, if any. Overridden in OS-specific classes.
         """
         raise NotImplementedError()
 
+    def get_dependency_paths(self, file_path: str) -> List[str]:
+        """
+        Returns the paths of the shared libraries that the given file's dependencies resolve to.
+        The file has to be checked again if any of them changes.
+        """
+        return []
+
+    def check_file(self, file_path: str) -> Dict[str, Any]:
+        """
+        Checks the given file and returns a library check cache entry for it.
+        """
+        return LibCheckCache.make_entry(
+            file_path,
+            self.get_problems_for_file(file_path),
+            self.get_dependency_paths(file_path))
+
+    def get_config_key_inputs(self) -> List[str]:
+        """
+        Returns everything other than the files themselves that affects the check results.
+        """
+        return [
+            'tool=%s' % self.tool,
+            'lib_re_list=%s' % self.lib_re_list,
+            'allowed_system_libraries=%s' % sorted(self.allowed_system_libraries),
+            'needed_libs_to_remove=%s' % sorted(self.needed_libs_to_remove),
+        ]
+
+    def should_use_cache(self) -> bool:
+        return True
+
+    def map_files(self, method_name: str, file_paths: List[str]) -> List[Any]:
+        """
+        Calls the given method of this object for each of the given files, using a pool of
+        parallelism worker processes, and returns the results in the same order as the files. The
+        worker processes are forked, so they get a copy of this object.
+        """
+        if self.parallelism == 1 or len(file_paths) <= 1:
+            return [getattr(self, method_name)(file_path) for file_path in file_paths]
+        # Avoid duplicating buffered output in the worker processes.
+        sys.stdout.flush()
+        sys.stderr.flush()
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.parallelism,
+                mp_context=get_fork_context(),
+                initializer=_init_worker,
+                initargs=(self,)) as executor:
+            return list(executor.map(
+                functools.partial(_call_worker_lib_tester, method_name),
+                file_paths,
+                chunksize=max(1, min(16, len(file_paths) // (self.parallelism * 4)))))
+
     def should_check_file(self, file_path: str) -> bool:
         if (os.path.islink(file_path) or
                 is_text_based_so_file(file_path) or
@@ -217,28 +303,18 @@ class LibTestBase:
         file_dir = os.path.dirname(file_path)
         return not any(file_dir.endswith(suffix) for suffix in IGNORED_DIR_SUFFIXES)
 
-    def run(self) -> None:
-        self.init_regex()
-        heading("Scanning installed executables and libraries...")
-        for allowed_shared_lib_path in sorted(self.extra_allowed_shared_lib_paths):
-            log("Extra allowed shared lib path: %s", allowed_shared_lib_path)
-        test_pass = True
-        # Files to examine are much reduced if we look only at bin and lib directories.
-        # A special case is the DiskANN dependency, which has its own subdirectory.
-        dir_pattern = re.compile('^(lib|libcxx|[s]bin|diskann)$')
-        installed_dirs_per_build_type = [
-                os.path.join(self.tp_installed_dir, build_type.dir_name)
-                for build_type in BuildType]
-
-        self.files_to_check = []
-        for installed_dir_for_one_build_type in installed_dirs_per_build_type:
+    def find_files_to_check(self) -> List[str]:
+        files_to_check: List[str] = []
+        for build_type in BuildType:
+            installed_dir_for_one_build_type = os.path.join(
+                self.tp_installed_dir, build_type.dir_name)
             if not os.path.isdir(installed_dir_for_one_build_type):
                 logging.info("Directory %s does not exist, skipping",
                              installed_dir_for_one_build_type)
                 continue
             with os.scandir(installed_dir_for_one_build_type) as candidate_dirs:
                 for candidate in candidate_dirs:
-                    if dir_pattern.match(candidate.name):
+                    if CHECKED_DIR_RE.match(candidate.name):
                         examine_path = os.path.join(
                                 installed_dir_for_one_build_type, candidate.name)
                         for dirpath, dir_names, files in os.walk(examine_path):
@@ -246,12 +322,74 @@ class LibTestBase:
                                 full_path = os.path.join(dirpath, file_name)
                                 if not self.should_check_file(full_path):
                                     continue
-                                self.files_to_check.append(full_path)
+                                files_to_check.append(full_path)
+        return sorted(files_to_check)
 
-        self.before_checking_all_files()
-        test_pass = self.check_all_files()
+    def select_installed_files_to_check(self, installed_rel_paths: List[str]) -> List[str]:
+        """
+        Selects the files to check out of the given installed files, e.g. from an installed file
+        manifest of a dependency. Paths are relative to the top-level installation directory, and
+        the returned paths are absolute.
+        """
+        files_to_check: List[str] = []
+        for rel_path in installed_rel_paths:
+            path_parts = rel_path.split(os.sep, 1)
+            if len(path_parts) < 2 or not is_in_checked_dir(path_parts[1]):
+                continue
+            full_path = os.path.join(self.tp_installed_dir, rel_path)
+            if os.path.isfile(full_path) and self.should_check_file(full_path):
+                files_to_check.append(full_path)
+        return sorted(files_to_check)
+
+    def run(self) -> None:
+        heading("Scanning installed executables and libraries...")
+        self.check_files(self.find_files_to_check())
+
+    def check_files(self, all_files: List[str], use_cache: bool = True) -> None:
+        """
+        Checks the given files and fails if problems are found in any of them. The library check
+        cache is only used when checking the whole installation directory, because the allowed
+        shared library paths are only complete at that point.
+        """
+        self.init_regex()
+        for allowed_shared_lib_path in sorted(self.extra_allowed_shared_lib_paths):
+            log("Extra allowed shared lib path: %s", allowed_shared_lib_path)
 
-        if not test_pass:
+        lib_check_cache: Optional[LibCheckCache] = None
+        cached_entries: Dict[str, Dict[str, Any]] = {}
+        if use_cache and self.should_use_cache():
+            lib_check_cache = LibCheckCache(
+                os.path.join(self.fs_layout.tp_build_dir, LIB_CHECK_CACHE_FILE_NAME),
+                compute_cache_key(self.get_config_key_inputs()))
+            for file_path in all_files:
+                entry = lib_check_cache.get_valid_entry(file_path)
+                if entry is not None:
+                    cached_entries[file_path] = entry
+        self.files_to_check = [
+            file_path for file_path in all_files if file_path not in cached_entries]
+
+        log("Checking %d files using %d processes, %d files unchanged since the last check",
+            len(self.files_to_check), self.parallelism, len(cached_entries))
+        self.before_checking_all_files()
+        new_entries = self.check_all_files()
+        if lib_check_cache is not None:
+            lib_check_cache.save(dict(cached_entries, **new_entries))
+        problems_by_file = {
+            file_path: entry['problems']
+            for file_path, entry in new_entries.items()
+            if entry['problems']
+        }
+
+        if problems_by_file:
+            log("Allowed patterns:\n%s", '\n'.join(
+                '    %s' % pattern for pattern in self.lib_re_list))
+            log("Found problems in %d of %d files:\n%s",
+                len(problems_by_file),
+                len(all_files),
+                '\n'.join(
+                    '%s:\n%s' % (file_path, '\n'.join(
+                        '    %s' % problem for problem in problems))
+                    for file_path, problems in sorted(problems_by_file.items())))
             fatal(f"Found problematic library dependencies, using tool: {self.tool}")
         else:
             log("No problems found with library dependencies.")
@@ -259,21 +397,20 @@ class LibTestBase:
     def before_checking_all_files(self) -> None:
         pass
 
-    def check_all_files(self) -> bool:
-        success = True
-        for file_path in self.files_to_check:
-            if not self.check_libs_for_file(file_path):
-                # We are not returning here because we want to log all errors.
-                success = False
-        return success
+    def check_all_files(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Checks all files in parallel and returns a map from file paths to library check cache
+        entries, see LibCheckCache.make_entry.
+        """
+        return dict(zip(self.files_to_check, self.map_files('check_file', self.files_to_check)))
 
     def add_allowed_shared_lib_paths(self, shared_lib_paths: Set[str]) -> None:
         self.extra_allowed_shared_lib_paths |= shared_lib_paths
 
 
 class LibTestMac(LibTestBase):
-    def __init__(self, fs_layout: FileSystemLayout) -> None:
-        super().__init__(fs_layout=fs_layout)
+    def __init__(self, fs_layout: FileSystemLayout, parallelism: int = 1) -> None:
+        super().__init__(fs_layout=fs_layout, parallelism=parallelism)
         self.tool = "otool -L"
         self.lib_re_list = [
             "^\t/System/Library/",
@@ -287,13 +424,19 @@ class LibTestMac(LibTestBase):
             "^\t/usr/lib/",
         ]
 
-    def check_libs_for_file(self, file_path: str) -> bool:
+    def get_config_key_inputs(self) -> List[str]:
+        return super().get_config_key_inputs() + [
+            'min_supported_macos_version=%s' % get_min_supported_macos_version()
+        ]
+
+    def get_problems_for_file(self, file_path: str) -> List[str]:
         otool_output = subprocess.check_output(['otool', '-L', file_path]).decode('utf-8')
         if 'is not an object file' in otool_output:
-            return True
+            return []
 
-        if not self.check_lib_deps(file_path, otool_output.splitlines()):
-            return False
+        problems = self.check_lib_deps(otool_output.splitlines())
+        if problems:
+            return problems
 
         min_supported_macos_version = get_min_supported_macos_version()
 
@@ -308,18 +451,30 @@ class LibTestMac(LibTestBase):
                 items = line.split()
                 min_macos_version = items[1]
                 if min_macos_version != min_supported_macos_version:
-                    log("File %s has wrong minimum supported macOS version: %s. Full line:\n%s\n"
-                        "(output from 'otool -l'). Expected: %s, section: %s",
-                        file_path, min_macos_version, line, min_supported_macos_version,
-                        section)
-                    return False
+                    return [
+                        "Wrong minimum supported macOS version: %s. Full line: %s (output from "
+                        "'otool -l'). Expected: %s, section: %s" % (
+                            min_macos_version, line, min_supported_macos_version, section)
+                    ]
 
-        return True
+        return []
 
 
 class LibTestLinux(LibTestBase):
-    def __init__(self, fs_layout: FileSystemLayout) -> None:
-        super().__init__(fs_layout=fs_layout)
+    resolver: elf_util.DependencyResolver
+
+    # Whether to also run ldd, patchelf and readelf for every file, and report any differences
+    # from the results of the in-process ELF reader as problems.
+    cross_validate_elf_reader: bool
+
+    def __init__(
+            self,
+            fs_layout: FileSystemLayout,
+            parallelism: int = 1,
+            cross_validate_elf_reader: bool = False) -> None:
+        super().__init__(fs_layout=fs_layout, parallelism=parallelism)
+        self.resolver = elf_util.DependencyResolver()
+        self.cross_validate_elf_reader = cross_validate_elf_reader
         self.tool = "ldd"
         self.lib_re_list = [
             "^\tlinux-vdso",
@@ -342,17 +497,29 @@ class LibTestLinux(LibTestBase):
             self.lib_re_list.append(f".* => {re.escape(shared_lib_path)}/")
 
     def before_checking_all_files(self) -> None:
-        for file_path in self.files_to_check:
-            self.fix_needed_libs_for_file(file_path)
-
-    def fix_needed_libs_for_file(self, file_path: str) -> None:
+        # Files are only read while the unused needed libraries are being found in parallel, and
+        # are then modified one at a time, so that ldd never sees a partially written library.
+        for file_path, libs_to_remove in zip(
+                self.files_to_check,
+                self.map_files('get_needed_libs_to_remove', self.files_to_check)):
+            if libs_to_remove:
+                self.remove_needed_libs(file_path, libs_to_remove)
+
+    def get_needed_libs_to_remove(self, file_path: str) -> List[str]:
+        """
+        Returns the names of libraries that the given file needs but does not use, and that we
+        remove from the needed libraries, see needed_libs_to_remove.
+        """
         needed_libs: List[str] = get_needed_libs(file_path)
+        libs_to_remove: List[str] = []
 
-        if needed_libs:
+        # Only run "ldd -u" if there is a needed library that we would remove if it is unused.
+        if any(needed_lib.startswith(lib_name + '.')
+               for needed_lib in needed_libs
+               for lib_name in self.needed_libs_to_remove):
             ldd_u_cmd = ['ldd', '-u', file_path]
             ldd_u_cmd_str = shlex_join(ldd_u_cmd)
             ldd_u_output_lines: List[str] = capture_all_output(ldd_u_cmd, allowed_exit_codes={1})
-            removed_libs: List[str] = []
             for ldd_u_output_line in ldd_u_output_lines:
                 ldd_u_output_line = ldd_u_output_line.strip()
                 if ldd_u_output_line.startswith('Inconsistency'):
@@ -374,19 +541,23 @@ class LibTestLinux(LibTestBase):
                         "(for file %s)" % (unused_lib_path, needed_libs, file_path))
                 if any([unused_lib_name.startswith(lib_name + '.')
                         for lib_name in self.needed_libs_to_remove]):
-                    subprocess.check_call([
-                        patchelf_util.get_patchelf_path(),
-                        '--remove-needed',
-                        unused_lib_name,
-                        file_path
-                    ])
-                    log("Removed unused needed lib %s from %s", unused_lib_name, file_path)
-                    removed_libs.append(unused_lib_name)
-            new_needed_libs = get_needed_libs(file_path)
-            for removed_lib in removed_libs:
-                if removed_lib in new_needed_libs:
-                    raise ValueError(f"Failed to remove needed library {removed_lib} from "
-                                     f"{file_path}. File's current needed libs: {new_needed_libs}")
+                    libs_to_remove.append(unused_lib_name)
+        return libs_to_remove
+
+    def remove_needed_libs(self, file_path: str, libs_to_remove: List[str]) -> None:
+        for lib_name in libs_to_remove:
+            subprocess.check_call([
+                patchelf_util.get_patchelf_path(),
+                '--remove-needed',
+                lib_name,
+                file_path
+            ])
+            log("Removed unused needed lib %s from %s", lib_name, file_path)
+        new_needed_libs = get_needed_libs(file_path)
+        for removed_lib in libs_to_remove:
+            if removed_lib in new_needed_libs:
+                raise ValueError(f"Failed to remove needed library {removed_lib} from "
+                                 f"{file_path}. File's current needed libs: {new_needed_libs}")
 
     def is_allowed_system_lib(
             self, lib_name: str, additional_allowed_libraries: List[str] = []) -> bool:
@@ -396,7 +567,7 @@ class LibTestLinux(LibTestBase):
                 list(self.allowed_system_libraries) + additional_allowed_libraries
             ))
 
-    def check_libs_for_file(self, file_path: str) -> bool:
+    def get_problems_for_file(self, file_path: str) -> List[str]:
         assert os.path.isabs(file_path), "Expected absolute path, got: %s" % file_path
         file_basename = os.path.basename(file_path)
         rel_path_to_installed_dir = os.path.relpath(
@@ -440,11 +611,12 @@ class LibTestLinux(LibTestBase):
             # reports "libc++.so.1 => not found".
             additional_allowed_pattern = LIBCXX_NOT_FOUND
 
-        ldd_result = run_ldd(file_path)
+        problems: List[str] = []
+        ldd_result = get_ldd_result(file_path, self.resolver)
+        if self.cross_validate_elf_reader:
+            problems.extend(self.cross_validate(file_path, ldd_result.output_lines))
         if ldd_result.not_a_dynamic_executable():
-            return True
-
-        success = True
+            return problems
 
         additional_allowed_libraries = []
         if is_sanitizer:
@@ -461,20 +633,59 @@ class LibTestLinux(LibTestBase):
                 if not self.is_allowed_system_lib(
                         system_lib_name,
                         additional_allowed_libraries=additional_allowed_libraries):
-                    log("Disallowed system library: %s. Allowed: %s. File: %s",
-                        system_lib_name, sorted(self.allowed_system_libraries), file_path)
-                    success = False
+                    problems.append("Disallowed system library: %s. Allowed: %s" % (
+                        system_lib_name, sorted(self.allowed_system_libraries)))
+
+        return problems + self.check_lib_deps(ldd_output_lines, additional_allowed_pattern)
 
-        return self.check_lib_deps(
-            file_path, ldd_output_lines, additional_allowed_pattern) and success
+    def get_dependency_paths(self, file_path: str) -> List[str]:
+        return sorted(get_ldd_result(file_path, self.resolver).resolved_dependencies)
 
+    def should_use_cache(self) -> bool:
+        return not self.cross_validate_elf_reader
 
-def get_lib_tester(fs_layout: FileSystemLayout) -> LibTestBase:
-    lib_tester_class: Type[LibTestBase]
+    def cross_validate(self, file_path: str, ldd_output_lines: List[str]) -> List[str]:
+        """
+        Compares the results of the in-process ELF reader for the given file with the output of
+        ldd, patchelf and readelf.
+        """
+        problems: List[str] = []
+        actual_ldd_output = normalize_ldd_output(run_ldd(file_path).output_lines)
+        if actual_ldd_output != normalize_ldd_output(ldd_output_lines):
+            problems.append("ELF reader resolved dependencies as %s, ldd output: %s" % (
+                normalize_ldd_output(ldd_output_lines), actual_ldd_output))
+        if self.resolver.read_elf_file(file_path) is None:
+            return problems
+
+        needed_libs = get_needed_libs(file_path)
+        actual_needed_libs = get_needed_libs_using_patchelf(file_path)
+        if needed_libs != actual_needed_libs:
+            problems.append("ELF reader found needed libraries %s, patchelf found %s" % (
+                needed_libs, actual_needed_libs))
+
+        def get_rpaths_or_error(get_rpaths_fn: Callable[[str], List[str]]) -> Any:
+            try:
+                return get_rpaths_fn(file_path)
+            except ValueError as ex:
+                return str(ex)
+
+        rpaths = get_rpaths_or_error(rpath_util.get_rpaths)
+        actual_rpaths = get_rpaths_or_error(rpath_util.get_rpaths_using_readelf)
+        if rpaths != actual_rpaths:
+            problems.append("ELF reader found rpaths %s, readelf found %s" % (
+                rpaths, actual_rpaths))
+        return problems
+
+
+def get_lib_tester(
+        fs_layout: FileSystemLayout,
+        parallelism: int = 1,
+        cross_validate_elf_reader: bool = False) -> LibTestBase:
     if is_macos():
-        lib_tester_class = LibTestMac
-    elif is_linux():
-        lib_tester_class = LibTestLinux
-    else:
-        fatal(f"Unsupported platform: {platform.system()}")
-    return lib_tester_class(fs_layout=fs_layout)
+        return LibTestMac(fs_layout=fs_layout, parallelism=parallelism)
+    if is_linux():
+        return LibTestLinux(
+            fs_layout=fs_layout,
+            parallelism=parallelism,
+            cross_validate_elf_reader=cross_validate_elf_reader)
+    fatal(f"Unsupported platform: {platform.system()}")
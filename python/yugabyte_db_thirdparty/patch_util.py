@@ -0,0 +1,581 @@
+# Copyright (c) YugabyteDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+#
+
+"""
+Applying patches in the unified diff format to source directories without running the patch tool.
+
+Hunks are located using the search of locate_hunk in GNU patch 2.7. The search starts at the line
+number from the hunk header, shifted by the offset at which the previous hunk of the same file
+applied. It then alternates between later and earlier positions at increasing distances, trying the
+later one first. A hunk cannot apply before the lines changed by the previous hunk. If there is no
+exact match, up to MAX_FUZZ context lines at the beginning and the end of the hunk are not compared,
+but the hunk still has to fit into the file with these lines. Unlike GNU patch, files are only
+modified if all hunks of the patch apply. Patches in other formats, e.g. normal diffs, are applied
+using the patch tool.
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+from typing import Dict, List, Optional, Tuple
+
+from yugabyte_db_thirdparty.archive_handling import extract_archive_into_dir, get_compression_type
+from yugabyte_db_thirdparty.custom_logging import log
+from yugabyte_db_thirdparty.file_util import mkdir_p
+from yugabyte_db_thirdparty.util import get_temporal_randomized_file_name_suffix
+
+DEV_NULL = '/dev/null'
+
+MAX_FUZZ = 2
+
+HUNK_HEADER_RE = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+# Patches and source files are decoded using an encoding that maps every byte to a character, so
+# that files are compared and written back byte for byte.
+ENCODING = 'latin-1'
+
+
+class PatchFormatError(Exception):
+    """
+    The patch is not in the unified diff format, or it is malformed.
+    """
+    pass
+
+
+class PatchApplicationError(Exception):
+    """
+    Some hunks of the patch do not apply to the files being patched.
+    """
+    pass
+
+
+class Hunk:
+    old_start: int
+    old_len: int
+    # Tuples of the line type (' ', '-' or '+') and the line including its line terminator, unless
+    # it is the last line of a file without a newline at the end.
+    lines: List[Tuple[str, str]]
+
+    def __init__(self, old_start: int, old_len: int, lines: List[Tuple[str, str]]) -> None:
+        self.old_start = old_start
+        self.old_len = old_len
+        self.lines = lines
+
+    def get_expected_position(self) -> int:
+        # For a hunk that only adds lines, the start line is the line after which to add them.
+        return self.old_start if self.old_len == 0 else self.old_start - 1
+
+    def get_old_lines(self) -> List[str]:
+        return [line for line_type, line in self.lines if line_type != '+']
+
+    def get_new_lines(self) -> List[str]:
+        return [line for line_type, line in self.lines if line_type != '-']
+
+    def get_context_sizes(self) -> Tuple[int, int]:
+        """
+        Returns the numbers of context lines at the beginning and at the end of the hunk.
+
+        >>> Hunk(1, 3, [(' ', 'a'), ('+', 'b'), (' ', 'c'), (' ', 'd')]).get_context_sizes()
+        (1, 2)
+        """
+        num_leading_context = 0
+        while (num_leading_context < len(self.lines) and
+               self.lines[num_leading_context][0] == ' '):
+            num_leading_context += 1
+        num_trailing_context = 0
+        while (num_trailing_context < len(self.lines) - num_leading_context and
+               self.lines[-1 - num_trailing_context][0] == ' '):
+            num_trailing_context += 1
+        return num_leading_context, num_trailing_context
+
+
+class FilePatch:
+    old_path: str
+    new_path: str
+    hunks: List[Hunk]
+
+    def __init__(self, old_path: str, new_path: str, hunks: List[Hunk]) -> None:
+        self.old_path = old_path
+        self.new_path = new_path
+        self.hunks = hunks
+
+    def get_paths(self, strip: int) -> List[str]:
+        return [strip_path(path, strip) for path in (self.new_path, self.old_path)
+                if path != DEV_NULL]
+
+
+def split_lines(text: str) -> List[str]:
+    """
+    Splits the given text into lines, keeping line terminators.
+
+    >>> split_lines('a\\nb')
+    ['a\\n', 'b']
+    >>> split_lines('a\\r\\n\\n')
+    ['a\\r\\n', '\\n']
+    >>> split_lines('')
+    []
+    """
+    lines = text.split('\n')
+    result = [line + '\n' for line in lines[:-1]]
+    if lines[-1]:
+        result.append(lines[-1])
+    return result
+
+
+def parse_header_path(header_line: str) -> str:
+    """
+    >>> parse_header_path('--- a/src/foo.c\\t2021-01-01 00:00:00.000000000 +0000\\n')
+    'a/src/foo.c'
+    >>> parse_header_path('+++ /dev/null\\n')
+    '/dev/null'
+    """
+    return header_line[4:].rstrip('\r\n').split('\t')[0].rstrip()
+
+
+def strip_path(path: str, strip: int) -> str:
+    """
+    Removes the given number of leading components from a path in a patch, like patch -p does.
+
+    >>> strip_path('a/src/foo.c', 1)
+    'src/foo.c'
+    >>> strip_path('src/foo.c', 0)
+    'src/foo.c'
+    """
+    components = [component for component in path.split('/') if component]
+    if strip >= len(components):
+        raise PatchFormatError("Cannot strip %d components from path %s" % (strip, path))
+    components = components[strip:]
+    if (path.startswith('/') and strip == 0) or '..' in components:
+        raise PatchFormatError("Path %s in patch points outside of the patched directory" % path)
+    return '/'.join(components)
+
+
+def parse_hunk_lines(
+        lines: List[str],
+        start_index: int,
+        old_len: int,
+        new_len: int) -> Tuple[List[Tuple[str, str]], int]:
+    """
+    Parses the lines of a hunk starting at the given index. Returns the lines and the index of the
+    first line after the hunk.
+    """
+    hunk_lines: List[Tuple[str, str]] = []
+    old_remaining = old_len
+    new_remaining = new_len
+    i = start_index
+    while old_remaining > 0 or new_remaining > 0 or (
+            i < len(lines) and lines[i].startswith('\\')):
+        if i >= len(lines):
+            raise PatchFormatError("Unexpected end of patch in hunk at line %d" % start_index)
+        line = lines[i]
+        i += 1
+        if line.startswith('\\'):
+            # "\ No newline at end of file" refers to the previous line.
+            if not hunk_lines:
+                raise PatchFormatError("Unexpected line %d: %s" % (i, line.rstrip()))
+            line_type, text = hunk_lines[-1]
+            hunk_lines[-1] = (line_type, text.rstrip('\n'))
+            continue
+        if line in ('\n', '\r\n'):
+            # Some tools strip the space from empty context lines.
+            line = ' ' + line
+        line_type = line[0]
+        if line_type == ' ':
+            old_remaining -= 1
+            new_remaining -= 1
+        elif line_type == '-':
+            old_remaining -= 1
+        elif line_type == '+':
+            new_remaining -= 1
+        else:
+            raise PatchFormatError("Unexpected line %d in hunk: %s" % (i, line.rstrip()))
+        if old_remaining < 0 or new_remaining < 0:
+            raise PatchFormatError("Hunk ending at line %d is longer than its header says" % i)
+        hunk_lines.append((line_type, line[1:]))
+    return hunk_lines, i
+
+
+def parse_unified_diff(patch_text: str) -> List[FilePatch]:
+    """
+    Parses a patch in the unified diff format. Lines outside of file patches, such as git headers,
+    are ignored.
+
+    >>> file_patches = parse_unified_diff(
+    ...     'diff --git a/f.txt b/f.txt\\n--- a/f.txt\\n+++ b/f.txt\\n'
+    ...     '@@ -1,2 +1,2 @@\\n a\\n-b\\n+c\\n\\\\ No newline at end of file\\n')
+    >>> [(p.old_path, p.new_path, len(p.hunks)) for p in file_patches]
+    [('a/f.txt', 'b/f.txt', 1)]
+    >>> file_patches[0].hunks[0].lines
+    [(' ', 'a\\n'), ('-', 'b\\n'), ('+', 'c')]
+    >>> try:
+    ...     parse_unified_diff('--- a/f.txt\\n+++ b/f.txt\\n1c1\\n< a\\n---\\n> b\\n')
+    ... except PatchFormatError as ex:
+    ...     print(ex)
+    No unified diff hunks for b/f.txt
+    """
+    lines = split_lines(patch_text)
+    file_patches: List[FilePatch] = []
+    i = 0
+    while i < len(lines):
+        if not (lines[i].startswith('--- ') and
+                i + 1 < len(lines) and
+                lines[i + 1].startswith('+++ ')):
+            i += 1
+            continue
+        old_path = parse_header_path(lines[i])
+        new_path = parse_header_path(lines[i + 1])
+        i += 2
+        hunks: List[Hunk] = []
+        while i < len(lines) and lines[i].startswith('@@'):
+            match = HUNK_HEADER_RE.match(lines[i])
+            if not match:
+                raise PatchFormatError("Invalid hunk header at line %d: %s" % (
+                    i + 1, lines[i].rstrip()))
+            old_start = int(match.group(1))
+            old_len = int(match.group(2)) if match.group(2) is not None else 1
+            new_len = int(match.group(4)) if match.group(4) is not None else 1
+            hunk_lines, i = parse_hunk_lines(lines, i + 1, old_len, new_len)
+            hunks.append(Hunk(old_start=old_start, old_len=old_len, lines=hunk_lines))
+        if not hunks:
+            raise PatchFormatError("No unified diff hunks for %s" % new_path)
+        file_patches.append(FilePatch(old_path=old_path, new_path=new_path, hunks=hunks))
+    if not file_patches:
+        raise PatchFormatError("No unified diff found")
+    return file_patches
+
+
+def find_lines(file_lines: List[str], lines_to_find: List[str], expected_pos: int) -> Optional[int]:
+    """
+    Finds the position of the given lines in the file closest to the expected position, preferring
+    the later position if two are equally close.
+
+    >>> find_lines(['a', 'b', 'a', 'b', 'a', 'b'], ['a', 'b'], 1)
+    2
+    >>> find_lines(['a', 'b'], ['b', 'a'], 0) is None
+    True
+    """
+    max_pos = len(file_lines) - len(lines_to_find)
+    for distance in range(max(expected_pos, max_pos - expected_pos) + 1):
+        for pos in (expected_pos + distance, expected_pos - distance):
+            if (0 <= pos <= max_pos and
+                    file_lines[pos:pos + len(lines_to_find)] == lines_to_find):
+                return pos
+    return None
+
+
+def lines_match(
+        file_lines: List[str],
+        pattern: List[str],
+        pos: int,
+        prefix_fuzz: int,
+        suffix_fuzz: int) -> bool:
+    """
+    Checks if the given pattern matches the file at the given position, ignoring the given numbers
+    of lines at the beginning and at the end of the pattern.
+    """
+    start = pos + prefix_fuzz
+    end = pos + len(pattern) - suffix_fuzz
+    return (0 <= start and end <= len(file_lines) and
+            file_lines[start:end] == pattern[prefix_fuzz:len(pattern) - suffix_fuzz])
+
+
+def locate_hunk(
+        file_lines: List[str],
+        hunk: Hunk,
+        first_guess: int,
+        num_frozen_lines: int,
+        fuzz: int) -> Optional[int]:
+    """
+    Finds the position at which the old lines of the hunk start in the file, like locate_hunk in
+    GNU patch. The search starts at first_guess and alternates between later and earlier positions
+    at increasing distances, trying the later one first. The hunk must not start before the first
+    num_frozen_lines lines of the file, which have already been written out, except for its leading
+    context lines. With fuzz, up to that many context lines at each end of the hunk are not
+    compared, but still have to be within the file. A hunk with less context at its beginning than
+    at its end can only apply at the start of the file unless the fuzz covers the difference, and
+    similarly for the end of the file.
+
+    >>> hunk = Hunk(2, 3, [(' ', 'a'), ('-', 'b'), ('+', 'B'), (' ', 'a')])
+    >>> locate_hunk(['a', 'b', 'a', 'b', 'a'], hunk, 1, 0, 0)
+    2
+    >>> locate_hunk(['a', 'b', 'a', 'b', 'a', 'x'], hunk, 3, 4, 0) is None
+    True
+    >>> locate_hunk(['x', 'b', 'y'], hunk, 0, 0, 1)
+    0
+    >>> locate_hunk(['b', 'y'], hunk, 0, 0, 1) is None
+    True
+    """
+    pattern = hunk.get_old_lines()
+    prefix_context, suffix_context = hunk.get_context_sizes()
+    context = max(prefix_context, suffix_context)
+    prefix_fuzz = fuzz + prefix_context - context
+    suffix_fuzz = fuzz + suffix_context - context
+    max_pos = len(file_lines) - (len(pattern) - suffix_fuzz)
+    min_pos = num_frozen_lines
+    max_pos_offset = max_pos - first_guess
+    # Do not try positions before the start of the file.
+    max_neg_offset = min(first_guess - min_pos, first_guess)
+
+    if not pattern:
+        return first_guess
+
+    if prefix_fuzz < 0 and hunk.get_expected_position() <= 0:
+        # Can only match at the start of the file.
+        if (num_frozen_lines <= prefix_context and
+                -first_guess <= max_pos_offset and
+                lines_match(file_lines, pattern, 0, 0, suffix_fuzz)):
+            return 0
+        return None
+    prefix_fuzz = max(prefix_fuzz, 0)
+
+    if suffix_fuzz < 0:
+        # Can only match at the end of the file.
+        offset = first_guess - (len(file_lines) - len(pattern))
+        if (offset <= max_neg_offset and
+                lines_match(file_lines, pattern, first_guess - offset, prefix_fuzz, 0)):
+            return first_guess - offset
+        return None
+
+    for offset in range(max(max_pos_offset, max_neg_offset) + 1):
+        if (offset <= max_pos_offset and
+                lines_match(file_lines, pattern, first_guess + offset, prefix_fuzz, suffix_fuzz)):
+            return first_guess + offset
+        if (0 < offset <= max_neg_offset and
+                lines_match(file_lines, pattern, first_guess - offset, prefix_fuzz, suffix_fuzz)):
+            return first_guess - offset
+    return None
+
+
+def apply_hunks(file_lines: List[str], hunks: List[Hunk], rel_path: str) -> List[str]:
+    """
+    Applies the given hunks to the lines of a file and returns the resulting lines. Raises
+    PatchApplicationError describing all hunks that do not apply.
+
+    Like in GNU patch, context lines are taken from the file rather than from the hunk, so context
+    lines ignored because of fuzz stay as they are. The lines of the file up to the last removed
+    line, or up to the last line before which lines were added, are frozen, and the following hunks
+    cannot change them.
+    """
+    result: List[str] = []
+    errors: List[str] = []
+    # The number of lines at the start of file_lines that have been written to the result or
+    # removed.
+    num_frozen_lines = 0
+    offset = 0
+
+    def copy_till(pos: int) -> None:
+        nonlocal num_frozen_lines
+        if pos > num_frozen_lines:
+            result.extend(file_lines[num_frozen_lines:pos])
+            num_frozen_lines = pos
+
+    for hunk_index, hunk in enumerate(hunks, start=1):
+        expected_pos = hunk.get_expected_position()
+        max_fuzz = min(MAX_FUZZ, max(hunk.get_context_sizes()))
+        found_pos: Optional[int] = None
+        for fuzz in range(max_fuzz + 1):
+            found_pos = locate_hunk(
+                file_lines, hunk, expected_pos + offset, num_frozen_lines, fuzz)
+            if found_pos is not None:
+                break
+        if found_pos is None or found_pos < num_frozen_lines:
+            error = "Hunk #%d FAILED at %d" % (hunk_index, hunk.old_start)
+            new_lines = hunk.get_new_lines()
+            if new_lines and find_lines(
+                    file_lines, new_lines, expected_pos + offset) is not None:
+                error += " (the hunk seems to be applied already)"
+            errors.append(error)
+            continue
+        if found_pos != expected_pos or fuzz > 0:
+            log("%s: hunk #%d succeeded at %d%s (offset %d lines)",
+                rel_path, hunk_index, found_pos + 1,
+                ' with fuzz %d' % fuzz if fuzz > 0 else '', found_pos - expected_pos)
+        offset = found_pos - expected_pos
+        old_index = 0
+        for line_type, line in hunk.lines:
+            if line_type == '-':
+                copy_till(found_pos + old_index)
+                num_frozen_lines += 1
+                old_index += 1
+            elif line_type == '+':
+                copy_till(found_pos + old_index)
+                result.append(line)
+            else:
+                old_index += 1
+    if errors:
+        raise PatchApplicationError("%s: %s" % (rel_path, '; '.join(errors)))
+    copy_till(len(file_lines))
+    # A line without a newline from a hunk that did not apply at the end of the file gets one. GNU
+    # patch would join it with the following line instead.
+    return [line if line.endswith('\n') or i == len(result) - 1 else line + '\n'
+            for i, line in enumerate(result)]
+
+
+def read_lines(file_path: str) -> List[str]:
+    with open(file_path, 'rb') as input_file:
+        return split_lines(input_file.read().decode(ENCODING))
+
+
+def write_lines(file_path: str, lines: List[str]) -> None:
+    """
+    Replaces the given file instead of writing into it, so that files hard-linked from elsewhere are
+    not modified.
+    """
+    mkdir_p(os.path.dirname(file_path))
+    tmp_file_path = '%s.tmp.%s' % (file_path, get_temporal_randomized_file_name_suffix())
+    with open(tmp_file_path, 'wb') as output_file:
+        output_file.write(''.join(lines).encode(ENCODING))
+    if os.path.exists(file_path):
+        shutil.copymode(file_path, tmp_file_path)
+    os.replace(tmp_file_path, file_path)
+
+
+def choose_target_rel_path(file_patch: FilePatch, target_dir: str, strip: int) -> str:
+    # Like the patch tool, use the new path if it exists, or the old path otherwise.
+    paths = file_patch.get_paths(strip)
+    if not paths:
+        raise PatchFormatError("Both paths are %s" % DEV_NULL)
+    for path in paths:
+        if os.path.exists(os.path.join(target_dir, path)):
+            return path
+    return paths[0]
+
+
+def apply_unified_diff(file_patches: List[FilePatch], target_dir: str, strip: int) -> None:
+    # Maps relative paths to the new lines of the files, or to None for files to be deleted.
+    new_contents: Dict[str, Optional[List[str]]] = {}
+    errors: List[str] = []
+    for file_patch in file_patches:
+        rel_path = choose_target_rel_path(file_patch, target_dir, strip)
+        file_path = os.path.join(target_dir, rel_path)
+        if rel_path in new_contents:
+            # The same file is patched more than once.
+            file_lines = new_contents[rel_path] or []
+        elif file_patch.old_path == DEV_NULL and not os.path.exists(file_path):
+            file_lines = []
+        elif os.path.isfile(file_path):
+            file_lines = read_lines(file_path)
+        else:
+            errors.append("%s: file does not exist" % rel_path)
+            continue
+        try:
+            patched_lines: Optional[List[str]] = apply_hunks(
+                file_lines, file_patch.hunks, rel_path)
+        except PatchApplicationError as ex:
+            errors.append(str(ex))
+            continue
+        if file_patch.new_path == DEV_NULL:
+            if patched_lines:
+                errors.append("%s: file to be deleted is not empty after patching" % rel_path)
+                continue
+            patched_lines = None
+        new_contents[rel_path] = patched_lines
+    if errors:
+        raise PatchApplicationError('\n'.join(errors))
+
+    for rel_path, patched_lines in sorted(new_contents.items()):
+        file_path = os.path.join(target_dir, rel_path)
+        if patched_lines is None:
+            log("Deleting %s", file_path)
+            os.remove(file_path)
+        else:
+            write_lines(file_path, patched_lines)
+
+
+def apply_patch_using_patch_tool(patch_path: str, target_dir: str, strip: int) -> None:
+    process = subprocess.Popen(['patch', '-p{}'.format(strip)],
+                               stdin=subprocess.PIPE,
+                               cwd=target_dir)
+    with open(patch_path, 'rt') as inp:
+        patch = inp.read()
+    assert process.stdin is not None
+    process.stdin.write(patch.encode('utf-8'))
+    process.stdin.close()
+    exit_code = process.wait()
+    if exit_code:
+        raise PatchApplicationError("The patch tool failed with code %d" % exit_code)
+
+
+def read_patch_file(patch_path: str) -> str:
+    with open(patch_path, 'rb') as patch_file:
+        return patch_file.read().decode(ENCODING)
+
+
+def apply_patch(patch_path: str, target_dir: str, strip: int) -> None:
+    """
+    Applies the given patch file to the given directory, removing the given number of leading
+    components from the paths in the patch like patch -p does. Raises PatchApplicationError if the
+    patch does not apply.
+    """
+    try:
+        file_patches = parse_unified_diff(read_patch_file(patch_path))
+    except PatchFormatError as ex:
+        log("Applying %s using the patch tool: %s", patch_path, ex)
+        apply_patch_using_patch_tool(patch_path, target_dir, strip)
+        return
+    try:
+        apply_unified_diff(file_patches, target_dir, strip)
+    except PatchApplicationError as ex:
+        raise PatchApplicationError("Patch %s does not apply to %s:\n%s" % (
+            patch_path, target_dir, ex))
+    log("Applied %s to %d files in %s", patch_path, len(file_patches), target_dir)
+
+
+def get_patched_file_paths(patch_paths: List[str], strip: int) -> Optional[List[str]]:
+    """
+    Returns the paths, relative to the patched directory, of the files modified by the given
+    patches, or None if they cannot be determined for some of the patches.
+    """
+    rel_paths: List[str] = []
+    for patch_path in patch_paths:
+        patch_text = read_patch_file(patch_path)
+        try:
+            for file_patch in parse_unified_diff(patch_text):
+                rel_paths.extend(file_patch.get_paths(strip))
+        except PatchFormatError:
+            # Other formats, such as normal diffs, can also have file headers.
+            header_paths = [
+                parse_header_path(line) for line in split_lines(patch_text)
+                if line.startswith(('--- ', '+++ '))
+            ]
+            header_paths = [path for path in header_paths if path != DEV_NULL]
+            if not header_paths:
+                return None
+            try:
+                rel_paths.extend(strip_path(path, strip) for path in header_paths)
+            except PatchFormatError:
+                return None
+    return sorted(set(rel_paths))
+
+
+def verify_patches(archive_path: str, patch_paths: List[str], strip: int) -> None:
+    """
+    Applies the given patches to a temporary copy of the sources extracted from the given archive.
+    Only the patched files are extracted when possible. Raises PatchApplicationError if any of the
+    patches do not apply.
+    """
+    subpaths = get_patched_file_paths(patch_paths, strip)
+    if get_compression_type(archive_path) == 'zip':
+        subpaths = None
+    with tempfile.TemporaryDirectory(prefix='yb_verify_patches_') as tmp_dir:
+        extract_archive_into_dir(archive_path, tmp_dir, subpaths)
+        extracted_dirs = os.listdir(tmp_dir)
+        if len(extracted_dirs) != 1:
+            raise IOError("Expected the archive %s to contain exactly one directory, found: %s" % (
+                archive_path, extracted_dirs))
+        src_dir = os.path.join(tmp_dir, extracted_dirs[0])
+        for patch_path in patch_paths:
+            apply_patch(patch_path, src_dir, strip)
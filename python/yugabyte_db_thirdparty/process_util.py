@@ -0,0 +1,160 @@
+# Copyright (c) YugabyteDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import atexit
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import traceback
+
+from multiprocessing.connection import Connection
+from multiprocessing.context import ForkContext
+from multiprocessing.process import BaseProcess
+
+from typing import Any, Callable, Optional, Set, Tuple
+
+
+def get_fork_context() -> ForkContext:
+    return multiprocessing.get_context('fork')
+
+
+# ForkedCall instances started by the current process whose child processes have not been waited
+# for yet.
+_running_calls: Set['ForkedCall'] = set()
+
+
+def terminate_running_calls() -> None:
+    for call in list(_running_calls):
+        call.terminate()
+
+
+def _terminate_running_calls_and_exit(signum: int, frame: Any) -> None:
+    terminate_running_calls()
+    signal.signal(signum, signal.SIG_DFL)
+    os.kill(os.getpid(), signum)
+
+
+# Child processes are in their own process groups, so they do not receive signals sent to the
+# process group of the top-level process, e.g. SIGINT from the terminal or SIGTERM from a CI system
+# cancelling the job. The top-level process terminates them when it exits normally or because of
+# an exception such as KeyboardInterrupt, and when it receives one of these signals. Forked children
+# do not run the atexit handler, as they exit using os._exit.
+atexit.register(terminate_running_calls)
+TOP_LEVEL_TERMINATION_SIGNALS = [signal.SIGTERM, signal.SIGHUP]
+_termination_handlers_installed = False
+
+
+def _install_termination_handlers() -> None:
+    global _termination_handlers_installed
+    if _termination_handlers_installed:
+        return
+    for signum in TOP_LEVEL_TERMINATION_SIGNALS:
+        if signal.getsignal(signum) == signal.SIG_DFL:
+            signal.signal(signum, _terminate_running_calls_and_exit)
+    _termination_handlers_installed = True
+
+
+def _run_and_send_result(conn: Connection, fn: Callable[[], Any]) -> None:
+    # Start a new process group, so that terminating this process also terminates the processes it
+    # runs, e.g. compilers started by make. The calls started by the parent process are not ours.
+    global _termination_handlers_installed
+    os.setpgid(0, 0)
+    _running_calls.clear()
+    signal.signal(signal.SIGTERM, _terminate_running_calls_and_exit)
+    _termination_handlers_installed = True
+    try:
+        conn.send((True, fn()))
+    except BaseException:
+        conn.send((False, traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+class ForkedCall:
+    """
+    Calls a function in a forked child process. The child process gets its own copy of the memory
+    of the parent process, including the environment and the current directory, so any changes the
+    function makes to these are not visible to the parent. The return value of the function, which
+    must be picklable, is passed back to the parent through a pipe.
+
+    The child process is the leader of a new process group, and terminate signals the whole group.
+    """
+
+    name: str
+    start_time_sec: float
+    process: BaseProcess
+    connection: Connection
+
+    def __init__(self, name: str, fn: Callable[[], Any]) -> None:
+        self.name = name
+        _install_termination_handlers()
+        context = get_fork_context()
+        self.connection, child_conn = context.Pipe(duplex=False)
+        self.process = context.Process(
+            target=_run_and_send_result, args=(child_conn, fn), name=name)
+        # Avoid duplicating buffered output in the child process.
+        sys.stdout.flush()
+        sys.stderr.flush()
+        self.start_time_sec = time.time()
+        self.process.start()
+        child_conn.close()
+        _running_calls.add(self)
+        assert self.process.pid is not None
+        try:
+            # Also done in the child process. Doing it here too makes sure the process group exists
+            # by the time terminate could be called.
+            os.setpgid(self.process.pid, self.process.pid)
+        except OSError:
+            # The child process has already exited.
+            pass
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid
+
+    def elapsed_sec(self) -> float:
+        return time.time() - self.start_time_sec
+
+    def wait_for_result(self) -> Tuple[bool, Any]:
+        """
+        Waits for the child process to finish. Returns a tuple of a success flag and the return
+        value of the function, or a formatted traceback or error message in case of a failure.
+        """
+        try:
+            success, result = self.connection.recv()
+        except EOFError:
+            success, result = False, 'Process %s exited without reporting a result' % self.name
+        self.connection.close()
+        self.process.join()
+        _running_calls.discard(self)
+        if success and self.process.exitcode != 0:
+            success, result = False, 'Process %s exited with code %s' % (
+                self.name, self.process.exitcode)
+        return success, result
+
+    def terminate(self) -> None:
+        """
+        Sends SIGTERM to the process group of the child process and waits for the child process to
+        exit. The child process terminates the calls it started itself in turn.
+        """
+        if self.process.is_alive():
+            assert self.process.pid is not None
+            try:
+                os.killpg(self.process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        self.process.join()
+        self.connection.close()
+        _running_calls.discard(self)
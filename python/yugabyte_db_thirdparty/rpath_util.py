@@ -16,13 +16,13 @@ import os
 import re
 import subprocess
 
-from typing import List, Set, Union
+from typing import Dict, List, Set, Union
 
 from sys_detection import is_macos
 
 from yugabyte_db_thirdparty.custom_logging import log
 
-from yugabyte_db_thirdparty import patchelf_util
+from yugabyte_db_thirdparty import elf_util, patchelf_util
 
 
 def get_readelf_rpath_regex_str(path_type: str) -> re.Pattern:
@@ -106,7 +106,36 @@ def get_rpath_flag(path: str) -> str:
     return "-Wl,-rpath,{}".format(path)
 
 
+def split_runpaths(file_path: str, candidate_runpaths: Set[str]) -> List[str]:
+    if not candidate_runpaths:
+        return []
+
+    if len(candidate_runpaths) > 1:
+        raise ValueError(
+            f"Contradictory RUNPATH values found for file {file_path}: {candidate_runpaths}")
+
+    runpaths = [item.strip() for item in list(candidate_runpaths)[0].split(':')]
+    return [item for item in runpaths if item]
+
+
 def get_rpaths(file_path: str) -> List[str]:
+    """
+    Returns the RUNPATH entries of the given ELF file, read in-process. The file must not use the
+    older RPATH attribute.
+    """
+    elf_file = elf_util.read_elf_file(file_path)
+    if elf_file is None:
+        raise ValueError(f"File {file_path} is not an ELF file")
+    if elf_file.rpaths:
+        raise ValueError(
+            f"File {file_path} has the older RPATH attribute. Refusing to work with it.")
+    return split_runpaths(file_path, set(elf_file.runpaths))
+
+
+def get_rpaths_using_readelf(file_path: str) -> List[str]:
+    """
+    Like get_rpaths, but parses the output of readelf. Used for cross-validating get_rpaths.
+    """
     candidate_runpaths: Set[str] = set()
     candidate_rpaths_deprecated: Set[str] = set()
     for line in subprocess.check_output(['readelf', '-d', file_path]).decode('utf-8').split('\n'):
@@ -120,19 +149,14 @@ def get_rpaths(file_path: str) -> List[str]:
     if candidate_rpaths_deprecated:
         raise ValueError(
             f"File {file_path} has the older RPATH attribute. Refusing to work with it.")
-
-    if not candidate_runpaths:
-        return []
-
-    if len(candidate_runpaths) > 1:
-        raise ValueError(
-            f"Contradictory RUNPATH values found for file {file_path}: {candidate_runpaths}")
-
-    runpaths = [item.strip() for item in list(candidate_runpaths)[0].split(':')]
-    return [item for item in runpaths if item]
+    return split_runpaths(file_path, candidate_runpaths)
 
 
 def set_rpaths(file_path: str, rpath_list: List[str]) -> None:
+    """
+    Sets the RUNPATH of the given file using one patchelf call, and verifies the result by reading
+    the file in-process.
+    """
     subprocess.check_call([
         patchelf_util.get_patchelf_path(), '--set-rpath', ':'.join(rpath_list), file_path])
     new_rpaths = get_rpaths(file_path)
@@ -150,14 +174,89 @@ def normalize_path_list(paths: Union[str, List[str]]) -> List[str]:
     raise ValueError(f"Expected a string or a list of strings, got: {paths}")
 
 
+def get_modified_rpaths(
+        old_rpaths: List[str],
+        remove: Union[str, List[str]] = [],
+        add_first: Union[str, List[str]] = [],
+        add_last: Union[str, List[str]] = []) -> List[str]:
+    """
+    >>> get_modified_rpaths(['/a', '/b'], remove='/a', add_first=['/c', '/d'], add_last='/e')
+    ['/c', '/d', '/b', '/e']
+    """
+    set_to_remove = set(normalize_path_list(remove))
+    new_rpaths = [p for p in old_rpaths if p not in set_to_remove]
+    return normalize_path_list(add_first) + new_rpaths + normalize_path_list(add_last)
+
+
 def modify_rpaths(
         file_path: str,
         remove: Union[str, List[str]] = [],
         add_first: Union[str, List[str]] = [],
         add_last: Union[str, List[str]] = []) -> None:
     old_rpaths = get_rpaths(file_path)
-    set_to_remove = set(normalize_path_list(remove))
-    new_rpaths = [p for p in old_rpaths if p not in set_to_remove]
-    new_rpaths = normalize_path_list(add_first) + new_rpaths + normalize_path_list(add_last)
+    new_rpaths = get_modified_rpaths(old_rpaths, remove, add_first, add_last)
     if new_rpaths != old_rpaths:
         set_rpaths(file_path, new_rpaths)
+
+
+class RpathEditor:
+    """
+    Collects RUNPATH changes to many files and writes them in one pass. All changes to a file are
+    combined in memory, so the final RUNPATH of each file is written at most once, using one
+    patchelf call, and only if it differs from the original one. Until then, the pending RUNPATHs
+    can be used to resolve dependencies in-process, see get_pending_rpaths.
+    """
+
+    original_rpaths: Dict[str, List[str]]
+    pending_rpaths: Dict[str, List[str]]
+
+    def __init__(self) -> None:
+        self.original_rpaths = {}
+        self.pending_rpaths = {}
+
+    def get_rpaths(self, file_path: str) -> List[str]:
+        """
+        Returns the RUNPATH entries of the given file, including the changes not written yet.
+        """
+        if file_path not in self.pending_rpaths:
+            rpaths = get_rpaths(file_path)
+            self.original_rpaths[file_path] = rpaths
+            self.pending_rpaths[file_path] = list(rpaths)
+        return list(self.pending_rpaths[file_path])
+
+    def set_rpaths(self, file_path: str, rpath_list: List[str]) -> None:
+        self.get_rpaths(file_path)
+        self.pending_rpaths[file_path] = list(rpath_list)
+
+    def modify_rpaths(
+            self,
+            file_path: str,
+            remove: Union[str, List[str]] = [],
+            add_first: Union[str, List[str]] = [],
+            add_last: Union[str, List[str]] = []) -> None:
+        self.set_rpaths(file_path, get_modified_rpaths(
+            self.get_rpaths(file_path), remove, add_first, add_last))
+
+    def get_pending_rpaths(self) -> Dict[str, List[str]]:
+        """
+        Returns the RUNPATHs the files will have after the changes are written, keyed by real file
+        path. Can be used as the RUNPATH overrides of elf_util.DependencyResolver.
+        """
+        return {
+            os.path.realpath(file_path): list(rpaths)
+            for file_path, rpaths in self.pending_rpaths.items()
+        }
+
+    def get_changed_files(self) -> List[str]:
+        return sorted(
+            file_path for file_path, rpaths in self.pending_rpaths.items()
+            if rpaths != self.original_rpaths[file_path])
+
+    def write_changes(self) -> None:
+        changed_files = self.get_changed_files()
+        for file_path in changed_files:
+            set_rpaths(file_path, self.pending_rpaths[file_path])
+        log("Modified RUNPATH of %d out of %d files",
+            len(changed_files), len(self.pending_rpaths))
+        self.original_rpaths.clear()
+        self.pending_rpaths.clear()
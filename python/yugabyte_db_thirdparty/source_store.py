@@ -0,0 +1,237 @@
+# Copyright (c) YugabyteDB, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except
+# in compliance with the License. You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations
+# under the License.
+#
+
+"""
+A content-addressed store of extracted and patched source trees, keyed by a hash of the source
+archive checksums, the patches, and everything else that affects the contents of the tree. Source
+directories are materialized from the store by cloning the stored tree instead of extracting and
+patching the archive again.
+
+Trees are cloned file by file using reflinks (copy-on-write clones, see FICLONE in ioctl_ficlone(2))
+where the file system supports them, or using hard links where this is allowed. Otherwise, the tree
+is copied using rsync. Entries are never modified after they are renamed into place. Source
+directories may be materialized as hard link farms, so the build must not modify existing files in
+a source directory in place. Files can still be added, removed, or replaced.
+"""
+
+import errno
+import fcntl
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import time
+
+from typing import Callable, List, Optional
+
+from yugabyte_db_thirdparty.custom_logging import log
+from yugabyte_db_thirdparty.file_util import mkdir_p
+from yugabyte_db_thirdparty.util import (
+    get_temporal_randomized_file_name_suffix,
+    read_file,
+    remove_path,
+    write_file,
+)
+
+# From linux/fs.h: _IOW(0x94, 9, int).
+FICLONE = 0x40049409
+
+CLONE_METHOD_REFLINK = 'reflink'
+CLONE_METHOD_HARDLINK = 'hardlink'
+CLONE_METHOD_RSYNC = 'rsync'
+# No files had to be cloned, because they were all up to date.
+CLONE_METHOD_NONE = 'none'
+
+# Errors indicating that a file cannot be cloned using a particular method, e.g. because the file
+# system does not support reflinks, or because the source and the destination are on different file
+# systems.
+CLONE_UNSUPPORTED_ERRNOS = {
+    errno.EINVAL,
+    errno.EMLINK,
+    errno.ENOSYS,
+    errno.ENOTSUP,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.EPERM,
+    errno.EXDEV,
+}
+
+# Written into a source directory materialized from the store.
+SOURCE_STORE_KEY_FILE_NAME = 'yb_source_store_key.txt'
+
+
+def reflink_file(src_path: str, dest_path: str) -> None:
+    try:
+        with open(src_path, 'rb') as src_file, open(dest_path, 'wb') as dest_file:
+            fcntl.ioctl(dest_file.fileno(), FICLONE, src_file.fileno())
+    except OSError:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    shutil.copystat(src_path, dest_path)
+
+
+def clone_file(src_path: str, dest_path: str, method: str) -> bool:
+    """
+    Clones the given file using the given method. Returns False if the method is not supported for
+    this file.
+    """
+    try:
+        if method == CLONE_METHOD_REFLINK:
+            reflink_file(src_path, dest_path)
+        else:
+            assert method == CLONE_METHOD_HARDLINK
+            os.link(src_path, dest_path)
+    except OSError as ex:
+        if ex.errno not in CLONE_UNSUPPORTED_ERRNOS:
+            raise
+        return False
+    return True
+
+
+def is_same_file_info(st1: os.stat_result, st2: os.stat_result) -> bool:
+    # The same check as rsync uses by default to skip files that have not changed.
+    return (stat.S_ISREG(st1.st_mode) and stat.S_ISREG(st2.st_mode) and
+            st1.st_size == st2.st_size and st1.st_mtime_ns == st2.st_mtime_ns)
+
+
+def clone_tree(src_dir: str, dest_dir: str, allow_hardlinks: bool = False) -> str:
+    """
+    Makes the contents of dest_dir the same as that of src_dir, like rsync -a would, without
+    deleting extra files in dest_dir. Files that have the same size and modification time in both
+    directories are skipped. Hard links are only used if allowed, because the files in the two
+    directories then share the contents. Returns the method that was used.
+    """
+    candidate_methods: List[str] = []
+    if sys.platform.startswith('linux'):
+        candidate_methods.append(CLONE_METHOD_REFLINK)
+    if allow_hardlinks:
+        candidate_methods.append(CLONE_METHOD_HARDLINK)
+    # Determined by the first file that has to be cloned.
+    method: Optional[str] = None
+    # Directory modification times are restored after their contents are cloned.
+    cloned_dirs: List[str] = []
+
+    def clone_regular_file(src_path: str, dest_path: str) -> bool:
+        nonlocal method
+        while method is None and candidate_methods:
+            if clone_file(src_path, dest_path, candidate_methods[0]):
+                method = candidate_methods[0]
+                return True
+            candidate_methods.pop(0)
+        if method is None:
+            return False
+        if not clone_file(src_path, dest_path, method):
+            raise IOError("Could not clone %s to %s using %s after cloning other files" % (
+                src_path, dest_path, method))
+        return True
+
+    for root, dir_names, file_names in os.walk(src_dir):
+        dest_root = os.path.normpath(os.path.join(dest_dir, os.path.relpath(root, src_dir)))
+        if os.path.lexists(dest_root) and (
+                os.path.islink(dest_root) or not os.path.isdir(dest_root)):
+            remove_path(dest_root)
+        mkdir_p(dest_root)
+        cloned_dirs.append(root)
+
+        # os.walk does not follow symlinks to directories, but lists them with directories.
+        names = file_names + [
+            dir_name for dir_name in dir_names if os.path.islink(os.path.join(root, dir_name))]
+        for name in names:
+            src_path = os.path.join(root, name)
+            dest_path = os.path.join(dest_root, name)
+            src_st = os.lstat(src_path)
+            dest_st = os.lstat(dest_path) if os.path.lexists(dest_path) else None
+            if stat.S_ISLNK(src_st.st_mode):
+                link_target = os.readlink(src_path)
+                if (dest_st is not None and stat.S_ISLNK(dest_st.st_mode) and
+                        os.readlink(dest_path) == link_target):
+                    continue
+                if dest_st is not None:
+                    remove_path(dest_path)
+                os.symlink(link_target, dest_path)
+                continue
+            if dest_st is not None and is_same_file_info(src_st, dest_st):
+                continue
+            if dest_st is not None:
+                remove_path(dest_path)
+            if not stat.S_ISREG(src_st.st_mode) or not clone_regular_file(src_path, dest_path):
+                # Cloning is not possible, e.g. for special files. Copy the remaining files using
+                # rsync, which skips the files that were already cloned.
+                subprocess.check_call(['rsync', '-a', src_dir + '/', dest_dir])
+                return CLONE_METHOD_RSYNC
+
+    for cloned_dir in reversed(cloned_dirs):
+        shutil.copystat(
+            cloned_dir,
+            os.path.normpath(os.path.join(dest_dir, os.path.relpath(cloned_dir, src_dir))))
+    return method or CLONE_METHOD_NONE
+
+
+class SourceStore:
+    store_dir: str
+
+    def __init__(self, store_dir: str) -> None:
+        self.store_dir = os.path.abspath(store_dir)
+
+    def get_entry_path(self, key: str) -> str:
+        return os.path.join(self.store_dir, key[:2], key)
+
+    def ensure_entry(self, key: str, populate: Callable[[str], None]) -> str:
+        """
+        Returns the path of the store entry with the given key, creating it using the given function
+        if it does not exist yet. The function is given a directory path to create the source tree
+        at. Concurrent builder processes wait for each other to create the same entry.
+        """
+        entry_path = self.get_entry_path(key)
+        if os.path.isdir(entry_path):
+            return entry_path
+        mkdir_p(os.path.dirname(entry_path))
+        with open(entry_path + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if os.path.isdir(entry_path):
+                return entry_path
+            tmp_entry_path = '%s.tmp.%s' % (entry_path, get_temporal_randomized_file_name_suffix())
+            try:
+                populate(tmp_entry_path)
+                os.rename(tmp_entry_path, entry_path)
+            finally:
+                if os.path.exists(tmp_entry_path):
+                    remove_path(tmp_entry_path)
+        log("Added source tree %s to the source store", entry_path)
+        return entry_path
+
+    def materialize(self, key: str, dest_dir: str, populate: Callable[[str], None]) -> None:
+        """
+        Makes dest_dir a copy of the store entry with the given key, see ensure_entry. Does nothing
+        if dest_dir was already materialized from the same entry.
+        """
+        key_file_path = os.path.join(dest_dir, SOURCE_STORE_KEY_FILE_NAME)
+        if os.path.exists(key_file_path) and read_file(key_file_path).strip() == key:
+            log("Source directory %s is up to date with source store entry %s", dest_dir, key)
+            return
+
+        entry_path = self.ensure_entry(key, populate)
+        start_time_sec = time.time()
+        tmp_dest_dir = '%s.tmp.%s' % (dest_dir, get_temporal_randomized_file_name_suffix())
+        try:
+            method = clone_tree(entry_path, tmp_dest_dir, allow_hardlinks=True)
+            write_file(os.path.join(tmp_dest_dir, SOURCE_STORE_KEY_FILE_NAME), key + '\n')
+            remove_path(dest_dir)
+            os.rename(tmp_dest_dir, dest_dir)
+        finally:
+            if os.path.exists(tmp_dest_dir):
+                remove_path(tmp_dest_dir)
+        log("Materialized %s from source store entry %s using %s in %.3f sec",
+            dest_dir, entry_path, method, time.time() - start_time_sec)
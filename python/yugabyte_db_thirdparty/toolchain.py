@@ -11,6 +11,7 @@
 # under the License.
 #
 
+import concurrent.futures
 import os
 import re
 from llvm_installer import LlvmInstaller
@@ -112,10 +113,18 @@ def is_compatible_os_arch_combination(os_arch1: str, os_arch2: str) -> bool:
 def ensure_toolchains_installed(
         download_manager: DownloadManager,
         toolchain_types: List[str]) -> List[Toolchain]:
-    return [
-        ensure_toolchain_installed(download_manager, toolchain_type)
-        for toolchain_type in toolchain_types
-    ]
+    """
+    Installs the given toolchains concurrently, e.g. LLVM and Linuxbrew for llvmNN_linuxbrew.
+    """
+    if len(toolchain_types) <= 1:
+        return [
+            ensure_toolchain_installed(download_manager, toolchain_type)
+            for toolchain_type in toolchain_types
+        ]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(toolchain_types)) as executor:
+        return list(executor.map(
+            lambda toolchain_type: ensure_toolchain_installed(download_manager, toolchain_type),
+            toolchain_types))
 
 
 def get_toolchain_url(toolchain_type: str) -> str:
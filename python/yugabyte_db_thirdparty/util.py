@@ -59,14 +59,21 @@ def assert_dir_exists(dir_path: str) -> None:
     assert os.path.isdir(dir_path), "Directory does not exist or is not a directory: %s" % dir_path
 
 
-def compute_file_hash(hash: Any, filename: str, block_size: int = 65536) -> str:
+def compute_file_hash(hash: Any, filename: str, block_size: int = 1024 * 1024) -> str:
     """
     Compute the hash sum of a file by updating the existing hash object.
     """
     # TODO: use a more precise argument type for hash.
-    with open(filename, "rb") as f:
-        for block in iter(lambda: f.read(block_size), b""):
-            hash.update(block)
+    # Read large blocks into the same buffer. hashlib releases the GIL while hashing large blocks,
+    # so multiple files can be hashed in parallel by different threads.
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    with open(filename, "rb", buffering=0) as f:
+        while True:
+            num_bytes_read = f.readinto(buffer)
+            if not num_bytes_read:
+                break
+            hash.update(view[:num_bytes_read])
     return hash.hexdigest()
 
 
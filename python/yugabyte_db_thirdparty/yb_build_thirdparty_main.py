@@ -24,9 +24,7 @@ from build_definitions import *  # noqa
 
 from yugabyte_db_thirdparty.arch import verify_arch
 from yugabyte_db_thirdparty.builder import Builder
-from yugabyte_db_thirdparty.clang_util import get_clang_library_dir
 from yugabyte_db_thirdparty.custom_logging import log, configure_logging
-from yugabyte_db_thirdparty.library_checking import get_lib_tester
 from yugabyte_db_thirdparty.packager import Packager
 from yugabyte_db_thirdparty.remote_build import build_remotely
 from yugabyte_db_thirdparty.snyk import run_snyk_scan
@@ -50,21 +48,8 @@ class BuilderTool:
         self.builder = Builder()
 
     def check_libraries(self) -> None:
-        builder = self.builder
         lib_checking_start_time_sec = time.time()
-
-        lib_tester = get_lib_tester(fs_layout=builder.fs_layout)
-        lib_tester.add_allowed_shared_lib_paths(builder.additional_allowed_shared_lib_paths)
-        if builder.compiler_choice.is_linux_clang():
-            clang_library_dirs: List[str] = get_clang_library_dir(
-                builder.compiler_choice.get_c_compiler(),
-                all_dirs=True
-            )
-            assert len(clang_library_dirs) > 0
-            lib_tester.add_allowed_shared_lib_paths(set(clang_library_dirs))
-        lib_tester.configure_for_compiler(builder.compiler_choice)
-
-        lib_tester.run()
+        self.builder.create_lib_tester().run()
 
         log("Libraries checked in %.1f sec", time.time() - lib_checking_start_time_sec)
 
@@ -118,6 +103,10 @@ class BuilderTool:
         if args.intel_oneapi_base_dir:
             intel_oneapi.find_intel_oneapi(base_dir=args.intel_oneapi_base_dir)
 
+        if args.verify_patches:
+            builder.verify_patches()
+            return
+
         start_time_sec = time.time()
         if args.check_libs_only:
             log("Skipping build, --check-libs-only is specified")